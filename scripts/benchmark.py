@@ -0,0 +1,661 @@
+#!/usr/bin/env python3
+"""
+性能基准测试脚本
+
+用法:
+    python scripts/benchmark.py ascii                  # ASCII 快速路径 vs Unicode 路径
+    python scripts/benchmark.py ascii --sizes 1 16 64  # 指定文件大小（MiB）
+    python scripts/benchmark.py gateway                # 本地 Gateway 的吞吐量和延迟分位数
+    python scripts/benchmark.py gateway --workers 4 --concurrency 64 --function count_stream \
+        --params '{"count": 5, "interval": 0}'
+    python scripts/benchmark.py gateway --concurrency 64 --function count_stream_async \
+        --params '{"count": 5, "interval": 0.1}'
+    python scripts/benchmark.py ticks                  # 1 万个并发计数流：共享调度器 vs 各自 sleep
+    python scripts/benchmark.py ticks --sessions 2000 --modes threads scheduler
+    python scripts/benchmark.py sse                    # SSE 事件编码：模板 vs json.dumps
+    python scripts/benchmark.py batch                  # 逐个调用 vs batch_call（经本地 Gateway）
+    python scripts/benchmark.py vector                 # 数组加法：逐对 add_numbers vs 向量化
+    python scripts/benchmark.py validate               # 参数校验：编译后的校验函数 vs 逐次遍历 schema
+    python scripts/benchmark.py contracts              # 返回值抽样检查在不同抽样率下的调用开销
+    python scripts/benchmark.py weather                # 天气服务调用：每次新建连接 vs 连接池 vs 连接池 + 结果缓存
+    python scripts/benchmark.py weather --concurrency 32 --pool-size 8 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# 允许从仓库根目录直接运行
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import main as prefab_main  # noqa: E402
+from src.main import _count_events, add_numbers, count_stream, count_stream_async  # noqa: E402
+from src.utils.contracts import ContractChecker  # noqa: E402
+from src.utils.dispatch import Dispatcher, load_manifest  # noqa: E402
+from src.utils.memo import MemoCache  # noqa: E402
+from src.utils.pipeline import ASCII_TRANSFORMS  # noqa: E402
+from src.utils.scheduler import get_scheduler  # noqa: E402
+from src.utils.sse import encode_sse  # noqa: E402
+from src.utils.text_stream import CHUNK_TRANSFORMS, DEFAULT_CHUNK_SIZE, reverse_stream, transform_stream  # noqa: E402
+from src.utils.validation import compile_parameters  # noqa: E402
+from src.utils.vector_math import BACKENDS, add_arrays  # noqa: E402
+from src.utils.weather_cache import WeatherCache  # noqa: E402
+from src.utils.weather_client import WeatherClient  # noqa: E402
+
+MIB = 1024 * 1024
+
+# 用于生成测试文件的 ASCII 文本行
+_ASCII_LINE = b"The quick brown fox jumps over the lazy dog. 0123456789\n"
+
+
+class _NullWriter:
+    """丢弃写入的数据，只测量处理本身（不含写盘）的耗时"""
+
+    def write(self, data) -> int:
+        return len(data)
+
+
+def _best_of(repeat: int, func) -> float:
+    """多次运行取最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _peak_memory(func) -> int:
+    """运行一次并返回 Python 堆内存峰值（字节）"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _write_ascii_file(path: Path, size: int) -> None:
+    """生成约 size 字节的纯 ASCII 文件"""
+    block = _ASCII_LINE * (MIB // len(_ASCII_LINE))
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            data = block[:size - written]
+            f.write(data)
+            written += len(data)
+
+
+def _run_ascii_case(path: Path, operation: str, chunk_size: int, fast: bool) -> None:
+    """按指定路径处理一遍文件，输出丢弃"""
+    with open(path, "rb") as src:
+        if operation == "reverse":
+            reverse_stream(src, _NullWriter(), chunk_size, ascii_transform=(lambda data: data) if fast else None)
+        else:
+            transform_stream(src, _NullWriter(), CHUNK_TRANSFORMS[operation], chunk_size,
+                             ascii_transform=ASCII_TRANSFORMS[operation] if fast else None)
+
+
+def bench_ascii(args) -> None:
+    """比较纯 ASCII 输入在字节级快速路径和 Unicode 路径上的吞吐量和内存峰值"""
+    print(f"{'大小':>8} {'操作':>10} {'Unicode MB/s':>14} {'ASCII MB/s':>12} {'加速比':>8} "
+          f"{'Unicode 峰值':>14} {'ASCII 峰值':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "input.txt"
+        for size_mib in args.sizes:
+            size = int(size_mib * MIB)
+            _write_ascii_file(src, size)
+            for operation in ("uppercase", "lowercase", "reverse"):
+                timings, peaks = [], []
+                for fast in (False, True):
+                    def run():
+                        _run_ascii_case(src, operation, args.chunk_size, fast)
+
+                    timings.append(_best_of(args.repeat, run))
+                    peaks.append(_peak_memory(run))
+                slow, quick = timings
+                print(f"{size_mib:>6g}Mi {operation:>10} {size / slow / 1e6:>14.1f} {size / quick / 1e6:>12.1f} "
+                      f"{slow / quick:>7.2f}x {peaks[0] / MIB:>12.1f}Mi {peaks[1] / MIB:>10.1f}Mi")
+
+
+def _percentile(sorted_values, q: float) -> float:
+    """已排序数据的 q 分位数（最近秩）"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _gateway_client(port: int, path: str, body: bytes, counter, latencies, errors) -> None:
+    """单个客户端线程：在 keep-alive 连接上依次发送请求，直到请求总数用完"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while next(counter, None) is not None:
+        started = time.perf_counter()
+        try:
+            conn.request("POST", path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+@contextmanager
+def _local_gateway(workers: int, threads: int) -> Iterator[int]:
+    """在子进程中启动本地 Gateway，返回端口，退出时停止"""
+    script = Path(__file__).resolve().parent / "local_gateway.py"
+    proc = subprocess.Popen(
+        [sys.executable, str(script), "--port", "0", "--workers", str(workers), "--threads", str(threads)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        yield int(re.search(r":(\d+)", proc.stdout.readline()).group(1))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=10)
+
+
+def bench_gateway(args) -> None:
+    """启动本地 Gateway，用并发的 keep-alive 客户端测量吞吐量和延迟分位数"""
+    with _local_gateway(args.workers, args.threads) as port:
+        path = f"/functions/{args.function}"
+        body = json.dumps({"parameters": json.loads(args.params)}).encode("utf-8")
+
+        # 预热：每个工作进程都建立好线程池
+        for _ in range(args.workers * 2):
+            _gateway_client(port, path, body, iter([1]), [], [])
+
+        counter = iter(range(args.requests))
+        latencies, errors = [], []
+        threads = [threading.Thread(target=_gateway_client, args=(port, path, body, counter, latencies, errors))
+                   for _ in range(args.concurrency)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"函数: {args.function}  工作进程: {args.workers}  线程: {args.threads}  并发: {args.concurrency}")
+    print(f"请求数: {len(latencies)}  失败: {len(errors)}  耗时: {elapsed:.2f}s  吞吐量: {len(latencies) / elapsed:.1f} req/s")
+    print(f"延迟 p50: {_percentile(latencies, 0.5) * 1000:.2f}ms  p90: {_percentile(latencies, 0.9) * 1000:.2f}ms  "
+          f"p99: {_percentile(latencies, 0.99) * 1000:.2f}ms  max: {latencies[-1] * 1000 if latencies else 0:.2f}ms")
+
+
+def _record_ticks(events, started: float, interval: float, lateness) -> None:
+    """记录每个 progress 事件相对理想时刻（开始时间 + i * interval）的延迟"""
+    lateness.append(time.monotonic() - started - events["data"]["current"] * interval)
+
+
+def _tick_thread_session(delay: float, count: int, interval: float, lateness) -> None:
+    """threads 模式：每个流一个线程，count_stream 在线程中 time.sleep"""
+    time.sleep(delay)
+    started = time.monotonic()
+    for event in count_stream(count, interval):
+        if event["type"] == "progress":
+            _record_ticks(event, started, interval, lateness)
+
+
+async def _tick_sleep_session(delay: float, count: int, interval: float, lateness) -> None:
+    """sleep 模式：每个流各自 await asyncio.sleep(interval)（引入调度器之前的做法）"""
+    await asyncio.sleep(delay)
+    started = time.monotonic()
+    for event in _count_events(count, interval):
+        if not isinstance(event, dict):
+            await asyncio.sleep(interval)
+        elif event["type"] == "progress":
+            _record_ticks(event, started, interval, lateness)
+
+
+async def _tick_scheduler_session(delay: float, count: int, interval: float, lateness) -> None:
+    """scheduler 模式：count_stream_async 把每次等待登记到共享调度器"""
+    await asyncio.sleep(delay)
+    started = time.monotonic()
+    async for event in count_stream_async(count, interval):
+        if event["type"] == "progress":
+            _record_ticks(event, started, interval, lateness)
+
+
+def _run_ticks(mode: str, delays, count: int, interval: float):
+    """运行一种模式，返回 (延迟列表, 附加说明)"""
+    lateness = []
+    if mode == "threads":
+        threading.stack_size(256 * 1024)
+        threads = [threading.Thread(target=_tick_thread_session, args=(d, count, interval, lateness))
+                   for d in delays]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        threading.stack_size(0)
+        return lateness, ""
+
+    session = _tick_sleep_session if mode == "sleep" else _tick_scheduler_session
+
+    async def run():
+        await asyncio.gather(*(session(d, count, interval, lateness) for d in delays))
+        if mode == "scheduler":
+            stats = get_scheduler().stats()
+            return f"定时器 {stats['timers']}  批次 {stats['batches']}  唤醒 {stats['woken']}"
+        return f"定时器 {len(delays) * count}"
+
+    return lateness, asyncio.run(run())
+
+
+def bench_ticks(args) -> None:
+    """大量并发计数流：比较每流一个线程、每流各自 asyncio.sleep 和共享调度器"""
+    rng = random.Random(0)
+    # 各个流在 --spread 秒内随机开始
+    delays = [rng.uniform(0, args.spread) for _ in range(args.sessions)]
+    ideal = args.spread + args.count * args.interval
+    print(f"流: {args.sessions}  每流事件: {args.count}  间隔: {args.interval}s  开始时间分布: {args.spread}s  "
+          f"理想耗时: ≤{ideal:.2f}s")
+    print(f"{'模式':>10} {'耗时':>8} {'CPU':>8} {'延迟 p50':>10} {'p99':>10} {'max':>10}  说明")
+    for mode in args.modes:
+        cpu = time.process_time()
+        started = time.perf_counter()
+        lateness, note = _run_ticks(mode, delays, args.count, args.interval)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu
+        lateness.sort()
+        print(f"{mode:>10} {elapsed:>7.2f}s {cpu:>7.2f}s {_percentile(lateness, 0.5) * 1000:>8.2f}ms "
+              f"{_percentile(lateness, 0.99) * 1000:>8.2f}ms {lateness[-1] * 1000 if lateness else 0:>8.2f}ms  {note}")
+
+
+def _encode_sse_json(event) -> bytes:
+    """逐个事件 json.dumps 的编码方式（引入模板之前的做法）"""
+    data = json.dumps(event, ensure_ascii=False)
+    return f"event: {event.get('type', 'message')}\ndata: {data}\n\n".encode("utf-8")
+
+
+def _allocated_per_event(encode, events) -> float:
+    """编码一遍事件（丢弃结果）期间 Python 堆的平均分配字节数"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        allocated = 0
+        for event in events:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            encode(event)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        return allocated / len(events)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_sse(args) -> None:
+    """比较 count_stream 事件的两种 SSE 编码方式的吞吐量和每个事件的内存分配"""
+    events = list(count_stream(args.events, 0))
+    assert [encode_sse(e) for e in events] == [_encode_sse_json(e) for e in events]
+
+    print(f"事件数: {len(events)}（count_stream 的 start / progress / done）")
+    print(f"{'编码方式':>12} {'事件/秒':>12} {'每事件分配':>12} {'含生成事件 事件/秒':>20}")
+    for name, encode in (("json.dumps", _encode_sse_json), ("模板", encode_sse)):
+        def run():
+            for event in events:
+                encode(event)
+
+        def run_with_events():
+            for event in count_stream(args.events, 0):
+                encode(event)
+
+        elapsed = _best_of(args.repeat, run)
+        end_to_end = _best_of(args.repeat, run_with_events)
+        allocated = _allocated_per_event(encode, events[:2000])
+        print(f"{name:>12} {len(events) / elapsed:>12,.0f} {allocated:>10.0f} B {len(events) / end_to_end:>20,.0f}")
+
+
+def bench_batch(args) -> None:
+    """通过本地 Gateway 比较逐个调用和 batch_call 的每秒调用数"""
+    arguments = json.loads(args.params)
+    with _local_gateway(1, args.threads) as port:
+        print(f"函数: {args.function}  调用数: {args.calls}")
+        print(f"{'每批':>8} {'请求数':>8} {'耗时':>8} {'调用/秒':>12}")
+        for size in args.batch_sizes:
+            requests = max(1, args.calls // size)
+            if size == 1:
+                path, body = f"/functions/{args.function}", {"parameters": arguments}
+            else:
+                path = "/functions/batch_call"
+                body = {"parameters": {"function": args.function, "items": [arguments] * size}}
+            payload = json.dumps(body).encode("utf-8")
+            errors = []
+            started = time.perf_counter()
+            _gateway_client(port, path, payload, iter(range(requests)), [], errors)
+            elapsed = time.perf_counter() - started
+            label = "逐个" if size == 1 else str(size)
+            print(f"{label:>8} {requests:>8} {elapsed:>7.2f}s {requests * size / elapsed:>12,.0f}"
+                  + (f"  失败 {len(errors)}" if errors else ""))
+
+
+def bench_vector(args) -> None:
+    """比较逐对调用 add_numbers 和一次向量化的数组加法"""
+    rng = random.Random(0)
+    print(f"可用实现: {', '.join(BACKENDS)}")
+    print(f"{'元素数':>10} {'类型':>6} {'方式':>18} {'耗时':>10} {'元素/秒':>14}")
+    for size in args.sizes:
+        for kind in ("int", "float"):
+            if kind == "int":
+                a = [rng.randrange(-10 ** 9, 10 ** 9) for _ in range(size)]
+                b = [rng.randrange(-10 ** 9, 10 ** 9) for _ in range(size)]
+            else:
+                a = [rng.uniform(-1e9, 1e9) for _ in range(size)]
+                b = [rng.uniform(-1e9, 1e9) for _ in range(size)]
+            expected = [x + y for x, y in zip(a, b)]
+
+            cases = [("逐对 add_numbers", lambda: [add_numbers(x, y)["sum"] for x, y in zip(a, b)])]
+            cases += [(f"向量化 {backend}", lambda backend=backend: add_arrays(a, b, backend)[0])
+                      for backend in BACKENDS]
+            for name, run in cases:
+                assert run() == expected
+                elapsed = _best_of(args.repeat, run)
+                print(f"{size:>10,} {kind:>6} {name:>18} {elapsed * 1000:>8.2f}ms {size / elapsed:>14,.0f}")
+
+
+_WALKER_TYPES = {"string": (str,), "integer": (int,), "number": (int, float), "boolean": (bool,),
+                 "array": (list, tuple), "object": (dict,)}
+
+
+def _walk_value(param, value):
+    """逐次遍历一个参数的 schema，返回错误信息（合法时为 None）"""
+    types = param.get("type")
+    types = types if isinstance(types, list) else [types]
+    matched = None
+    for type_name in types:
+        if isinstance(value, bool) and type_name != "boolean":
+            continue
+        if isinstance(value, _WALKER_TYPES.get(type_name, ())):
+            matched = type_name
+            break
+    if matched is None:
+        if "integer" in types and "number" not in types and isinstance(value, float) and value.is_integer():
+            value, matched = int(value), "integer"
+        else:
+            return "type"
+    if matched in ("integer", "number"):
+        if "minimum" in param and value < param["minimum"]:
+            return "minimum"
+        if "maximum" in param and value > param["maximum"]:
+            return "maximum"
+    if matched == "string":
+        if "minLength" in param and len(value) < param["minLength"]:
+            return "minLength"
+        if "maxLength" in param and len(value) > param["maxLength"]:
+            return "maxLength"
+    if matched == "array":
+        if "minItems" in param and len(value) < param["minItems"]:
+            return "minItems"
+        if "maxItems" in param and len(value) > param["maxItems"]:
+            return "maxItems"
+        items = param.get("items", {})
+        for item in value:
+            error = _walk_value(items, item) if "type" in items else None
+            if error:
+                return error
+    elif "enum" in param and value not in param["enum"]:
+        return "enum"
+    return None
+
+
+def _walk_parameters(parameters, arguments):
+    """通用的 schema 遍历校验（每次调用都重新解释 parameters），返回错误代码或 None"""
+    if not isinstance(arguments, dict):
+        return "INVALID_PARAMETERS"
+    for name in arguments:
+        if not any(param["name"] == name for param in parameters):
+            return "INVALID_PARAMETERS"
+    for param in parameters:
+        if param.get("required") and param["name"] not in arguments:
+            return "INVALID_PARAMETERS"
+    for name, value in arguments.items():
+        param = next(param for param in parameters if param["name"] == name)
+        if _walk_value(param, value):
+            return param.get("error_code", "INVALID_PARAMETERS")
+    return None
+
+
+# validate 基准测试的调用样本：(函数名, 参数)，包括合法和不合法的参数
+_VALIDATE_SAMPLES = [
+    ("greet", {"name": "bench"}),
+    ("greet", {}),
+    ("greet", {"name": ""}),
+    ("echo", {"text": "hello"}),
+    ("add_numbers", {"a": 1, "b": 2.5}),
+    ("add_numbers", {"a": [1, 2, 3], "b": 1}),
+    ("add_numbers", {"a": 1, "b": "x"}),
+    ("process_text_file", {"operation": ["lowercase", "reverse"], "start_line": 10, "end_line": 20}),
+    ("process_text_file", {"operation": "title"}),
+    ("count_stream", {"count": 5, "interval": 0}),
+    ("count_stream", {"count": 0}),
+    ("fetch_weather", {"city": "Beijing", "unit": "c"}),
+]
+
+
+def bench_validate(args) -> None:
+    """比较编译后的参数校验函数和逐次遍历 schema 的每次校验耗时"""
+    functions = {f["name"]: f.get("parameters", []) for f in load_manifest()["functions"]}
+    compiled = {name: compile_parameters(parameters) for name, parameters in functions.items()}
+    for name, arguments in _VALIDATE_SAMPLES:
+        error = compiled[name](arguments)[1]
+        assert (error and error["error_code"]) == _walk_parameters(functions[name], arguments), (name, arguments)
+
+    calls = args.calls
+    samples = (_VALIDATE_SAMPLES * (calls // len(_VALIDATE_SAMPLES) + 1))[:calls]
+    walk = [(functions[name], arguments) for name, arguments in samples]
+    fast = [(compiled[name], arguments) for name, arguments in samples]
+
+    def run_walker():
+        for parameters, arguments in walk:
+            _walk_parameters(parameters, arguments)
+
+    def run_compiled():
+        for validate, arguments in fast:
+            validate(arguments)
+
+    print(f"样本: {len(_VALIDATE_SAMPLES)} 种调用（含不合法参数），共 {calls} 次校验")
+    print(f"{'方式':>14} {'每次校验':>10} {'校验/秒':>14}")
+    for name, run in (("遍历 schema", run_walker), ("编译后", run_compiled)):
+        elapsed = _best_of(args.repeat, run)
+        print(f"{name:>14} {elapsed / calls * 1e6:>8.2f}us {calls / elapsed:>14,.0f}")
+
+
+def bench_contracts(args) -> None:
+    """比较不同抽样率下经 Dispatcher 调用的每次耗时（关闭结果缓存）"""
+    manifest = load_manifest()
+    arguments = json.loads(args.params)
+    calls = args.calls
+    print(f"函数: {args.function}，共 {calls} 次调用")
+    print(f"{'抽样率':>8} {'每次调用':>10} {'检查次数':>10} {'违规':>6}")
+    for rate in args.rates:
+        dispatcher = Dispatcher(manifest, prefab_main, MemoCache(0), ContractChecker(manifest, rate))
+
+        def run():
+            for _ in range(calls):
+                dispatcher.call(args.function, arguments)
+
+        elapsed = _best_of(args.repeat, run)
+        snapshot = dispatcher.contracts.snapshot()
+        print(f"{rate:>8g} {elapsed / calls * 1e6:>8.2f}us {snapshot['checked']:>10} {snapshot['violations']:>6}")
+
+
+@contextmanager
+def _weather_server(latency: float) -> Iterator[str]:
+    """在子进程中启动本地天气服务，返回服务地址，退出时停止"""
+    script = Path(__file__).resolve().parent / "weather_server.py"
+    proc = subprocess.Popen(
+        [sys.executable, str(script), "--port", "0", "--latency", str(latency), "--api-key", "bench"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        yield re.search(r"http://\S+", proc.stdout.readline()).group(0)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=10)
+
+
+def _weather_connections(url: str) -> int:
+    """天气服务目前为止收到的连接数"""
+    conn = http.client.HTTPConnection(url.split("//", 1)[1], timeout=10)
+    try:
+        conn.request("GET", "/stats")
+        return json.loads(conn.getresponse().read())["connections"] - 1
+    finally:
+        conn.close()
+
+
+def bench_weather(args) -> None:
+    """比较每次请求新建连接、复用连接池中的 keep-alive 连接和再加上结果缓存"""
+    with _weather_server(args.latency) as url:
+        host = url.split("//", 1)[1]
+        pooled = WeatherClient(url, args.pool_size)
+        cache = WeatherCache(args.cache_ttl)
+        cities = [f"city-{i}" for i in range(args.cities)]
+
+        def fresh_connection(city):
+            conn = http.client.HTTPConnection(host, timeout=10)
+            try:
+                conn.request("GET", f"/current?city={city}", headers={"X-API-Key": "bench"})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(response.status)
+            finally:
+                conn.close()
+
+        def pooled_connection(city):
+            pooled.current(city, "bench")
+
+        def cached(city):
+            cache.get(city, lambda: pooled.current(city, "bench"))
+
+        print(f"请求数: {args.requests}  并发: {args.concurrency}  连接池: {args.pool_size}  "
+              f"服务端处理时间: {args.latency * 1000:g}ms  城市数: {args.cities}")
+        print(f"{'方式':>10} {'吞吐量':>12} {'p50':>9} {'p99':>9} {'新建连接':>8}")
+        modes = (("每次新建", fresh_connection), ("连接池", pooled_connection), ("连接池+缓存", cached))
+        for name, call in modes:
+            counter = iter(range(args.requests))
+            latencies, errors = [], []
+
+            def client():
+                while (i := next(counter, None)) is not None:
+                    started = time.perf_counter()
+                    try:
+                        call(cities[i % len(cities)])
+                    except Exception as e:
+                        errors.append(repr(e))
+                    latencies.append(time.perf_counter() - started)
+
+            before = _weather_connections(url)
+            threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+            opened = _weather_connections(url) - before - 1
+            latencies.sort()
+            print(f"{name:>10} {len(latencies) / elapsed:>8,.0f} r/s {_percentile(latencies, 0.5) * 1000:>7.2f}ms "
+                  f"{_percentile(latencies, 0.99) * 1000:>7.2f}ms {opened:>8}"
+                  + (f"  失败 {len(errors)}" if errors else ""))
+        pooled.close()
+        stats = cache.snapshot()
+        print(f"缓存: 命中 {stats['hits']}  请求天气服务 {stats['misses']}  合并 {stats['coalesced']}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ascii_parser = subparsers.add_parser("ascii", help="ASCII 快速路径 vs Unicode 路径")
+    ascii_parser.add_argument("--sizes", type=float, nargs="+", default=[1, 16, 64], help="文件大小（MiB）")
+    ascii_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="块大小（字节）")
+    ascii_parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最快一次）")
+    ascii_parser.set_defaults(func=bench_ascii)
+
+    gateway_parser = subparsers.add_parser("gateway", help="本地 Gateway 的吞吐量和延迟分位数")
+    gateway_parser.add_argument("--workers", type=int, default=2, help="Gateway 工作进程数")
+    gateway_parser.add_argument("--threads", type=int, default=8, help="每个工作进程的线程数")
+    gateway_parser.add_argument("--concurrency", type=int, default=32, help="并发客户端连接数")
+    gateway_parser.add_argument("--requests", type=int, default=5000, help="请求总数")
+    gateway_parser.add_argument("--function", default="greet", help="调用的函数")
+    gateway_parser.add_argument("--params", default='{"name": "bench"}', help="函数参数（JSON）")
+    gateway_parser.set_defaults(func=bench_gateway)
+
+    ticks_parser = subparsers.add_parser("ticks", help="大量并发计数流：共享调度器 vs 各自 sleep")
+    ticks_parser.add_argument("--sessions", type=int, default=10000, help="并发流个数")
+    ticks_parser.add_argument("--count", type=int, default=10, help="每个流的 progress 事件数")
+    ticks_parser.add_argument("--interval", type=float, default=0.5, help="事件间隔（秒）")
+    ticks_parser.add_argument("--spread", type=float, default=0.5, help="各个流的开始时间分布在多少秒内")
+    ticks_parser.add_argument("--modes", nargs="+", choices=["threads", "sleep", "scheduler"],
+                              default=["threads", "sleep", "scheduler"], help="要比较的模式")
+    ticks_parser.set_defaults(func=bench_ticks)
+
+    sse_parser = subparsers.add_parser("sse", help="SSE 事件编码：模板 vs json.dumps")
+    sse_parser.add_argument("--events", type=int, default=100000, help="count_stream 的 count")
+    sse_parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最快一次）")
+    sse_parser.set_defaults(func=bench_sse)
+
+    batch_parser = subparsers.add_parser("batch", help="逐个调用 vs batch_call（经本地 Gateway）")
+    batch_parser.add_argument("--calls", type=int, default=5000, help="每种方式的调用总数")
+    batch_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000],
+                              help="每批的调用数（1 表示逐个调用）")
+    batch_parser.add_argument("--threads", type=int, default=4, help="Gateway 的线程数")
+    batch_parser.add_argument("--function", default="greet", help="调用的函数")
+    batch_parser.add_argument("--params", default='{"name": "bench"}', help="每次调用的参数（JSON）")
+    batch_parser.set_defaults(func=bench_batch)
+
+    vector_parser = subparsers.add_parser("vector", help="数组加法：逐对 add_numbers vs 向量化")
+    vector_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000], help="数组长度")
+    vector_parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最快一次）")
+    vector_parser.set_defaults(func=bench_vector)
+
+    validate_parser = subparsers.add_parser("validate", help="参数校验：编译后的校验函数 vs 逐次遍历 schema")
+    validate_parser.add_argument("--calls", type=int, default=200000, help="校验次数")
+    validate_parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最快一次）")
+    validate_parser.set_defaults(func=bench_validate)
+
+    contracts_parser = subparsers.add_parser("contracts", help="返回值抽样检查在不同抽样率下的调用开销")
+    contracts_parser.add_argument("--rates", type=float, nargs="+", default=[0, 0.01, 1], help="抽样率")
+    contracts_parser.add_argument("--calls", type=int, default=100000, help="每种抽样率的调用次数")
+    contracts_parser.add_argument("--function", default="greet", help="调用的函数")
+    contracts_parser.add_argument("--params", default='{"name": "bench"}', help="函数参数（JSON）")
+    contracts_parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最快一次）")
+    contracts_parser.set_defaults(func=bench_contracts)
+
+    weather_parser = subparsers.add_parser("weather", help="天气服务调用：每次新建连接 vs 连接池 vs 连接池 + 结果缓存")
+    weather_parser.add_argument("--requests", type=int, default=5000, help="每种方式的请求总数")
+    weather_parser.add_argument("--concurrency", type=int, default=16, help="并发线程数")
+    weather_parser.add_argument("--pool-size", type=int, default=8, help="连接池大小")
+    weather_parser.add_argument("--latency", type=float, default=0.0, help="本地天气服务每个请求的处理时间（秒）")
+    weather_parser.add_argument("--cities", type=int, default=5, help="轮流查询的城市数")
+    weather_parser.add_argument("--cache-ttl", type=float, default=300.0, help="结果缓存秒数")
+    weather_parser.set_defaults(func=bench_weather)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,627 @@
+#!/usr/bin/env python3
+"""
+本地 Gateway
+
+在本地模拟平台 Gateway：启动时加载一次 prefab-manifest.json、导入一次
+src.main，然后把 manifest 中声明的每个函数暴露为 HTTP 接口，不依赖平台
+就能测量吞吐量和延迟（见 scripts/benchmark.py gateway）。
+
+用法:
+    python scripts/local_gateway.py                                   # 127.0.0.1:8000
+    python scripts/local_gateway.py --port 9000 --workers 4 --threads 16
+
+接口:
+    GET  /health             健康检查（返回处理请求的工作进程 pid）
+    GET  /manifest           manifest 内容
+    GET  /metrics            本工作进程的 SSE 缓冲统计（缓冲深度、合并的事件数）、
+                             纯函数结果缓存统计（命中率、淘汰数、合并的调用数）和
+                             返回值抽样检查统计（检查数、违反 manifest 约定的次数）
+    POST /functions/{name}   调用函数，请求体为 JSON：
+                             {"parameters": {...},
+                              "files": {"input": [{"name": "a.txt", "content": "<base64>"}]}}
+
+普通函数返回 {"result": <函数返回值>, "output_files": [{"name", "size", "content"}]}；
+流式函数（manifest 中 "streaming": true）以 SSE 返回，每个事件是一条
+"event: <type>" 加一条 "data: <JSON>"，最后附加一个 output_files 事件。
+客户端读得慢时，尚未发出的连续 progress 事件只保留最新的一个，
+start / done / error 从不丢弃（见 src/utils/sse.py）。
+
+每个 SSE 事件带一个递增的 ID。连接断开后流在本工作进程中保留
+--resume-ttl 秒，用同样的请求重连并带上 "Last-Event-ID: <最后收到的 ID>"
+请求头，会补发断线后的事件并接着发送，函数不重新执行；流已不在时，
+可续传的函数（见 src/utils/resume.py）从 ID 中的检查点继续，而不是从头开始。
+
+声明了 files 的函数在独立的临时工作空间中运行（见 src/utils/workspace.py）：
+输入文件写入 data/inputs/{key}/，调用结束后收集 data/outputs/ 中的文件并
+删除工作空间，多个调用可以在同一进程中并发执行。结果缓存和行索引放在
+所有工作空间共享的缓存目录中。
+
+主进程创建监听套接字后预先 fork 出 --workers 个工作进程，各自运行一个
+asyncio 事件循环接受连接，同步函数在每个进程的 --threads 线程池中执行；
+manifest 中 "async": true 的函数直接在事件循环上执行，打开的流不占用线程。
+"pure": true 的函数的结果缓存在各工作进程的内存中（--memo-size 条，
+--memo-ttl 秒），同一进程内并发的相同调用只执行一次（见 src/utils/memo.py）。
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import contextvars
+import json
+import os
+import secrets
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# 允许从仓库根目录直接运行
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import main as prefab_main  # noqa: E402
+from src.utils.contracts import ContractChecker  # noqa: E402
+from src.utils.dispatch import Dispatcher, FunctionSpec, load_manifest  # noqa: E402
+from src.utils.memo import DEFAULT_MEMO_SIZE, DEFAULT_MEMO_TTL, MemoCache  # noqa: E402
+from src.utils.resources import available_cpus  # noqa: E402
+from src.utils.resume import StreamCheckpoint, use_checkpoint  # noqa: E402
+from src.utils.sse import (  # noqa: E402
+    DEFAULT_BUFFER_SIZE,
+    DEFAULT_REPLAY_SIZE,
+    EventBuffer,
+    EventId,
+    ReplayBuffer,
+    StreamMetrics,
+    encode_sse,
+    format_event_id,
+    parse_event_id,
+)
+from src.utils.workspace import use_workspace  # noqa: E402
+
+# 请求头的最大总字节数
+_MAX_HEADER_BYTES = 64 * 1024
+
+# 默认的请求体上限（字节）
+DEFAULT_MAX_BODY = 256 * 1024 * 1024
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+# 连接断开后流等待重连的默认秒数
+DEFAULT_RESUME_TTL = 30.0
+
+# 流式函数迭代结束的标记
+_END = object()
+
+
+class HTTPError(Exception):
+    """请求无法处理，以 status 和错误结果应答"""
+
+    def __init__(self, status: int, error: str, error_code: str):
+        super().__init__(error)
+        self.status = status
+        self.body = {"success": False, "error": error, "error_code": error_code}
+
+
+class Request(NamedTuple):
+    """解析后的 HTTP 请求"""
+
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+    keep_alive: bool
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int = DEFAULT_MAX_BODY) -> Optional[Request]:
+    """读取一个 HTTP/1.x 请求，连接已关闭时返回 None"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "请求行格式错误", "INVALID_REQUEST")
+
+    headers = {}
+    header_bytes = 0
+    while True:
+        line = await reader.readline()
+        header_bytes += len(line)
+        if header_bytes > _MAX_HEADER_BYTES:
+            raise HTTPError(400, "请求头过大", "INVALID_REQUEST")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(400, "不支持分块传输的请求体，请提供 Content-Length", "INVALID_REQUEST")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Content-Length 无效", "INVALID_REQUEST")
+    if length > max_body:
+        raise HTTPError(413, f"请求体超过 {max_body} 字节", "PAYLOAD_TOO_LARGE")
+    body = await reader.readexactly(length) if length > 0 else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return Request(method.upper(), target.split("?", 1)[0], headers, body, keep_alive)
+
+
+def _head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _write_input_files(workspace: Path, spec: FunctionSpec, files: Any) -> None:
+    """把请求中的文件写入 data/inputs/{key}/"""
+    if not isinstance(files, dict):
+        raise HTTPError(400, "files 必须是对象", "INVALID_FILES")
+    for key, items in files.items():
+        if key not in spec.input_keys:
+            raise HTTPError(400, f"{spec.name} 没有声明输入文件组: {key}", "INVALID_FILES")
+        if isinstance(items, dict):
+            items = [items]
+        inputs_dir = workspace / "data" / "inputs" / key
+        inputs_dir.mkdir(parents=True, exist_ok=True)
+        for item in items:
+            name = Path(str(item.get("name", ""))).name if isinstance(item, dict) else ""
+            if name in ("", ".", ".."):
+                raise HTTPError(400, "文件缺少有效的 name", "INVALID_FILES")
+            try:
+                content = base64.b64decode(item.get("content", ""), validate=True)
+            except (binascii.Error, TypeError, ValueError):
+                raise HTTPError(400, f"文件 {name} 的 content 不是有效的 base64", "INVALID_FILES")
+            (inputs_dir / name).write_bytes(content)
+
+
+def _collect_output_files(workspace: Path) -> List[Dict[str, Any]]:
+    """读取 data/outputs/ 中的输出文件（忽略隐藏文件，例如检查点）"""
+    outputs_dir = workspace / "data" / "outputs"
+    if not outputs_dir.is_dir():
+        return []
+    files = []
+    for path in sorted(outputs_dir.iterdir()):
+        if path.is_file() and not path.name.startswith("."):
+            content = path.read_bytes()
+            files.append({
+                "name": path.name,
+                "size": len(content),
+                "content": base64.b64encode(content).decode("ascii"),
+            })
+    return files
+
+
+class _Stream:
+    """一个 SSE 流：生产者任务、事件缓冲和补发缓冲"""
+
+    __slots__ = ("id", "name", "is_async", "buffer", "replay", "producer", "seq", "consumer", "expiry")
+
+    def __init__(self, stream_id: str, spec: FunctionSpec, buffer: EventBuffer, replay: ReplayBuffer,
+                 producer: asyncio.Future, seq: int):
+        self.id = stream_id
+        self.name = spec.name
+        self.is_async = spec.is_async
+        self.buffer = buffer
+        self.replay = replay
+        self.producer = producer
+        # 最后发出的事件序号
+        self.seq = seq
+        # 正在发送的连接（任务），以及没有连接时的过期定时器
+        self.consumer: Optional[asyncio.Task] = None
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+
+@contextmanager
+def _call_context(workspace: Optional[Path], checkpoint: StreamCheckpoint) -> Iterator[None]:
+    """在工作空间（如果有）和续传状态中执行函数"""
+    with use_checkpoint(checkpoint):
+        if workspace is None:
+            yield
+        else:
+            with use_workspace(workspace):
+                yield
+
+
+class Gateway:
+    """一个工作进程中的 HTTP 服务"""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        threads: int,
+        workspace_root: Path,
+        max_body: int = DEFAULT_MAX_BODY,
+        stream_buffer: int = DEFAULT_BUFFER_SIZE,
+        replay_events: int = DEFAULT_REPLAY_SIZE,
+        resume_ttl: float = DEFAULT_RESUME_TTL,
+    ):
+        self.dispatcher = dispatcher
+        self.workspace_root = Path(workspace_root)
+        self.max_body = max_body
+        self.stream_buffer = stream_buffer
+        self.stream_metrics = StreamMetrics()
+        self.replay_events = replay_events
+        self.resume_ttl = resume_ttl
+        # 流 ID -> 正在运行或等待重连的流
+        self._streams: Dict[str, _Stream] = {}
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="gateway")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def serve(self, sock: socket.socket) -> None:
+        """在已绑定的套接字上接受连接，直到 stop() 被调用"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(self.handle, sock=sock)
+        try:
+            async with server:
+                await self._stopped.wait()
+        finally:
+            streams = list(self._streams.values())
+            for stream in streams:
+                self._close_stream(stream)
+            await asyncio.gather(*(stream.producer for stream in streams), return_exceptions=True)
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self) -> None:
+        """停止服务（可以从其他线程或信号处理器中调用）"""
+        if self._loop and self._stopped:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _run(self, func, *args):
+        return await self._loop.run_in_executor(self._pool, func, *args)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个连接上的请求（支持 keep-alive）"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, self.max_body)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, e.body, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                try:
+                    keep_alive = await self._route(request, writer)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, e.body, request.keep_alive)
+                    keep_alive = request.keep_alive
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, body: Any, keep_alive: bool) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        writer.write(_head(status, {
+            "Content-Type": "application/json; charset=utf-8",
+            "Content-Length": str(len(payload)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            "X-Worker-Pid": str(os.getpid()),
+        }) + payload)
+        await writer.drain()
+
+    async def _route(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """分发请求，返回是否保持连接"""
+        if request.path == "/health":
+            await self._send_json(writer, 200, {"status": "ok", "pid": os.getpid()}, request.keep_alive)
+            return request.keep_alive
+        if request.path == "/metrics":
+            metrics = {"pid": os.getpid(), "sse": self.stream_metrics.snapshot(),
+                       "memo": self.dispatcher.memo.snapshot(), "contracts": self.dispatcher.contracts.snapshot()}
+            await self._send_json(writer, 200, metrics, request.keep_alive)
+            return request.keep_alive
+        if request.path == "/manifest":
+            await self._send_json(writer, 200, self.dispatcher.manifest, request.keep_alive)
+            return request.keep_alive
+
+        prefix = "/functions/"
+        if not request.path.startswith(prefix):
+            raise HTTPError(404, f"未知路径: {request.path}", "NOT_FOUND")
+        if request.method != "POST":
+            raise HTTPError(405, "函数调用只支持 POST", "METHOD_NOT_ALLOWED")
+
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的 JSON", "INVALID_REQUEST")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "请求体必须是 JSON 对象", "INVALID_REQUEST")
+
+        name = request.path[len(prefix):]
+        parameters = payload.get("parameters") or {}
+        spec, error = self.dispatcher.check(name, parameters)
+        if error:
+            raise HTTPError(404 if error["error_code"] == "FUNCTION_NOT_FOUND" else 400,
+                            error["error"], error["error_code"])
+
+        last_event = parse_event_id(request.headers.get("last-event-id", "")) if spec.streaming else None
+        found = self._find_stream(spec, last_event)
+        if found:
+            self.stream_metrics.streams_resumed += 1
+            stream, replay = found
+            await self._send_stream(stream, writer, replay)
+            return False
+
+        workspace = None
+        if spec.input_keys or spec.output_keys:
+            workspace = Path(await self._run(tempfile.mkdtemp, "", "call-", str(self.workspace_root)))
+        try:
+            if workspace is not None and payload.get("files"):
+                await self._run(_write_input_files, workspace, spec, payload["files"])
+            if spec.streaming:
+                stream = self._start_stream(spec, parameters, workspace, last_event)
+                # 工作空间交给流，在生产者结束时删除
+                workspace = None
+                await self._send_stream(stream, writer)
+                return False
+            if spec.is_async:
+                result = await self._acall(spec, parameters, workspace)
+            else:
+                result = await self._run(self._call, spec, parameters, workspace)
+            output_files = await self._run(_collect_output_files, workspace) if workspace else []
+        finally:
+            if workspace is not None:
+                await self._run(shutil.rmtree, workspace, True)
+        await self._send_json(writer, 200, {"result": result, "output_files": output_files}, request.keep_alive)
+        return request.keep_alive
+
+    def _call(self, spec: FunctionSpec, parameters: Dict[str, Any], workspace: Optional[Path]) -> dict:
+        """在线程池中执行普通函数"""
+        if workspace is None:
+            return self.dispatcher.call(spec.name, parameters)
+        with use_workspace(workspace):
+            return self.dispatcher.call(spec.name, parameters)
+
+    async def _acall(self, spec: FunctionSpec, parameters: Dict[str, Any], workspace: Optional[Path]) -> dict:
+        """在事件循环上执行异步函数（每个连接是独立的任务，工作空间互不影响）"""
+        if workspace is None:
+            return await self.dispatcher.acall(spec.name, parameters)
+        with use_workspace(workspace):
+            return await self.dispatcher.acall(spec.name, parameters)
+
+    async def _aevents(self, spec: FunctionSpec, parameters: Dict[str, Any], workspace: Optional[Path],
+                       checkpoint: StreamCheckpoint) -> AsyncIterator[Dict[str, Any]]:
+        events = self.dispatcher.astream(spec.name, parameters)
+        try:
+            with _call_context(workspace, checkpoint):
+                async for event in events:
+                    yield event
+        finally:
+            await events.aclose()
+
+    def _events(self, spec: FunctionSpec, parameters: Dict[str, Any], workspace: Optional[Path],
+                checkpoint: StreamCheckpoint) -> Iterator[Dict[str, Any]]:
+        with _call_context(workspace, checkpoint):
+            yield from self.dispatcher.stream(spec.name, parameters)
+
+    async def _produce(self, spec: FunctionSpec, parameters: Dict[str, Any], workspace: Optional[Path],
+                       buffer: EventBuffer, checkpoint: StreamCheckpoint) -> None:
+        """生产者：把函数产出的事件放入缓冲区，不等待客户端写完；结束后删除工作空间"""
+        try:
+            if spec.is_async:
+                # 异步生成器直接在事件循环上迭代，等待期间不占用线程
+                events = self._aevents(spec, parameters, workspace, checkpoint)
+                try:
+                    async for event in events:
+                        if not await buffer.put(event, checkpoint.state):
+                            break
+                finally:
+                    await events.aclose()
+            else:
+                events = self._events(spec, parameters, workspace, checkpoint)
+                # 每次 next() 可能落在不同的线程上：都在同一个上下文中执行，工作空间才能正确进入和退出
+                ctx = contextvars.copy_context()
+                try:
+                    while True:
+                        event = await self._run(ctx.run, next, events, _END)
+                        if event is _END or not await buffer.put(event, checkpoint.state):
+                            break
+                finally:
+                    await self._run(ctx.run, events.close)
+            if workspace is not None and not buffer.closed:
+                files = await self._run(_collect_output_files, workspace)
+                await buffer.put({"type": "output_files", "data": files})
+        finally:
+            buffer.close()
+            if workspace is not None:
+                await self._run(shutil.rmtree, workspace, True)
+
+    def _start_stream(self, spec: FunctionSpec, parameters: Dict[str, Any], workspace: Optional[Path],
+                      last_event: Optional[EventId]) -> _Stream:
+        """启动流式函数；last_event 带有检查点时让函数从检查点续传"""
+        resume = last_event.checkpoint if last_event else None
+        if resume is not None:
+            self.stream_metrics.streams_resumed += 1
+        buffer = EventBuffer(self.stream_buffer, self.stream_metrics)
+        producer = asyncio.ensure_future(
+            self._produce(spec, parameters, workspace, buffer, StreamCheckpoint(resume)))
+        # 续传时序号接着客户端最后收到的继续，客户端看到的 ID 始终递增
+        stream = _Stream(secrets.token_hex(8), spec, buffer, ReplayBuffer(self.replay_events), producer,
+                         last_event.seq if last_event else 0)
+        self._streams[stream.id] = stream
+        return stream
+
+    def _find_stream(self, spec: FunctionSpec, last_event: Optional[EventId]) -> Optional[Tuple[_Stream, list]]:
+        """last_event 所在的流仍在本进程中、且断线后发出的事件都还在补发缓冲区中时，返回 (流, 要补发的消息)"""
+        stream = self._streams.get(last_event.stream_id) if last_event else None
+        if stream is None or stream.name != spec.name:
+            return None
+        messages = stream.replay.since(last_event.seq, stream.seq)
+        return None if messages is None else (stream, messages)
+
+    async def _send_stream(self, stream: _Stream, writer: asyncio.StreamWriter, replay: list = ()) -> None:
+        """
+        以 SSE 发送流的事件，先补发 replay 中的消息
+
+        函数在生产者任务中运行，事件经有界缓冲区（src/utils/sse.py）交给
+        这里：客户端读得慢时连续的 progress 事件被合并为最新的一个。每个
+        事件带一个递增的 ID，发出后记入补发缓冲区。同一个流同时只有一个
+        连接在发送，重连的连接接管旧连接。
+        """
+        writer.write(_head(200, {
+            "Content-Type": "text/event-stream; charset=utf-8",
+            "Cache-Control": "no-cache",
+            "Connection": "close",
+            "X-Worker-Pid": str(os.getpid()),
+        }))
+        if stream.consumer is not None:
+            stream.consumer.cancel()
+        if stream.expiry is not None:
+            stream.expiry.cancel()
+            stream.expiry = None
+        stream.consumer = asyncio.current_task()
+        try:
+            if replay:
+                self.stream_metrics.events_replayed += len(replay)
+                writer.write(b"".join(replay))
+                await writer.drain()
+            while True:
+                item = await stream.buffer.get()
+                if item is None:
+                    break
+                stream.seq += 1
+                message = encode_sse(item.event, format_event_id(stream.id, stream.seq, item.checkpoint))
+                stream.replay.append(stream.seq, message)
+                writer.write(message)
+                await writer.drain()
+        finally:
+            if stream.consumer is asyncio.current_task():
+                stream.consumer = None
+                self._detach(stream)
+
+    def _detach(self, stream: _Stream) -> None:
+        """连接离开后流保留 resume_ttl 秒等待重连，期间生产者继续运行（慢时由背压暂停）"""
+        if self.resume_ttl > 0:
+            stream.expiry = self._loop.call_later(self.resume_ttl, self._close_stream, stream)
+        else:
+            self._close_stream(stream)
+
+    def _close_stream(self, stream: _Stream) -> None:
+        """丢弃流：剩余事件被丢弃，生产者在下一次 put() 时停止并关闭生成器"""
+        if self._streams.get(stream.id) is stream:
+            del self._streams[stream.id]
+        stream.buffer.discard()
+        # 同步生成器可能正在线程中执行 next()，只能等它返回；异步生成器直接取消
+        if stream.is_async:
+            stream.producer.cancel()
+
+
+def _run_worker(sock: socket.socket, dispatcher: Dispatcher, args) -> None:
+    """工作进程：运行事件循环直到收到 SIGTERM / SIGINT"""
+    gateway = Gateway(dispatcher, args.threads, args.workspace_root, args.max_body, args.stream_buffer,
+                      args.replay_events, args.resume_ttl)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, gateway.stop)
+        await gateway.serve(sock)
+
+    asyncio.run(run())
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地 Gateway")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口（0 表示随机端口）")
+    parser.add_argument("--workers", type=int, default=available_cpus(), help="预派生的工作进程数")
+    parser.add_argument("--threads", type=int, default=available_cpus() + 4, help="每个工作进程执行同步函数的线程数")
+    parser.add_argument("--manifest", type=Path, default=None, help="manifest 路径（默认是仓库根目录下的）")
+    parser.add_argument("--workspace-root", type=Path, default=None, help="临时工作空间的根目录")
+    parser.add_argument("--max-body", type=int, default=DEFAULT_MAX_BODY, help="请求体上限（字节）")
+    parser.add_argument("--stream-buffer", type=int, default=DEFAULT_BUFFER_SIZE,
+                        help="每个 SSE 流最多缓冲的事件数（客户端慢时合并 progress 事件）")
+    parser.add_argument("--replay-events", type=int, default=DEFAULT_REPLAY_SIZE,
+                        help="每个 SSE 流保存的已发出事件数（断线重连后补发）")
+    parser.add_argument("--resume-ttl", type=float, default=DEFAULT_RESUME_TTL,
+                        help="SSE 连接断开后流等待重连的秒数（0 表示立即取消）")
+    parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE,
+                        help="每个工作进程最多缓存的纯函数结果数（0 表示不缓存）")
+    parser.add_argument("--memo-ttl", type=float, default=DEFAULT_MEMO_TTL, help="纯函数结果的缓存秒数")
+    parser.add_argument("--contract-sample-rate", type=float, default=None,
+                        help="按 manifest 检查返回值的调用比例（0~1，默认取 PREFAB_CONTRACT_SAMPLE_RATE 或 0.01）")
+    args = parser.parse_args()
+
+    # 只加载一次 manifest、导入一次 src.main，工作进程 fork 后直接复用（结果缓存在 fork 时为空，各进程独立）
+    manifest = load_manifest(args.manifest)
+    dispatcher = Dispatcher(manifest, prefab_main, MemoCache(args.memo_size, args.memo_ttl),
+                            ContractChecker(manifest, args.contract_sample_rate))
+    cleanup = args.workspace_root is None
+    args.workspace_root = Path(args.workspace_root or tempfile.mkdtemp(prefix="prefab-gateway-")).resolve()
+    args.workspace_root.mkdir(parents=True, exist_ok=True)
+    # 结果缓存和行索引在所有调用之间共享，不随临时工作空间删除
+    os.environ.setdefault(prefab_main.CACHE_DIR_ENV, str(args.workspace_root / "cache"))
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    port = sock.getsockname()[1]
+    workers = max(1, args.workers) if hasattr(os, "fork") else 1
+    print(f"本地 Gateway 已启动: http://{args.host}:{port}（{workers} 个工作进程，"
+          f"每个 {args.threads} 个线程）", flush=True)
+
+    try:
+        if workers == 1:
+            _run_worker(sock, dispatcher, args)
+            return
+
+        pids = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    _run_worker(sock, dispatcher, args)
+                except BaseException:
+                    code = 1
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+
+        def shutdown(signum, frame):
+            for child in pids:
+                try:
+                    os.kill(child, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        for child in pids:
+            while True:
+                try:
+                    os.waitpid(child, 0)
+                    break
+                except InterruptedError:
+                    continue
+                except ChildProcessError:
+                    break
+    finally:
+        sock.close()
+        if cleanup:
+            shutil.rmtree(args.workspace_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,12 @@
 3. manifest.json 的格式正确
 4. 类型系统规范
 5. secrets 字段规范
+6. streaming 字段与生成器函数一致
+7. 参数的 default 符合声明的类型（支持 ["string", "array"] 这样的联合类型）和 enum
+8. async 字段与 async def 函数一致
+9. pure 字段只用于没有副作用的普通函数（非流式、非异步、不收发文件、不使用 secrets）
+10. 参数的 error_code 在函数的 returns.error_code.enum 中，取值范围约束的类型正确，
+    default 与 main.py 中的默认值一致（Dispatcher 用它补齐未传入的参数）
 """
 
 import ast
@@ -30,6 +36,16 @@ VALID_TYPES = {
     'OutputFile'
 }
 
+# 参数 default 值对应的 Python 类型
+JSON_TYPES = {
+    'string': (str,),
+    'number': (int, float),
+    'integer': (int,),
+    'boolean': (bool,),
+    'object': (dict,),
+    'array': (list,),
+}
+
 # secrets 名称格式（大写字母、数字和下划线）
 SECRET_NAME_PATTERN = re.compile(r'^[A-Z0-9_]+$')
 
@@ -100,6 +116,19 @@ def load_manifest():
         return None
 
 
+def is_generator_function(node):
+    """判断函数体中是否包含 yield（不计算嵌套函数中的 yield）"""
+    stack = list(node.body)
+    while stack:
+        child = stack.pop()
+        if isinstance(child, (ast.Yield, ast.YieldFrom)):
+            return True
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            continue
+        stack.extend(ast.iter_child_nodes(child))
+    return False
+
+
 def extract_function_signatures(main_py_path):
     """从 main.py 提取函数签名"""
     if not main_py_path.exists():
@@ -114,21 +143,11 @@ def extract_function_signatures(main_py_path):
         return None
 
     functions = {}
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # 只提取模块级别的函数（不在类内部）
-            # 检查函数是否在类定义内部
-            is_in_class = False
-            for parent in ast.walk(tree):
-                if isinstance(parent, ast.ClassDef):
-                    parent_body = getattr(parent, 'body', [])
-                    # 确保 body 是列表类型再检查
-                    if isinstance(parent_body, list) and node in parent_body:
-                        is_in_class = True
-                        break
-
-            # 只处理不在类中的函数，且不是以 _ 开头的私有函数
-            if not is_in_class and not node.name.startswith('_'):
+    # 只提取模块级别的函数（不包括类方法和函数内部定义的嵌套函数）
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            # 跳过以 _ 开头的私有函数
+            if not node.name.startswith('_'):
                 params = []
                 defaults_start = len(node.args.args) - len(node.args.defaults)
 
@@ -137,9 +156,19 @@ def extract_function_signatures(main_py_path):
                         'name': arg.arg,
                         'required': i < defaults_start
                     }
+                    if i >= defaults_start:
+                        try:
+                            param_info['default'] = ast.literal_eval(node.args.defaults[i - defaults_start])
+                        except ValueError:
+                            # 默认值不是字面量（例如引用了常量），无法比较
+                            pass
                     params.append(param_info)
 
-                functions[node.name] = params
+                functions[node.name] = {
+                    'params': params,
+                    'is_generator': is_generator_function(node),
+                    'is_async': isinstance(node, ast.AsyncFunctionDef)
+                }
 
     return functions
 
@@ -171,9 +200,13 @@ def validate_type_recursive(obj, path=""):
     if isinstance(obj, dict):
         # 检查当前对象的 type 字段
         if 'type' in obj:
-            type_value = obj['type']
-            if type_value not in VALID_TYPES:
-                errors.append(f"{path}: 无效的类型 '{type_value}'，必须是以下之一: {', '.join(sorted(VALID_TYPES))}")
+            # 支持 JSON Schema 的联合类型写法，例如 ["string", "array"]
+            type_values = obj['type'] if isinstance(obj['type'], list) else [obj['type']]
+            if not type_values:
+                errors.append(f"{path}: type 列表不能为空")
+            for type_value in type_values:
+                if not isinstance(type_value, str) or type_value not in VALID_TYPES:
+                    errors.append(f"{path}: 无效的类型 '{type_value}'，必须是以下之一: {', '.join(sorted(VALID_TYPES))}")
 
         # 递归检查子对象
         if 'properties' in obj and isinstance(obj['properties'], dict):
@@ -213,6 +246,68 @@ def validate_type_system(manifest):
     return errors
 
 
+def _matches_type(value, type_name):
+    """判断 JSON 值是否属于给定类型（bool 不算作 number/integer）"""
+    if isinstance(value, bool) and type_name != 'boolean':
+        return False
+    return isinstance(value, JSON_TYPES.get(type_name, ()))
+
+
+def validate_parameter_values(func_name, param):
+    """验证参数的 enum、items 与 default 是否与声明的类型一致"""
+    errors = []
+    param_name = param.get('name', 'unknown')
+    prefix = f"函数 '{func_name}' 的参数 '{param_name}'"
+    types = param.get('type')
+    types = types if isinstance(types, list) else [types]
+
+    if 'array' in types and 'items' not in param:
+        errors.append(f"{prefix}: array 类型必须定义 'items'")
+
+    for spec, where in ((param, ''), (param.get('items', {}), 'items.')):
+        if 'enum' in spec and (not isinstance(spec['enum'], list) or not spec['enum']):
+            errors.append(f"{prefix}: {where}enum 必须是非空数组")
+
+    if 'default' in param:
+        default = param['default']
+        if not any(_matches_type(default, t) for t in types):
+            errors.append(f"{prefix}: default 值 {default!r} 不符合类型 {types}")
+        elif isinstance(default, list):
+            allowed = param.get('items', {}).get('enum')
+            invalid = [v for v in default if allowed and v not in allowed]
+            if invalid:
+                errors.append(f"{prefix}: default 中的 {invalid} 不在 items.enum 中")
+        elif isinstance(param.get('enum'), list) and default not in param['enum']:
+            errors.append(f"{prefix}: default 值 {default!r} 不在 enum 中")
+
+    for key in ('minimum', 'maximum'):
+        if key in param and not (_matches_type(param[key], 'number') and {'integer', 'number'} & set(types)):
+            errors.append(f"{prefix}: {key} 只能用于 integer / number 类型，且必须是数字")
+    for key, type_name in (('minLength', 'string'), ('maxLength', 'string'), ('minItems', 'array'),
+                           ('maxItems', 'array')):
+        if key in param and not (_matches_type(param[key], 'integer') and param[key] >= 0 and type_name in types):
+            errors.append(f"{prefix}: {key} 只能用于 {type_name} 类型，且必须是非负整数")
+
+    return errors
+
+
+def validate_parameter_error_code(func_name, param, returns):
+    """验证参数（及数组参数 items）的 error_code 是函数声明过的错误代码"""
+    prefix = f"函数 '{func_name}' 的参数 '{param.get('name', 'unknown')}'"
+    declared = returns.get('properties', {}).get('error_code', {}).get('enum')
+    items = param.get('items')
+    errors = []
+    for field, spec in (('error_code', param), ('items.error_code', items if isinstance(items, dict) else {})):
+        if 'error_code' not in spec:
+            continue
+        error_code = spec['error_code']
+        if not isinstance(error_code, str):
+            errors.append(f"{prefix}: {field} 必须是字符串")
+        elif isinstance(declared, list) and error_code not in declared:
+            errors.append(f"{prefix}: {field} '{error_code}' 不在 returns.error_code.enum 中")
+    return errors
+
+
 def validate_secrets(manifest):
     """验证 manifest 中的 secrets 字段规范"""
     errors = []
@@ -286,9 +381,51 @@ def validate_functions(manifest, actual_functions):
             file_errors = validate_files_definition(func_name, func_def['files'])
             errors.extend(file_errors)
 
+        # 验证 streaming 字段：流式函数必须是生成器函数，反之亦然
+        streaming = func_def.get('streaming', False)
+        if not isinstance(streaming, bool):
+            errors.append(f"函数 '{func_name}': streaming 必须是布尔类型")
+        elif streaming and not actual_functions[func_name]['is_generator']:
+            errors.append(f"函数 '{func_name}': 声明了 \"streaming\": true，但在 main.py 中不是生成器函数（缺少 yield）")
+        elif not streaming and actual_functions[func_name]['is_generator']:
+            errors.append(f"函数 '{func_name}': 是生成器函数，manifest 中应设置 \"streaming\": true")
+
+        # 验证 async 字段：异步函数（async def）必须声明 "async": true，反之亦然
+        is_async = func_def.get('async', False)
+        if not isinstance(is_async, bool):
+            errors.append(f"函数 '{func_name}': async 必须是布尔类型")
+        elif is_async and not actual_functions[func_name].get('is_async'):
+            errors.append(f"函数 '{func_name}': 声明了 \"async\": true，但在 main.py 中不是 async def 函数")
+        elif not is_async and actual_functions[func_name].get('is_async'):
+            errors.append(f"函数 '{func_name}': 是 async def 函数，manifest 中应设置 \"async\": true")
+
+        # 验证 pure 字段：结果会被缓存，只能用于没有副作用的普通函数
+        pure = func_def.get('pure', False)
+        if not isinstance(pure, bool):
+            errors.append(f"函数 '{func_name}': pure 必须是布尔类型")
+        elif pure:
+            kinds = [kind for kind, present in (
+                ('流式', streaming is True),
+                ('异步', is_async is True),
+                ('收发文件', bool(func_def.get('files'))),
+                ('使用 secrets', bool(func_def.get('secrets'))),
+            ) if present]
+            if kinds:
+                errors.append(f"函数 '{func_name}': 声明了 \"pure\": true，但它是{'、'.join(kinds)}的函数，结果不能缓存")
+
         # 验证参数（files 中的参数不应该在函数签名中）
         manifest_params = {p['name']: p for p in func_def.get('parameters', [])}
-        actual_params = {p['name']: p for p in actual_functions[func_name]}
+        actual_params = {p['name']: p for p in actual_functions[func_name]['params']}
+
+        for param_info in manifest_params.values():
+            errors.extend(validate_parameter_values(func_name, param_info))
+            errors.extend(validate_parameter_error_code(func_name, param_info, func_def.get('returns', {})))
+            actual = actual_params.get(param_info['name'], {})
+            # main.py 中默认值为 None 的参数通常在函数内部再取默认值，不做比较
+            if 'default' in param_info and actual.get('default') is not None \
+                    and param_info['default'] != actual['default']:
+                errors.append(f"函数 '{func_name}' 的参数 '{param_info['name']}': manifest 中的 default "
+                              f"{param_info['default']!r} 与 main.py 中的默认值 {actual['default']!r} 不一致")
 
         # 检查必需参数
         for param_name, param_info in manifest_params.items():
@@ -315,6 +452,10 @@ def validate_functions(manifest, actual_functions):
             if 'description' not in returns:
                 warnings.append(f"函数 '{func_name}': returns 缺少 'description' 字段")
 
+            # 流式函数的 returns 描述的是单个事件，必须包含 type 字段
+            if streaming is True and 'type' not in returns.get('properties', {}):
+                warnings.append(f"函数 '{func_name}': 流式函数的 returns.properties 应描述事件的 'type' 字段")
+
             # 如果是 object 类型，建议定义 properties
             if returns.get('type') == 'object':
                 if 'properties' not in returns:
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+本地天气服务
+
+实现 src/utils/weather_client.py 调用的接口，不依赖外部服务就能测试
+fetch_weather、测量连接池的延迟和吞吐量（见 scripts/benchmark.py weather）。
+同一个城市总是返回同样的天气。
+
+用法:
+    python scripts/weather_server.py                                  # 127.0.0.1:8100
+    python scripts/weather_server.py --port 0 --latency 0.005 --api-key test-key
+
+    PREFAB_WEATHER_API_URL=http://127.0.0.1:8100 WEATHER_API_KEY=test-key ...
+
+接口:
+    GET /current?city=<城市>   当前天气 {"city", "temperature", "condition"}；
+                               配置了 --api-key 时 X-API-Key 请求头不匹配返回 401，
+                               配置了 --cities 时其他城市返回 404
+    GET /stats                 收到的连接数和请求数
+
+连接支持 HTTP/1.1 keep-alive，空闲超过 --idle-timeout 秒的连接由服务端关闭。
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Iterator, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# 天气状况（按城市名的哈希选取）
+CONDITIONS = ("晴天", "多云", "阴天", "小雨", "大雨", "雷阵雨", "小雪", "雾")
+
+
+def weather_for(city: str) -> dict:
+    """城市的（固定的）模拟天气"""
+    digest = zlib.crc32(city.encode("utf-8"))
+    return {
+        "city": city,
+        "temperature": round(-10 + digest % 450 / 10, 1),
+        "condition": CONDITIONS[digest // 450 % len(CONDITIONS)],
+    }
+
+
+class WeatherServer(ThreadingHTTPServer):
+    """本地天气服务（每个连接一个线程）"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address=("127.0.0.1", 0), api_key: Optional[str] = None, latency: float = 0.0,
+                 cities: Optional[Iterable[str]] = None, idle_timeout: float = 60.0):
+        self.api_key = api_key
+        self.latency = latency
+        self.cities = frozenset(cities) if cities is not None else None
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # 客户端超时后关闭连接很常见，不打印堆栈
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+    def count(self, connection: bool = False) -> None:
+        with self._lock:
+            if connection:
+                self.connections += 1
+            else:
+                self.requests += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出，关闭 Nagle 算法避免等待客户端的延迟确认
+    disable_nagle_algorithm = True
+    server: WeatherServer
+
+    def setup(self):
+        self.timeout = self.server.idle_timeout
+        super().setup()
+        self.server.count(connection=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.count()
+        url = urlsplit(self.path)
+        if url.path == "/stats":
+            self._send(200, {"connections": self.server.connections, "requests": self.server.requests})
+            return
+        if url.path != "/current":
+            self._send(404, {"error": "not found"})
+            return
+        if self.server.api_key is not None and self.headers.get("X-API-Key") != self.server.api_key:
+            self._send(401, {"error": "invalid api key"})
+            return
+        city = parse_qs(url.query).get("city", [""])[0]
+        if not city:
+            self._send(400, {"error": "missing city"})
+            return
+        if self.server.cities is not None and city not in self.server.cities:
+            self._send(404, {"error": f"unknown city: {city}"})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self._send(200, weather_for(city))
+
+
+@contextmanager
+def running(**kwargs) -> Iterator[WeatherServer]:
+    """在后台线程中运行天气服务，退出时停止"""
+    server = WeatherServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地天气服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8100, help="监听端口（0 表示随机端口）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟处理时间（秒）")
+    parser.add_argument("--api-key", default=None, help="要求的 X-API-Key（默认不检查）")
+    parser.add_argument("--cities", nargs="+", default=None, help="已知的城市（默认任何城市都返回天气）")
+    parser.add_argument("--idle-timeout", type=float, default=60.0, help="关闭空闲连接前等待的秒数")
+    args = parser.parse_args()
+
+    server = WeatherServer((args.host, args.port), args.api_key, args.latency, args.cities, args.idle_timeout)
+    print(f"本地天气服务已启动: {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,26 @@
 这个文件定义了预制件对外暴露的函数列表。
 """
 
-from .main import add_numbers, echo, fetch_weather, greet, process_text_file
+from .main import (
+    add_numbers,
+    batch_call,
+    count_stream,
+    count_stream_async,
+    echo,
+    fetch_weather,
+    greet,
+    process_text_file,
+    process_text_file_stream,
+)
 
 __all__ = [
     "greet",
     "echo",
     "add_numbers",
+    "batch_call",
     "process_text_file",
+    "process_text_file_stream",
     "fetch_weather",
+    "count_stream",
+    "count_stream_async",
 ]
@@ -23,18 +23,619 @@
 - 适用于实时输出、进度报告、大数据处理等场景
 """
 
+import contextvars
+import functools
 import os
+import queue
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Iterator
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    # 优先使用相对导入（打包时）
+    from .utils.compression import (
+        CODECS,
+        DECOMPRESSION_ERRORS,
+        SUFFIXES,
+        detect_compression,
+        estimated_size,
+        transform_compressed_file,
+    )
+    from .utils.dispatch import Dispatcher, current_dispatcher, load_manifest
+    from .utils.incremental import incremental_transform_file
+    from .utils.line_index import LineIndexStore, TextRange, parse_range, transform_range_file
+    from .utils.pipeline import Pipeline, build_ascii_transform, build_transform, compile_pipeline, parse_steps
+    from .utils.resources import available_cpus, max_workers
+    from .utils.result_cache import ResultCache
+    from .utils.resume import resumable, resume_state, save_checkpoint
+    from .utils.scheduler import get_scheduler
+    from .utils.sharding import shard_transform_file
+    from .utils.text_stream import (
+        DEFAULT_CHUNK_SIZE,
+        ProgressCallback,
+        reverse_file,
+        transform_file,
+    )
+    from .utils.vector_math import add_arrays, is_array
+    from .utils.weather_cache import DEFAULT_GRACE, DEFAULT_TTL, WeatherCache
+    from .utils.weather_client import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, WeatherAPIError, WeatherClient
+    from .utils.workspace import current_workspace
+except ImportError:
+    # 回退到绝对导入（开发/测试时）
+    from utils.compression import (
+        CODECS,
+        DECOMPRESSION_ERRORS,
+        SUFFIXES,
+        detect_compression,
+        estimated_size,
+        transform_compressed_file,
+    )
+    from utils.dispatch import Dispatcher, current_dispatcher, load_manifest
+    from utils.incremental import incremental_transform_file
+    from utils.line_index import LineIndexStore, TextRange, parse_range, transform_range_file
+    from utils.pipeline import Pipeline, build_ascii_transform, build_transform, compile_pipeline, parse_steps
+    from utils.resources import available_cpus, max_workers
+    from utils.result_cache import ResultCache
+    from utils.resume import resumable, resume_state, save_checkpoint
+    from utils.scheduler import get_scheduler
+    from utils.sharding import shard_transform_file
+    from utils.text_stream import (
+        DEFAULT_CHUNK_SIZE,
+        ProgressCallback,
+        reverse_file,
+        transform_file,
+    )
+    from utils.vector_math import add_arrays, is_array
+    from utils.weather_cache import DEFAULT_GRACE, DEFAULT_TTL, WeatherCache
+    from utils.weather_client import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, WeatherAPIError, WeatherClient
+    from utils.workspace import current_workspace
 
 # 固定路径常量
 # 文件组按 manifest 中的 key 组织（这里是 "input"）
 # 如果你的 manifest 中使用不同的 key，请相应修改路径
 # 例如：files.video → Path("data/inputs/video")
+# 这些路径相对于当前调用的工作空间解析（默认是当前工作目录，见 utils/workspace.py）
 DATA_INPUTS = Path("data/inputs/input")
 DATA_OUTPUTS = Path("data/outputs")
 
+# 流式处理的块大小（字节），可通过环境变量 PREFAB_CHUNK_SIZE 调整
+CHUNK_SIZE_ENV = "PREFAB_CHUNK_SIZE"
+
+# 单个文件达到该大小（字节）时按分片并行处理，可通过 PREFAB_SHARD_THRESHOLD 调整
+SHARD_THRESHOLD_ENV = "PREFAB_SHARD_THRESHOLD"
+DEFAULT_SHARD_THRESHOLD = 64 * 1024 * 1024
+
+# 结果缓存目录和容量上限（字节），容量为 0 时禁用缓存
+CACHE_DIR_ENV = "PREFAB_CACHE_DIR"
+CACHE_MAX_BYTES_ENV = "PREFAB_CACHE_MAX_BYTES"
+DEFAULT_CACHE_DIR = Path("data/cache")
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 请求压缩输出时，只压缩（解压后）不小于该大小的文件，可通过 PREFAB_COMPRESS_MIN_BYTES 调整
+COMPRESS_MIN_BYTES_ENV = "PREFAB_COMPRESS_MIN_BYTES"
+DEFAULT_COMPRESS_MIN_BYTES = 64 * 1024
+
+# 可续传的流式调用每处理这么多输入字节（在换行处）保存一次检查点，可通过 PREFAB_STREAM_CHECKPOINT_BYTES 调整
+STREAM_CHECKPOINT_BYTES_ENV = "PREFAB_STREAM_CHECKPOINT_BYTES"
+DEFAULT_STREAM_CHECKPOINT_BYTES = 16 * 1024 * 1024
+
+# 天气服务地址，未配置时 fetch_weather 返回演示数据（本地可用 scripts/weather_server.py）
+WEATHER_API_URL_ENV = "PREFAB_WEATHER_API_URL"
+
+# 到天气服务的连接池大小和单次请求超时（秒）
+WEATHER_POOL_SIZE_ENV = "PREFAB_WEATHER_POOL_SIZE"
+WEATHER_TIMEOUT_ENV = "PREFAB_WEATHER_TIMEOUT"
+
+# 天气结果的缓存秒数（0 表示不缓存）和过期后仍先返回旧结果、后台刷新的秒数
+WEATHER_CACHE_TTL_ENV = "PREFAB_WEATHER_CACHE_TTL"
+WEATHER_CACHE_GRACE_ENV = "PREFAB_WEATHER_CACHE_GRACE"
+
+# 未指定范围时的 (start_line, end_line, start_byte, end_byte)
+DEFAULT_TEXT_RANGE = (1, -1, 0, -1)
+
+# batch_call 单次最多的参数组数
+MAX_BATCH_ITEMS = 1000
+
+
+def _chunk_size() -> int:
+    """读取流式处理的块大小，未配置时使用默认值"""
+    value = os.environ.get(CHUNK_SIZE_ENV)
+    if not value:
+        return DEFAULT_CHUNK_SIZE
+    return max(1, int(value))
+
+
+def _shard_threshold() -> int:
+    """读取分片阈值，0 表示禁用分片"""
+    value = os.environ.get(SHARD_THRESHOLD_ENV)
+    if not value:
+        return DEFAULT_SHARD_THRESHOLD
+    return max(0, int(value))
+
+
+def _stream_checkpoint_bytes() -> int:
+    """读取流式调用保存检查点的间隔，0 表示只在每个文件处理完时保存"""
+    value = os.environ.get(STREAM_CHECKPOINT_BYTES_ENV)
+    if not value:
+        return DEFAULT_STREAM_CHECKPOINT_BYTES
+    return max(0, int(value))
+
+
+class _StreamResume(NamedTuple):
+    """可续传的流式调用：处理过程中保存检查点，resume 为 True 时从已保存的检查点继续"""
+
+    resume: bool
+    # 每个文件保存检查点后以 (文件名, 输入偏移, 输出偏移) 调用
+    on_checkpoint: Callable[[str, int, int], None]
+
+
+def _cache_root() -> Path:
+    """读取缓存目录（相对路径相对于当前工作空间）"""
+    return current_workspace().resolve(os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR)
+
+
+def _result_cache() -> Optional[ResultCache]:
+    """按环境变量创建结果缓存，禁用时返回 None"""
+    value = os.environ.get(CACHE_MAX_BYTES_ENV)
+    max_bytes = int(value) if value else DEFAULT_CACHE_MAX_BYTES
+    if max_bytes <= 0:
+        return None
+    return ResultCache(_cache_root(), max_bytes)
+
+
+def _line_index_store() -> LineIndexStore:
+    """行索引保存在缓存目录下的 line_index/ 中"""
+    return LineIndexStore(_cache_root() / "line_index")
+
+
+def _incremental_state_dir() -> Path:
+    """增量处理的检查点和输出副本保存在缓存目录下的 incremental/ 中"""
+    return _cache_root() / "incremental"
+
+
+@functools.lru_cache(maxsize=1)
+def _dispatcher() -> Dispatcher:
+    """直接调用 batch_call（不经过 Dispatcher）时使用的 Dispatcher（第一次需要时创建）"""
+    return Dispatcher(load_manifest(), sys.modules[__name__])
+
+
+@functools.lru_cache(maxsize=None)
+def _weather_client_for(url: str, pool_size: int, timeout: float) -> WeatherClient:
+    """每种配置一个客户端，连接池在同一进程的所有调用之间共享"""
+    return WeatherClient(url, pool_size, timeout)
+
+
+def _weather_client() -> Optional[WeatherClient]:
+    """按环境变量取天气服务客户端，未配置服务地址时返回 None"""
+    url = os.environ.get(WEATHER_API_URL_ENV)
+    if not url:
+        return None
+    pool_size = os.environ.get(WEATHER_POOL_SIZE_ENV)
+    timeout = os.environ.get(WEATHER_TIMEOUT_ENV)
+    return _weather_client_for(
+        url,
+        max(1, int(pool_size)) if pool_size else DEFAULT_POOL_SIZE,
+        float(timeout) if timeout else DEFAULT_TIMEOUT,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _weather_cache_for(url: str, ttl: float, grace: float) -> WeatherCache:
+    """每个天气服务地址和缓存配置一个缓存"""
+    return WeatherCache(ttl, grace)
+
+
+def _weather_cache() -> WeatherCache:
+    """按环境变量取天气结果缓存（调用方已确认配置了服务地址）"""
+    ttl = os.environ.get(WEATHER_CACHE_TTL_ENV)
+    grace = os.environ.get(WEATHER_CACHE_GRACE_ENV)
+    return _weather_cache_for(
+        os.environ[WEATHER_API_URL_ENV],
+        max(0.0, float(ttl)) if ttl else DEFAULT_TTL,
+        max(0.0, float(grace)) if grace else DEFAULT_GRACE,
+    )
+
+
+def _compress_min_bytes() -> int:
+    """读取输出压缩的大小阈值"""
+    value = os.environ.get(COMPRESS_MIN_BYTES_ENV)
+    if not value:
+        return DEFAULT_COMPRESS_MIN_BYTES
+    return max(0, int(value))
+
+
+def _list_input_files() -> List[Path]:
+    """扫描当前工作空间输入目录中的所有文件（按文件名排序）"""
+    return sorted(p for p in current_workspace().resolve(DATA_INPUTS).glob("*") if p.is_file())
+
+
+def _output_name(input_path: Path, input_codec: Optional[str], output_codec: Optional[str]) -> str:
+    """输出文件名：去掉已解压输入的压缩后缀，按需加上输出的压缩后缀"""
+    name = input_path.name
+    if input_codec and name.endswith(SUFFIXES[input_codec]):
+        name = name[:-len(SUFFIXES[input_codec])]
+    if output_codec:
+        name += SUFFIXES[output_codec]
+    return f"processed_{name}"
+
+
+def _output_plan(input_path: Path, input_codec: Optional[str], output_compression: str) -> Tuple[Optional[str], Path]:
+    """决定输出的压缩格式（小文件不压缩）和输出路径"""
+    output_codec = None
+    if output_compression != "none" and estimated_size(input_path, input_codec) >= _compress_min_bytes():
+        output_codec = output_compression
+    return output_codec, current_workspace().resolve(DATA_OUTPUTS) / _output_name(input_path, input_codec, output_codec)
+
+
+def _run_operation(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    chunk_size: int,
+    shard_workers: int,
+    progress: Optional[ProgressCallback] = None,
+    input_codec: Optional[str] = None,
+    output_codec: Optional[str] = None,
+    stream: Optional[_StreamResume] = None,
+) -> dict:
+    """按操作类型选择流式处理方式，返回统计信息"""
+    if input_codec or output_codec:
+        # 压缩输入/输出：解压和压缩都串在逐块处理的管道里
+        return transform_compressed_file(
+            input_path, output_path, pipeline, input_codec, output_codec, chunk_size, progress
+        )
+
+    # 纯 ASCII 的部分直接在字节上处理，遇到非 ASCII 字节后回退到 Unicode 路径
+    transform = build_transform(pipeline.maps)
+    ascii_transform = build_ascii_transform(pipeline.maps)
+    if pipeline.reverse:
+        # 从文件末尾向前读取，反转后（再经过融合的大小写转换）顺序写出
+        return reverse_file(input_path, output_path, chunk_size, progress, transform, ascii_transform)
+
+    threshold = _shard_threshold()
+    if shard_workers > 1 and 0 < threshold <= input_path.stat().st_size:
+        # 大文件在换行符处分片，由进程池并行转换
+        return shard_transform_file(input_path, output_path, pipeline, shard_workers, chunk_size, progress)
+
+    if stream:
+        # 可续传的流式调用：处理过程中保存检查点，客户端断开后重新调用时从检查点继续
+        return _run_incremental(input_path, output_path, pipeline, chunk_size, progress, stream.resume, stream)
+
+    return transform_file(input_path, output_path, transform, chunk_size, progress, ascii_transform)
+
+
+def _run_incremental(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    chunk_size: int,
+    progress: Optional[ProgressCallback],
+    resume: bool,
+    stream: Optional[_StreamResume],
+) -> dict:
+    """按检查点处理（状态保存在缓存目录下），可续传的流式调用还会在处理过程中保存检查点"""
+    checkpoint_bytes, on_checkpoint = 0, None
+    if stream:
+        checkpoint_bytes = _stream_checkpoint_bytes()
+        on_checkpoint = functools.partial(stream.on_checkpoint, input_path.name)
+    return incremental_transform_file(
+        input_path, output_path, pipeline, chunk_size, progress, _incremental_state_dir(), resume,
+        checkpoint_bytes, on_checkpoint
+    )
+
+
+def _run_with_cache(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    chunk_size: int,
+    shard_workers: int,
+    cache: Optional[ResultCache],
+    progress: Optional[ProgressCallback],
+    input_codec: Optional[str],
+    output_codec: Optional[str],
+    stream: Optional[_StreamResume] = None,
+) -> Tuple[dict, bool]:
+    """先查结果缓存，未命中时处理并写入缓存；返回 (统计信息, 是否命中)"""
+    # 内容寻址缓存：相同内容 + 等价的操作（+ 相同输出压缩格式）直接复用之前的输出
+    variant = f"{pipeline.key}:{output_codec}" if output_codec else pipeline.key
+    key = cache.make_key(input_path, variant) if cache else None
+    stats = cache.fetch(key, output_path) if cache else None
+    if stats is not None:
+        if progress:
+            progress(stats.get("raw_bytes_read", stats["bytes_read"]))
+        return stats, True
+
+    stats = _run_operation(
+        input_path, output_path, pipeline, chunk_size, shard_workers, progress, input_codec, output_codec, stream
+    )
+    if cache:
+        try:
+            cache.store(key, output_path, stats)
+        except OSError:
+            # 缓存只是加速手段，写入失败不影响本次结果
+            pass
+    return stats, False
+
+
+def _process_one_file(
+    input_path: Path,
+    pipeline: Pipeline,
+    chunk_size: int,
+    shard_workers: int = 1,
+    cache: Optional[ResultCache] = None,
+    progress: Optional[ProgressCallback] = None,
+    output_compression: str = "none",
+    incremental: bool = False,
+    text_range: Optional[TextRange] = None,
+    stream: Optional[_StreamResume] = None,
+) -> dict:
+    """处理单个输入文件，返回该文件的统计信息（不包含文件路径）"""
+    started = time.perf_counter()
+    try:
+        input_codec = detect_compression(input_path)
+        output_codec, output_path = _output_plan(input_path, input_codec, output_compression)
+
+        if text_range:
+            # 按范围处理：直接定位到区间，只读取和转换这一部分（不使用结果缓存）
+            if input_codec:
+                raise ValueError("压缩输入不支持按范围处理")
+            stats = transform_range_file(
+                input_path, output_path, pipeline, text_range, _line_index_store(), chunk_size, progress
+            )
+            cache_hit = False
+        elif incremental and not (pipeline.reverse or input_codec or output_codec):
+            # 增量模式：只转换新追加的字节，检查点和输出副本保存在缓存目录下，跨工作空间也能续接。
+            # 不使用结果缓存，因为计算内容哈希需要读完整个文件
+            stats = _run_incremental(input_path, output_path, pipeline, chunk_size, progress, True, stream)
+            cache_hit = False
+        else:
+            try:
+                stats, cache_hit = _run_with_cache(
+                    input_path, output_path, pipeline, chunk_size, shard_workers, cache, progress,
+                    input_codec, output_codec, stream
+                )
+            except DECOMPRESSION_ERRORS as error:
+                if not input_codec:
+                    raise
+                # 魔数只是启发式判断：无法解压时按未压缩的文本重新处理，仍然失败时报告解压错误
+                input_codec = None
+                output_codec, output_path = _output_plan(input_path, input_codec, output_compression)
+                try:
+                    stats, cache_hit = _run_with_cache(
+                        input_path, output_path, pipeline, chunk_size, shard_workers, cache, progress,
+                        input_codec, output_codec, stream
+                    )
+                except Exception:
+                    raise error from None
+    except Exception as e:
+        return {
+            "name": input_path.name,
+            "success": False,
+            "error": str(e),
+            "error_code": "PROCESSING_ERROR"
+        }
+
+    result = {
+        "name": input_path.name,
+        "success": True,
+        "original_length": stats["original_length"],
+        "processed_length": stats["processed_length"],
+        "input_bytes": stats.get("raw_bytes_read", stats["bytes_read"]),
+        "output_bytes": stats.get("raw_bytes_written", stats["bytes_written"]),
+        "input_uncompressed_bytes": stats["bytes_read"],
+        "output_uncompressed_bytes": stats["bytes_written"],
+        "input_compression": input_codec or "none",
+        "output_compression": output_codec or "none",
+        "shards": stats.get("shards", 1),
+        "cache_hit": cache_hit,
+        "resumed_bytes": stats.get("resumed_bytes", 0),
+        "elapsed_seconds": round(time.perf_counter() - started, 6)
+    }
+    if text_range:
+        result["byte_range"] = [stats["range_start"], stats["range_end"]]
+        if "index_hit" in stats:
+            result["index_hit"] = stats["index_hit"]
+    return result
+
+
+def _check_text_file_request(
+    input_files: List[Path],
+    operation: Union[str, List[str]],
+    output_compression: str = "none",
+    incremental: bool = False,
+    text_range: Tuple[int, int, int, int] = DEFAULT_TEXT_RANGE,
+) -> Optional[dict]:
+    """校验文件处理请求，有错误时返回错误结果"""
+    if not input_files:
+        return {
+            "success": False,
+            "error": "未找到输入文件",
+            "error_code": "NO_INPUT_FILE"
+        }
+
+    try:
+        parse_steps(operation)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "error_code": "INVALID_OPERATION"
+        }
+
+    if output_compression != "none" and output_compression not in CODECS:
+        return {
+            "success": False,
+            "error": f"不支持的压缩格式: {output_compression}",
+            "error_code": "INVALID_COMPRESSION"
+        }
+
+    try:
+        ranged = parse_range(*text_range)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "error_code": "INVALID_RANGE"
+        }
+    if ranged and (incremental or output_compression != "none"):
+        return {
+            "success": False,
+            "error": "按范围处理不能与 incremental 或 output_compression 同时使用",
+            "error_code": "INVALID_RANGE"
+        }
+    return None
+
+
+def _process_input_files(
+    input_files: List[Path],
+    operation: Union[str, List[str]],
+    progress: Optional[ProgressCallback] = None,
+    output_compression: str = "none",
+    incremental: bool = False,
+    text_range: Tuple[int, int, int, int] = DEFAULT_TEXT_RANGE,
+    stream: Optional[_StreamResume] = None,
+) -> dict:
+    """处理所有输入文件并汇总结果（不包含文件路径）"""
+    # 确保输出目录存在
+    current_workspace().resolve(DATA_OUTPUTS).mkdir(parents=True, exist_ok=True)
+
+    # 在有界线程池中并发处理所有文件，每个输入写出一个 processed_* 文件
+    started = time.perf_counter()
+    chunk_size = _chunk_size()
+    cache = _result_cache()
+    # 操作列表编译成一个融合转换，每个文件只读写一遍
+    pipeline = compile_pipeline(parse_steps(operation))
+    ranged = parse_range(*text_range)
+    workers = min(len(input_files), max_workers(available_cpus() + 4))
+
+    def process(path: Path, shard_workers: int = 1) -> dict:
+        return _process_one_file(
+            path, pipeline, chunk_size, shard_workers, cache, progress, output_compression, incremental, ranged,
+            stream
+        )
+
+    if len(input_files) == 1:
+        # 单个文件：按可用核数分片并行（文件足够大时）
+        file_results = [process(input_files[0], available_cpus())]
+    elif workers == 1:
+        file_results = [process(p) for p in input_files]
+    else:
+        # 线程池中的任务不继承 contextvars：每个任务在调用方上下文的副本中运行，看到相同的工作空间
+        contexts = [contextvars.copy_context() for _ in input_files]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            file_results = list(pool.map(lambda ctx, path: ctx.run(process, path), contexts, input_files))
+    elapsed = time.perf_counter() - started
+
+    succeeded = [r for r in file_results if r["success"]]
+    input_bytes = sum(r["input_bytes"] for r in succeeded)
+
+    # 返回结果（不包含文件路径）
+    result = {
+        "success": len(succeeded) == len(file_results),
+        "operation": operation,
+        "pipeline": pipeline.key,
+        "original_length": sum(r["original_length"] for r in succeeded),
+        "processed_length": sum(r["processed_length"] for r in succeeded),
+        "file_count": len(file_results),
+        "files": file_results,
+        "input_bytes": input_bytes,
+        "output_bytes": sum(r["output_bytes"] for r in succeeded),
+        "input_uncompressed_bytes": sum(r["input_uncompressed_bytes"] for r in succeeded),
+        "output_uncompressed_bytes": sum(r["output_uncompressed_bytes"] for r in succeeded),
+        "cache_hits": sum(1 for r in succeeded if r["cache_hit"]),
+        "cache_misses": sum(1 for r in succeeded if not r["cache_hit"]),
+        "resumed_bytes": sum(r["resumed_bytes"] for r in succeeded),
+        "elapsed_seconds": round(elapsed, 6),
+        "throughput_mb_per_s": round(input_bytes / elapsed / 1e6, 3) if elapsed > 0 else 0.0
+    }
+    if not result["success"]:
+        result["error"] = f"{len(file_results) - len(succeeded)} 个文件处理失败"
+        result["error_code"] = "PROCESSING_ERROR"
+    return result
+
+
+def _count_events(count: int, interval: float) -> Iterator[Union[float, Dict[str, Any]]]:
+    """
+    count_stream / count_stream_async 共用的事件序列
+
+    产出数字的位置表示需要先等到 开始时间 + 该秒数，再继续产出后面的事件；
+    按开始时间计算截止时间，处理事件的耗时不会累积成漂移。
+
+    可续传：每个 progress 之后保存 {"current": i}，续传时从下一个计数继续，
+    不再发送 start 事件。
+    """
+    try:
+        # 参数验证
+        if count <= 0:
+            yield {
+                "type": "error",
+                "data": "count 必须大于 0",
+                "error_code": "INVALID_COUNT"
+            }
+            return
+
+        if interval < 0:
+            yield {
+                "type": "error",
+                "data": "interval 不能为负数",
+                "error_code": "INVALID_INTERVAL"
+            }
+            return
+
+        resumed = (resume_state() or {}).get("current")
+        if isinstance(resumed, int) and not isinstance(resumed, bool) and 0 < resumed <= count:
+            first = resumed + 1
+        else:
+            first = 1
+            # Step 1: 发送开始事件
+            yield {
+                "type": "start",
+                "data": {
+                    "total": count,
+                    "interval": interval
+                }
+            }
+
+        # Step 2: 逐步计数并发送进度事件
+        for i in range(first, count + 1):
+            # 等待由调用方完成：同步版本 time.sleep，异步版本登记到共享调度器
+            yield (i - first + 1) * interval
+
+            percentage = int((i / count) * 100)
+
+            save_checkpoint({"current": i})
+            yield {
+                "type": "progress",
+                "data": {
+                    "current": i,
+                    "total": count,
+                    "percentage": percentage,
+                    "message": f"正在计数: {i}/{count}"
+                }
+            }
+
+        # Step 3: 发送完成事件
+        yield {
+            "type": "done",
+            "data": {
+                "total": count,
+                "completed": True,
+                "message": "计数完成"
+            }
+        }
+
+    except Exception as e:
+        # 发送错误事件
+        yield {
+            "type": "error",
+            "data": str(e),
+            "error_code": "UNEXPECTED_ERROR"
+        }
+
 
 def greet(name: str = "World") -> dict:
     """
@@ -116,20 +717,52 @@ def echo(text: str) -> dict:
         }
 
 
-def add_numbers(a: float, b: float) -> dict:
+def add_numbers(a: Union[float, List[float]], b: Union[float, List[float]]) -> dict:
     """
     计算两个数字的和
 
-    这个函数演示了数值计算的基本模式。
+    这个函数演示了数值计算的基本模式。a、b 也可以是数组：两个等长数组
+    逐元素相加，或数组加标量（广播），整个数组在一次向量化运算中完成
+    （安装了 NumPy 时使用 NumPy，否则使用标准库 array）。
 
     Args:
-        a: 第一个数字
-        b: 第二个数字
+        a: 第一个数字，或数字数组
+        b: 第二个数字，或数字数组
 
     Returns:
-        包含计算结果的字典
+        包含计算结果的字典；数组模式下 sum 为结果数组，并附带 length 和
+        backend（实际使用的实现），不回显输入数组
+
+    Examples:
+        >>> add_numbers([1, 2, 3], 10)["sum"]
+        [11, 12, 13]
     """
     try:
+        # 与 manifest 的参数校验一致：标量必须是数字（bool 不是数字），数组的问题返回 INVALID_ARRAY
+        for name, value in (("a", a), ("b", b)):
+            if not is_array(value) and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                return {
+                    "success": False,
+                    "error": f"{name} 必须是 number 或 array",
+                    "error_code": "CALCULATION_ERROR"
+                }
+
+        if is_array(a) or is_array(b):
+            try:
+                result, backend = add_arrays(a, b)
+            except ValueError as e:
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "error_code": "INVALID_ARRAY"
+                }
+            return {
+                "success": True,
+                "sum": result,
+                "length": len(result),
+                "backend": backend
+            }
+
         result = a + b
         return {
             "success": True,
@@ -146,7 +779,73 @@ def add_numbers(a: float, b: float) -> dict:
         }
 
 
-def process_text_file(operation: str = "uppercase") -> dict:
+def batch_call(function: str, items: List[Dict[str, Any]]) -> dict:
+    """
+    批量调用普通函数
+
+    对同一个函数执行一组参数，只做一次分发：函数声明只查找一次，所有参数
+    先一起校验，再依次执行。适合连续发起大量小调用（例如上百次 greet）
+    的场景，省去每次调用的请求、分发和序列化开销。
+
+    Args:
+        function: 要调用的函数名（同步的普通函数，不收发文件、不使用 secrets）
+        items: 参数对象的数组，每个元素是一次调用的参数，最多 1000 个
+
+    Returns:
+        包含按顺序排列的每次调用结果的字典；每个结果与单独调用时相同，
+        参数不合法的项为 {"success": False, "error_code": "INVALID_PARAMETERS"}
+
+    Examples:
+        >>> batch_call("add_numbers", [{"a": 1, "b": 2}, {"a": 3}])["results"]
+        [{'success': True, 'a': 1, 'b': 2, 'sum': 3},
+         {'success': False, 'error': '缺少必需参数: b', 'error_code': 'INVALID_PARAMETERS'}]
+    """
+    try:
+        if function == "batch_call":
+            return {
+                "success": False,
+                "error": "batch_call 不能批量调用自身",
+                "error_code": "NOT_BATCHABLE"
+            }
+        if isinstance(items, list) and len(items) > MAX_BATCH_ITEMS:
+            return {
+                "success": False,
+                "error": f"items 最多 {MAX_BATCH_ITEMS} 个",
+                "error_code": "INVALID_ITEMS"
+            }
+
+        # 经 Dispatcher 调用时由同一个 Dispatcher 执行，共用它的结果缓存和返回值检查
+        results, error = (current_dispatcher() or _dispatcher()).batch(function, items)
+        if error:
+            return error
+
+        succeeded = sum(1 for result in results if isinstance(result, dict) and result.get("success") is True)
+        return {
+            "success": True,
+            "function": function,
+            "results": results,
+            "count": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "error_code": "UNEXPECTED_ERROR"
+        }
+
+
+def process_text_file(
+    operation: Union[str, List[str]] = "uppercase",
+    output_compression: str = "none",
+    incremental: bool = False,
+    start_line: int = 1,
+    end_line: int = -1,
+    start_byte: int = 0,
+    end_byte: int = -1,
+) -> dict:
     """
     处理文本文件（文件处理示例）
 
@@ -157,67 +856,230 @@ def process_text_file(operation: str = "uppercase") -> dict:
     - 输出写入 data/outputs/
     - Gateway 自动上传并在响应中返回文件 URL
 
+    输入目录中的所有文件会在有界线程池中并发处理（并发度见
+    PREFAB_MAX_WORKERS），每个输入文件写出一个 processed_* 文件。
+    只有一个大文件时（见 PREFAB_SHARD_THRESHOLD），大小写转换会在换行符
+    处分片，由进程池按可用核数并行处理。
+    处理结果按“输入内容 + 操作”缓存在磁盘上（见 PREFAB_CACHE_DIR、
+    PREFAB_CACHE_MAX_BYTES），重复请求直接复用缓存的输出。
+    所有操作都按块流式处理（块大小见 PREFAB_CHUNK_SIZE），反转操作
+    从文件末尾向前读取，峰值内存与输入文件大小无关；纯 ASCII 的部分
+    直接在字节上处理，跳过解码和编码。
+    操作列表会被编译成一个融合转换（相互抵消或多余的步骤被合并），
+    每个文件只读取、写出一遍，不产生中间文件。
+    gzip / bzip2 / xz 压缩的输入按魔数识别并流式解压；output_compression
+    不为 none 时，不小于 PREFAB_COMPRESS_MIN_BYTES 的输出会流式压缩。
+    incremental 为 true 时，只追加的输入（例如日志）只转换上次调用之后
+    新增的字节并追加到已有输出；检查点和输出副本按文件名保存在缓存目录
+    中，每次调用使用新工作空间的 Gateway 上同样可以续接。输入按内容识别，
+    变小或已处理部分有任何改动时自动回退到完整处理（见 src/utils/incremental.py）。
+    指定行范围（start_line / end_line）或字节范围（start_byte / end_byte）
+    时，只定位到该区间读取和转换；行号通过缓存目录中按内容摘要保存的
+    稀疏行索引换算，同一文件的重复调用只与区间大小有关。
+
     📁 文件约定：
     - 输入：自动扫描 data/inputs/（Gateway 已下载）
     - 输出：写入 data/outputs/（Gateway 会自动上传）
     - 返回值：不包含文件路径（由 Gateway 管理）
 
     Args:
-        operation: 操作类型（uppercase, lowercase, reverse）
+        operation: 操作类型（uppercase, lowercase, reverse），或按顺序执行的
+            操作列表，例如 ["lowercase", "reverse"]
+        output_compression: 输出压缩格式（none, gzip, bz2, xz）
+        incremental: 是否增量处理只追加的输入（不适用于 reverse 和压缩文件）
+        start_line: 起始行号（从 1 开始）
+        end_line: 结束行号（包含），-1 表示到文件末尾
+        start_byte: 起始字节偏移（从 0 开始，不能与行范围同时指定）
+        end_byte: 结束字节偏移（不包含），-1 表示到文件末尾
 
     Returns:
-        包含处理结果的字典（不包含文件路径）
+        包含处理结果的字典（不包含文件路径），其中 files 为每个文件的
+        统计信息，throughput_mb_per_s 为整体吞吐量；input_bytes /
+        output_bytes 为磁盘上的（压缩后）字节数，*_uncompressed_bytes
+        为解压后的字节数
     """
     try:
         # 自动扫描 data/inputs 目录
-        input_files = list(DATA_INPUTS.glob("*"))
-        if not input_files:
-            return {
-                "success": False,
-                "error": "未找到输入文件",
-                "error_code": "NO_INPUT_FILE"
-            }
+        input_files = _list_input_files()
+        text_range = (start_line, end_line, start_byte, end_byte)
+        error = _check_text_file_request(input_files, operation, output_compression, incremental, text_range)
+        if error:
+            return error
+
+        return _process_input_files(
+            input_files, operation, output_compression=output_compression, incremental=incremental,
+            text_range=text_range
+        )
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "error_code": "PROCESSING_ERROR"
+        }
 
-        # 获取第一个文件
-        input_path = input_files[0]
 
-        # 读取文件内容
-        content = input_path.read_text(encoding="utf-8")
+def process_text_file_stream(
+    operation: Union[str, List[str]] = "uppercase",
+    output_compression: str = "none",
+    incremental: bool = False,
+    start_line: int = 1,
+    end_line: int = -1,
+    start_byte: int = 0,
+    end_byte: int = -1,
+) -> Iterator[Dict[str, Any]]:
+    """
+    流式处理文本文件（process_text_file 的流式版本）
 
-        # 执行操作
-        if operation == "uppercase":
-            result = content.upper()
-        elif operation == "lowercase":
-            result = content.lower()
-        elif operation == "reverse":
-            result = content[::-1]
-        else:
-            return {
-                "success": False,
-                "error": f"不支持的操作: {operation}",
-                "error_code": "INVALID_OPERATION"
+    处理逻辑与 process_text_file 完全相同，但会在每个数据块完成时
+    推送进度事件，避免客户端在处理大文件时因长时间无响应而超时。
+
+    🌊 事件格式与 count_stream 一致：
+    - start: 文件数、总字节数
+    - progress: 已处理字节数、百分比、瞬时吞吐量（MB/s）
+    - done: 与 process_text_file 的返回值相同的统计信息
+    - error: 错误信息和错误代码
+
+    🔁 可续传：经由 Gateway 调用时，未压缩输入的正向转换每处理
+    PREFAB_STREAM_CHECKPOINT_BYTES 字节（在换行处）就把检查点和已写出的
+    输出保存到缓存目录（与 incremental 相同的状态，按内容识别输入），
+    每个 progress 事件带上续传点 {"offset": 已保存的输入字节数,
+    "output_bytes": 对应的输出字节数}。客户端断开后带着 Last-Event-ID
+    重新调用时不再发送 start 事件，每个文件从保存的检查点继续，跳过的
+    字节数见 resumed_bytes。反转、压缩、按范围和分片处理的文件仍然从头开始。
+
+    Args:
+        operation: 操作类型（uppercase, lowercase, reverse），或按顺序执行的
+            操作列表，例如 ["lowercase", "reverse"]
+        output_compression: 输出压缩格式（none, gzip, bz2, xz）
+        incremental: 是否增量处理只追加的输入，见 process_text_file
+        start_line: 起始行号（从 1 开始）
+        end_line: 结束行号（包含），-1 表示到文件末尾
+        start_byte: 起始字节偏移（从 0 开始，不能与行范围同时指定）
+        end_byte: 结束字节偏移（不包含），-1 表示到文件末尾
+
+    Yields:
+        dict: SSE 事件数据，包含 type、data 以及错误时的 error_code
+    """
+    try:
+        input_files = _list_input_files()
+        text_range = (start_line, end_line, start_byte, end_byte)
+        error = _check_text_file_request(input_files, operation, output_compression, incremental, text_range)
+        if error:
+            yield {
+                "type": "error",
+                "data": error["error"],
+                "error_code": error["error_code"]
+            }
+            return
+
+        total_bytes = sum(p.stat().st_size for p in input_files)
+        resumed = resume_state() or {}
+        resuming = all(
+            isinstance(resumed.get(key), int) and not isinstance(resumed.get(key), bool) and resumed[key] >= 0
+            for key in ("offset", "output_bytes")
+        )
+        if not resuming:
+            yield {
+                "type": "start",
+                "data": {
+                    "operation": operation,
+                    "file_count": len(input_files),
+                    "total_bytes": total_bytes
+                }
             }
 
-        # 确保输出目录存在
-        DATA_OUTPUTS.mkdir(parents=True, exist_ok=True)
+        # 在后台线程中处理，进度和检查点通过队列传回当前生成器
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def on_progress(nbytes: int) -> None:
+            if cancelled.is_set():
+                raise RuntimeError("客户端已断开，处理已取消")
+            events.put(nbytes)
+
+        def on_checkpoint(name: str, input_offset: int, output_offset: int) -> None:
+            events.put((name, input_offset, output_offset))
+
+        # 只有可续传的调用才值得保存检查点（Gateway 之外没有人会带着续传点重新调用）
+        stream = _StreamResume(resuming, on_checkpoint) if resumable() else None
+
+        def worker() -> None:
+            try:
+                events.put(_process_input_files(
+                    input_files, operation, on_progress, output_compression, incremental, text_range, stream
+                ))
+            except Exception as e:
+                events.put({"success": False, "error": str(e), "error_code": "PROCESSING_ERROR"})
+
+        # 后台线程在当前上下文的副本中运行，看到与调用方相同的工作空间
+        threading.Thread(target=contextvars.copy_context().run, args=(worker,), daemon=True).start()
+
+        result = None
+        processed = 0
+        # 每个文件最近保存的检查点：文件名 → (输入偏移, 输出偏移)
+        saved = {}
+        last_bytes, last_time = 0, time.perf_counter()
+        try:
+            while result is None:
+                # 合并队列中已经积压的进度，只发送最新的一次
+                batch = [events.get()]
+                while not events.empty():
+                    batch.append(events.get_nowait())
+                for item in batch:
+                    if isinstance(item, dict):
+                        result = item
+                    elif isinstance(item, tuple):
+                        saved[item[0]] = item[1:]
+                    else:
+                        processed += item
+
+                if processed == last_bytes:
+                    continue
+
+                now = time.perf_counter()
+                elapsed = now - last_time
+                mb_per_s = (processed - last_bytes) / elapsed / 1e6 if elapsed > 0 else 0.0
+                last_bytes, last_time = processed, now
+                percentage = min(100, int(processed / total_bytes * 100)) if total_bytes else 100
+
+                save_checkpoint({
+                    "offset": sum(offset for offset, _ in saved.values()),
+                    "output_bytes": sum(size for _, size in saved.values()),
+                })
+                yield {
+                    "type": "progress",
+                    "data": {
+                        "bytes_processed": processed,
+                        "total_bytes": total_bytes,
+                        "percentage": percentage,
+                        "mb_per_s": round(mb_per_s, 3),
+                        "message": f"已处理 {processed}/{total_bytes} 字节"
+                    }
+                }
+        finally:
+            # 生成器被提前关闭（客户端断开）时通知后台线程停止
+            cancelled.set()
 
-        # 写入输出文件（Gateway 会自动上传）
-        output_filename = f"processed_{input_path.name}"
-        output_path = DATA_OUTPUTS / output_filename
-        output_path.write_text(result, encoding="utf-8")
+        if not result["success"]:
+            yield {
+                "type": "error",
+                "data": result["error"],
+                "error_code": result["error_code"]
+            }
+            return
 
-        # 返回结果（不包含文件路径）
-        return {
-            "success": True,
-            "operation": operation,
-            "original_length": len(content),
-            "processed_length": len(result)
+        data = {key: value for key, value in result.items() if key != "success"}
+        data.update(completed=True, message="处理完成")
+        yield {
+            "type": "done",
+            "data": data
         }
 
     except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
+        yield {
+            "type": "error",
+            "data": str(e),
             "error_code": "PROCESSING_ERROR"
         }
 
@@ -229,7 +1091,10 @@ def fetch_weather(city: str) -> dict:
     这个函数演示了如何在预制件中使用密钥（secrets）。
     平台会自动将用户配置的密钥注入到环境变量中。
 
-    注意：这是一个演示函数，实际不会调用真实的天气 API。
+    配置了 PREFAB_WEATHER_API_URL 时通过带连接池的客户端调用天气服务
+    （见 utils/weather_client.py，本地可用 scripts/weather_server.py），
+    未配置时返回演示数据。天气服务的结果按城市缓存（见 utils/weather_cache.py），
+    cache_age_seconds 为结果的缓存时间。
 
     Args:
         city: 要查询天气的城市名称
@@ -261,22 +1126,27 @@ def fetch_weather(city: str) -> dict:
                 "error_code": "INVALID_CITY"
             }
 
-        # 这里是演示代码，实际应该调用真实的天气 API
-        # import requests
-        # response = requests.get(
-        #     f"https://api.weather-provider.com/current",
-        #     params={"city": city, "key": api_key}
-        # )
-        # data = response.json()
+        client = _weather_client()
+        if client is None:
+            # 演示：未配置天气服务地址时返回模拟数据
+            return {
+                "success": True,
+                "city": city,
+                "temperature": 22.5,
+                "condition": "晴天",
+                "note": "这是演示数据，未调用真实 API"
+            }
 
-        # 演示：返回模拟数据
-        return {
-            "success": True,
-            "city": city,
-            "temperature": 22.5,
-            "condition": "晴天",
-            "note": "这是演示数据，未调用真实 API"
-        }
+        try:
+            # 同一个城市的结果缓存一段时间，并发的相同查询只请求一次
+            weather, age = _weather_cache().get((city, api_key), lambda: client.current(city, api_key))
+        except WeatherAPIError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "error_code": e.error_code
+            }
+        return {"success": True, **weather, "cache_age_seconds": round(age, 3)}
 
     except Exception as e:
         return {
@@ -318,63 +1188,40 @@ def count_stream(count: int = 10, interval: float = 0.5) -> Iterator[Dict[str, A
         ...
         {"type": "done", "data": {"total": 5, "completed": True}}
     """
-    try:
-        # 参数验证
-        if count <= 0:
-            yield {
-                "type": "error",
-                "data": "count 必须大于 0",
-                "error_code": "INVALID_COUNT"
-            }
-            return
-
-        if interval < 0:
-            yield {
-                "type": "error",
-                "data": "interval 不能为负数",
-                "error_code": "INVALID_INTERVAL"
-            }
-            return
+    start = time.monotonic()
+    for event in _count_events(count, interval):
+        if isinstance(event, dict):
+            yield event
+        else:
+            delay = start + event - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
 
-        # Step 1: 发送开始事件
-        yield {
-            "type": "start",
-            "data": {
-                "total": count,
-                "interval": interval
-            }
-        }
 
-        # Step 2: 逐步计数并发送进度事件
-        for i in range(1, count + 1):
-            time.sleep(interval)
+async def count_stream_async(count: int = 10, interval: float = 0.5) -> AsyncIterator[Dict[str, Any]]:
+    """
+    异步流式计数器（count_stream 的 asyncio 版本）
 
-            percentage = int((i / count) * 100)
+    事件与 count_stream 完全相同，但等待不调用 time.sleep()：下一次事件
+    的截止时间登记到事件循环的共享调度器（src/utils/scheduler.py），
+    同一时刻到期的流被一次性唤醒。等待期间不占用线程，Gateway 在一个
+    事件循环上驱动所有打开的流，单个工作进程可以同时保持上万个流。
 
-            yield {
-                "type": "progress",
-                "data": {
-                    "current": i,
-                    "total": count,
-                    "percentage": percentage,
-                    "message": f"正在计数: {i}/{count}"
-                }
-            }
+    ⚡ 异步流式函数：
+    - 使用 async def + yield（异步生成器）
+    - 在 manifest 中同时设置 "streaming": true 和 "async": true
 
-        # Step 3: 发送完成事件
-        yield {
-            "type": "done",
-            "data": {
-                "total": count,
-                "completed": True,
-                "message": "计数完成"
-            }
-        }
+    Args:
+        count: 计数总数，默认 10
+        interval: 每次计数的间隔秒数，默认 0.5
 
-    except Exception as e:
-        # 发送错误事件
-        yield {
-            "type": "error",
-            "data": str(e),
-            "error_code": "UNEXPECTED_ERROR"
-        }
+    Yields:
+        dict: SSE 事件数据，见 count_stream
+    """
+    scheduler = get_scheduler()
+    start = scheduler.time()
+    for event in _count_events(count, interval):
+        if isinstance(event, dict):
+            yield event
+        else:
+            await scheduler.sleep_until(start + event)
@@ -0,0 +1,5 @@
+"""
+预制件内部工具模块
+
+这里的模块只被 src/main.py 和 scripts/ 中的开发工具使用，不直接暴露给 AI。
+"""
@@ -0,0 +1,177 @@
+"""
+透明的压缩输入/输出
+
+输入文件按魔数识别 gzip / bzip2 / xz 格式，读取时流式解压；输出可以
+选择用同样的标准库编解码器流式压缩。魔数只是启发式判断，调用方在解压
+失败（DECOMPRESSION_ERRORS）时应回退为按未压缩的文本处理。压缩与解压都串在逐块处理的管道
+里，任何时候都不会把整个文件解压到内存中。
+
+反转操作需要从末尾向前读取，而压缩流不支持高效的反向 seek，因此
+压缩输入会先流式解压到输出目录下的临时文件，再按块反向读取。
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from .pipeline import Pipeline, build_ascii_transform, build_transform
+from .text_stream import (
+    DEFAULT_CHUNK_SIZE,
+    ProgressCallback,
+    _atomic_output,
+    reverse_stream,
+    transform_stream,
+)
+
+# 支持的编解码器及其魔数、文件后缀
+CODECS = ("gzip", "bz2", "xz")
+
+_MAGIC = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+}
+
+# bzip2 的 "BZh" 之后还有块大小（'1'-'9'）和第一个块的魔数（空流时是流结束标记），
+# 只看 "BZh" 会把以它开头的纯文本误判为压缩文件
+_BZ2_LEVELS = b"123456789"
+_BZ2_BLOCK_MAGICS = (b"1AY&SY", b"\x17rE8P\x90")
+
+# 解压失败时可能抛出的异常（gzip 的 BadGzipFile 和 bz2 的数据错误都是 OSError）
+DECOMPRESSION_ERRORS = (OSError, EOFError, lzma.LZMAError, zlib.error)
+
+SUFFIXES = {
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "xz": ".xz",
+}
+
+# 压缩级别：在压缩率和速度之间取折中（gzip/bz2 默认的 9 级太慢）
+_GZIP_LEVEL = 6
+_BZ2_LEVEL = 6
+_XZ_PRESET = 6
+
+
+class _CountingReader:
+    """统计从底层文件读取的字节数，并按读取量上报进度"""
+
+    def __init__(self, f: BinaryIO, progress: Optional[ProgressCallback] = None):
+        self._f = f
+        self._progress = progress
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.count += len(data)
+        if self._progress and data:
+            self._progress(len(data))
+        return data
+
+
+def detect_compression(path: Path) -> Optional[str]:
+    """按文件开头的魔数识别压缩格式，未压缩时返回 None"""
+    with open(path, "rb") as f:
+        head = f.read(10)
+    for codec, magic in _MAGIC.items():
+        if head.startswith(magic):
+            if codec == "bz2" and not (head[3:4] and head[3] in _BZ2_LEVELS and head[4:] in _BZ2_BLOCK_MAGICS):
+                continue
+            return codec
+    return None
+
+
+def estimated_size(path: Path, codec: Optional[str]) -> int:
+    """
+    估计解压后的大小（字节）
+
+    gzip 尾部记录了原始大小（对 2**32 取模）；其他格式无法廉价得知，
+    以文件本身的大小作为下限。
+    """
+    size = path.stat().st_size
+    if codec == "gzip" and size >= 18:
+        with open(path, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return max(size, struct.unpack("<I", f.read(4))[0])
+    return size
+
+
+def _open_reader(raw: BinaryIO, codec: Optional[str]) -> BinaryIO:
+    """在原始输入流外包一层解压流"""
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if codec == "bz2":
+        return bz2.BZ2File(raw, "rb")
+    if codec == "xz":
+        return lzma.LZMAFile(raw, "rb")
+    return raw
+
+
+def _open_writer(raw: BinaryIO, codec: Optional[str]) -> BinaryIO:
+    """在原始输出流外包一层压缩流（关闭压缩流不会关闭 raw）"""
+    if codec == "gzip":
+        # 不写入文件名和时间戳，相同内容得到相同的压缩结果
+        return gzip.GzipFile(filename="", fileobj=raw, mode="wb", compresslevel=_GZIP_LEVEL, mtime=0)
+    if codec == "bz2":
+        return bz2.BZ2File(raw, "wb", compresslevel=_BZ2_LEVEL)
+    if codec == "xz":
+        return lzma.LZMAFile(raw, "wb", preset=_XZ_PRESET)
+    return raw
+
+
+def transform_compressed_file(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    input_codec: Optional[str],
+    output_codec: Optional[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, int]:
+    """
+    流式处理压缩输入和/或压缩输出
+
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        pipeline: 编译后的管道
+        input_codec: 输入的压缩格式，None 表示未压缩
+        output_codec: 输出的压缩格式，None 表示不压缩
+        chunk_size: 每次读取的（解压后）字节数
+        progress: 可选的进度回调，按读取的磁盘字节数上报
+
+    Returns:
+        统计信息，见 transform_stream()，其中 bytes_read / bytes_written
+        为解压后的字节数；额外的 raw_bytes_read / raw_bytes_written 为
+        磁盘上实际读写的字节数
+    """
+    with open(input_path, "rb") as raw_src, _atomic_output(output_path) as raw_dst:
+        counter = _CountingReader(raw_src, progress)
+        src = _open_reader(counter, input_codec)
+        dst = _open_writer(raw_dst, output_codec)
+        transform = build_transform(pipeline.maps)
+        ascii_transform = build_ascii_transform(pipeline.maps)
+        try:
+            if not pipeline.reverse:
+                stats = transform_stream(src, dst, transform, chunk_size, ascii_transform=ascii_transform)
+            elif input_codec is None:
+                stats = reverse_stream(raw_src, dst, chunk_size, progress, transform, ascii_transform)
+                counter.count = stats["bytes_read"]
+            else:
+                # 反转需要随机访问：先解压到临时文件（磁盘上），再反向读取
+                with tempfile.TemporaryFile(dir=output_path.parent) as spool:
+                    shutil.copyfileobj(src, spool, chunk_size)
+                    stats = reverse_stream(spool, dst, chunk_size, transform=transform,
+                                           ascii_transform=ascii_transform)
+        finally:
+            if dst is not raw_dst:
+                dst.close()
+        stats["raw_bytes_read"] = counter.count
+        stats["raw_bytes_written"] = raw_dst.tell()
+    return stats
@@ -0,0 +1,159 @@
+"""
+按 manifest 抽样检查返回值
+
+validate_manifest.py 只在静态层面比较 manifest 和 main.py 的函数签名，
+函数实际返回的字典是否符合 returns 的声明（字段、类型、error_code 的
+取值）只有运行时才知道。ContractChecker 在构造时把每个函数的 returns
+编译成检查函数，Dispatcher 对抽中的调用检查返回值（流式函数检查抽中的
+流的每个事件）：
+
+- 未声明 "optional": true 的字段必须存在；
+- 字段的类型（支持联合类型）、enum 与声明一致，声明了 properties / items
+  的嵌套对象和数组逐层检查；
+- 不允许出现未声明的字段。
+
+违反约定只计数、记录最近的几条，不抛出异常，不影响返回给调用方的结果。
+抽样率默认取环境变量 PREFAB_CONTRACT_SAMPLE_RATE（0~1，默认 0.01）；
+测试中设为 1 检查每一次调用。没有抽中的调用只多一次随机数比较。
+"""
+
+import os
+import random
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .validation import _accepted, _declared_types
+
+# 抽样率的环境变量和默认值
+SAMPLE_RATE_ENV = "PREFAB_CONTRACT_SAMPLE_RATE"
+DEFAULT_SAMPLE_RATE = 0.01
+
+# 保留的最近违规记录条数
+RECENT_VIOLATIONS = 20
+
+# 检查函数：返回违规描述列表（符合约定时为空）
+ContractCheck = Callable[[Any], List[str]]
+
+
+def _env_sample_rate() -> float:
+    try:
+        rate = float(os.environ.get(SAMPLE_RATE_ENV, DEFAULT_SAMPLE_RATE))
+    except ValueError:
+        return DEFAULT_SAMPLE_RATE
+    return min(max(rate, 0.0), 1.0)
+
+
+def compile_schema(schema: dict, path: str = "") -> ContractCheck:
+    """把 returns（或其中一个字段）的声明编译成检查函数"""
+    types = _declared_types(schema)
+    accepted = _accepted(types)
+    label = " 或 ".join(types)
+    enum = frozenset(schema["enum"]) if isinstance(schema.get("enum"), list) else None
+    where = path or "返回值"
+
+    properties = schema.get("properties")
+    fields: Dict[str, ContractCheck] = {}
+    required: List[str] = []
+    if isinstance(properties, dict):
+        for key, spec in properties.items():
+            fields[key] = compile_schema(spec, f"{path}.{key}" if path else key)
+            if not spec.get("optional"):
+                required.append(key)
+    items = schema.get("items")
+    item_check = compile_schema(items, f"{where}[]") if isinstance(items, dict) else None
+
+    def check(value: Any) -> List[str]:
+        if accepted and type(value) not in accepted:
+            return [f"{where} 应为 {label}，实际是 {type(value).__name__}"]
+        problems: List[str] = []
+        if enum is not None and isinstance(value, (str, int, float)) and value not in enum:
+            problems.append(f"{where} 的值 {value!r} 不在 enum 中")
+        if properties is not None and isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    problems.append(f"缺少字段 {path + '.' if path else ''}{key}")
+            for key, item in value.items():
+                field = fields.get(key)
+                if field is None:
+                    problems.append(f"未声明的字段 {path + '.' if path else ''}{key}")
+                else:
+                    problems.extend(field(item))
+        if item_check is not None and isinstance(value, (list, tuple)):
+            for item in value:
+                problems.extend(item_check(item))
+        return problems
+
+    return check
+
+
+class ContractChecker:
+    """按抽样率检查函数返回值是否符合 manifest 的 returns 声明"""
+
+    def __init__(self, manifest: dict, sample_rate: Optional[float] = None):
+        self.sample_rate = _env_sample_rate() if sample_rate is None else min(max(sample_rate, 0.0), 1.0)
+        self._checks: Dict[str, ContractCheck] = {
+            definition["name"]: compile_schema(definition["returns"])
+            for definition in manifest.get("functions", [])
+            if isinstance(definition.get("returns"), dict)
+        }
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.violations = 0
+        # 函数名 -> {"checked", "violations", "problems": {违规描述: 次数}}
+        self._functions: Dict[str, Dict[str, Any]] = {}
+        self._recent: Deque[str] = deque(maxlen=RECENT_VIOLATIONS)
+        self._random = random.random
+
+    def sample(self, name: str) -> Optional[ContractCheck]:
+        """
+        决定是否检查这一次调用
+
+        Returns:
+            抽中时返回检查并记录一个返回值（或事件）的函数，否则返回 None
+        """
+        if not self.sample_rate or self._random() >= self.sample_rate:
+            return None
+        check = self._checks.get(name)
+        if check is None:
+            return None
+        return lambda value: self._record(name, check(value))
+
+    def observe(self, name: str, value: Any) -> None:
+        """按抽样率检查一个返回值"""
+        record = self.sample(name)
+        if record is not None:
+            record(value)
+
+    def _record(self, name: str, problems: List[str]) -> None:
+        with self._lock:
+            stats = self._functions.setdefault(name, {"checked": 0, "violations": 0, "problems": {}})
+            self.checked += 1
+            stats["checked"] += 1
+            if not problems:
+                return
+            self.violations += 1
+            stats["violations"] += 1
+            for problem in problems:
+                stats["problems"][problem] = stats["problems"].get(problem, 0) + 1
+                self._recent.append(f"{name}: {problem}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前统计
+
+        checked / violations 为检查过的返回值（流式函数为事件）数和其中违反
+        约定的个数，functions 按函数给出同样的计数和每种违规的次数，recent
+        为最近的违规记录
+        """
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "checked": self.checked,
+                "violations": self.violations,
+                "functions": {
+                    name: {**stats, "problems": dict(stats["problems"])}
+                    for name, stats in self._functions.items()
+                },
+                "recent": list(self._recent),
+            }
@@ -0,0 +1,281 @@
+"""
+按 manifest 调用预制件函数
+
+Gateway 按 prefab-manifest.json 中的声明调用 main.py 中的函数。本地
+Gateway（scripts/local_gateway.py）和测试通过 Dispatcher 完成同样的事：
+manifest 只加载一次，函数对象在构造时解析好，参数声明编译成校验函数
+（见 src/utils/validation.py），每次调用只做字典查找和编译好的参数检查：
+参数名、类型、取值范围不合法时返回参数声明的 error_code，未传入的参数用
+manifest 中的默认值补齐。
+
+manifest 中 "async": true 的函数（async def）通过 acall() / astream()
+在调用方的事件循环上执行，等待期间不占用线程；call() / stream() 只用于
+同步函数。
+
+batch() 在一次分发中对同一个普通函数执行一组参数：函数声明只查找一次，
+所有参数先一起校验，再依次执行，结果按顺序返回。
+
+manifest 中 "pure": true 的同步普通函数（不收发文件、不使用 secrets）在
+call() 和 batch() 中经过结果缓存（见 src/utils/memo.py）：相同参数的调用
+直接返回缓存的结果，并发的相同调用只执行一次。其他函数总是直接执行。
+
+call() 执行函数期间，current_dispatcher() 返回正在执行它的 Dispatcher：
+batch_call 通过它批量执行，批次中的调用与单独调用共用同一个结果缓存和
+返回值检查（例如本地 Gateway 按命令行参数配置的那一个）。
+
+函数的返回值（流式函数的每个事件）按抽样率与 manifest 的 returns 声明
+比对（见 src/utils/contracts.py），违反约定只计数，不影响返回的结果。
+
+调用失败（函数不存在、参数名不对、函数抛出异常）时与函数本身一样
+返回带 error_code 的结果字典，不抛出异常。
+"""
+
+import json
+from contextvars import ContextVar
+from pathlib import Path
+from types import ModuleType
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+
+from .contracts import ContractChecker
+from .memo import MemoCache
+from .validation import ArgumentValidator, compile_parameters
+
+# 仓库根目录（打包后是 wheel 的根目录）下的 manifest
+MANIFEST_PATH = Path(__file__).resolve().parent.parent.parent / "prefab-manifest.json"
+
+
+# 正在执行同步普通函数的 Dispatcher
+_current: "ContextVar[Optional[Dispatcher]]" = ContextVar("prefab_dispatcher", default=None)
+
+
+def current_dispatcher() -> "Optional[Dispatcher]":
+    """正在通过 call() 执行当前函数的 Dispatcher，直接调用函数时为 None"""
+    return _current.get()
+
+
+class FunctionSpec(NamedTuple):
+    """manifest 中声明的一个函数"""
+
+    name: str
+    func: Callable[..., Any]
+    streaming: bool
+    is_async: bool
+    parameters: FrozenSet[str]
+    required: FrozenSet[str]
+    # files 中的输入、输出文件组的 key
+    input_keys: Tuple[str, ...]
+    output_keys: Tuple[str, ...]
+    # 声明的 secrets 名称
+    secrets: Tuple[str, ...] = ()
+    # manifest 中声明了 "pure": true
+    pure: bool = False
+    # 编译好的参数校验函数
+    validate: Optional[ArgumentValidator] = None
+
+    @property
+    def batchable(self) -> bool:
+        """能否批量调用：同步的普通函数，且不收发文件、不使用 secrets（平台只为被调用的函数注入 secrets）"""
+        return not (self.streaming or self.is_async or self.input_keys or self.output_keys or self.secrets)
+
+    @property
+    def memoizable(self) -> bool:
+        """结果能否缓存：声明为 pure，且是能批量调用的普通函数（有副作用的函数即使误标 pure 也不缓存）"""
+        return self.pure and self.batchable
+
+
+def load_manifest(path: Optional[Path] = None) -> dict:
+    """读取 manifest（默认是仓库根目录下的 prefab-manifest.json）"""
+    return json.loads(Path(path or MANIFEST_PATH).read_text(encoding="utf-8"))
+
+
+def _file_keys(files: Dict[str, dict], file_type: str) -> Tuple[str, ...]:
+    """files 中类型为 file_type（或其数组）的 key"""
+    return tuple(
+        key for key, definition in files.items()
+        if file_type in (definition.get("type"), definition.get("items", {}).get("type"))
+    )
+
+
+def _error(error: str, error_code: str) -> dict:
+    return {"success": False, "error": error, "error_code": error_code}
+
+
+class Dispatcher:
+    """按名称调用 manifest 中声明的函数"""
+
+    def __init__(self, manifest: dict, module: ModuleType, memo: Optional[MemoCache] = None,
+                 contracts: Optional[ContractChecker] = None):
+        self.manifest = manifest
+        # 纯函数的结果缓存（maxsize 为 0 时不缓存）
+        self.memo = memo if memo is not None else MemoCache()
+        # 返回值的抽样检查（抽样率默认取环境变量）
+        self.contracts = contracts if contracts is not None else ContractChecker(manifest)
+        self.functions: Dict[str, FunctionSpec] = {}
+        for definition in manifest.get("functions", []):
+            name = definition["name"]
+            params = definition.get("parameters", [])
+            files = definition.get("files", {})
+            self.functions[name] = FunctionSpec(
+                name=name,
+                func=getattr(module, name),
+                streaming=bool(definition.get("streaming")),
+                is_async=bool(definition.get("async")),
+                parameters=frozenset(p["name"] for p in params),
+                required=frozenset(p["name"] for p in params if p.get("required")),
+                input_keys=_file_keys(files, "InputFile"),
+                output_keys=_file_keys(files, "OutputFile"),
+                secrets=tuple(secret["name"] for secret in definition.get("secrets", [])),
+                pure=definition.get("pure") is True,
+                validate=compile_parameters(params),
+            )
+
+    def get(self, name: str) -> Optional[FunctionSpec]:
+        """查找函数声明，不存在时返回 None"""
+        return self.functions.get(name)
+
+    def _prepare(self, name: str,
+                 arguments: Any) -> Tuple[Optional[FunctionSpec], Optional[Dict[str, Any]], Optional[dict]]:
+        """查找函数并校验参数，返回 (函数声明, 补齐默认值后的参数, 错误结果)"""
+        spec = self.functions.get(name)
+        if spec is None:
+            return None, None, _error(f"未声明的函数: {name}", "FUNCTION_NOT_FOUND")
+        values, error = spec.validate(arguments)
+        if error:
+            return None, None, error
+        return spec, values, None
+
+    def check(self, name: str, arguments: Dict[str, Any]) -> Tuple[Optional[FunctionSpec], Optional[dict]]:
+        """
+        检查函数名和参数
+
+        Returns:
+            (函数声明, None)，或出错时 (None, 错误结果)
+        """
+        spec, _, error = self._prepare(name, arguments)
+        return spec, error
+
+    def _check_kind(self, name: str, arguments: Dict[str, Any], streaming: bool, is_async: bool
+                    ) -> Tuple[Optional[FunctionSpec], Optional[Dict[str, Any]], Optional[dict]]:
+        """在 _prepare() 的基础上确认函数是否是预期的（流式/异步）类型"""
+        spec, values, error = self._prepare(name, arguments)
+        if error:
+            return None, None, error
+        if spec.streaming != streaming:
+            if spec.streaming:
+                return None, None, _error(f"{name} 是流式函数，请使用 stream() / astream()", "STREAMING_FUNCTION")
+            return None, None, _error(f"{name} 不是流式函数，请使用 call() / acall()", "NOT_STREAMING_FUNCTION")
+        if spec.is_async != is_async:
+            if spec.is_async:
+                return None, None, _error(f"{name} 是异步函数，请使用 acall() / astream()", "ASYNC_FUNCTION")
+            return None, None, _error(f"{name} 是同步函数，请使用 call() / stream()", "SYNC_FUNCTION")
+        return spec, values, None
+
+    def _invoke(self, spec: FunctionSpec, arguments: Dict[str, Any]) -> dict:
+        """执行普通函数，纯函数经过结果缓存"""
+        if spec.memoizable:
+            return self.memo.call(spec.name, arguments, lambda: spec.func(**arguments))
+        return spec.func(**arguments)
+
+    def call(self, name: str, arguments: Dict[str, Any]) -> dict:
+        """调用同步的普通函数，返回结果字典"""
+        spec, arguments, error = self._check_kind(name, arguments, streaming=False, is_async=False)
+        if error:
+            return error
+        token = _current.set(self)
+        try:
+            result = self._invoke(spec, arguments)
+        except Exception as e:
+            return _error(str(e), "UNEXPECTED_ERROR")
+        finally:
+            _current.reset(token)
+        self.contracts.observe(name, result)
+        return result
+
+    def batch(self, name: str, items: List[Dict[str, Any]]) -> Tuple[Optional[List[dict]], Optional[dict]]:
+        """
+        用一组参数批量调用同一个普通函数
+
+        先校验全部参数，再依次执行通过校验的项；某一项校验失败或抛出异常
+        只影响该项的结果。
+
+        Returns:
+            (按顺序的结果列表, None)，或整个批次无法执行时 (None, 错误结果)
+        """
+        spec = self.functions.get(name)
+        if spec is None:
+            return None, _error(f"未声明的函数: {name}", "FUNCTION_NOT_FOUND")
+        if not spec.batchable:
+            return None, _error(f"{name} 不能批量调用（流式、异步、收发文件或使用 secrets 的函数）", "NOT_BATCHABLE")
+        if not isinstance(items, list):
+            return None, _error("items 必须是参数对象的数组", "INVALID_ITEMS")
+
+        checked = [spec.validate(arguments) for arguments in items]
+        func = spec.func
+        memoizable = spec.memoizable
+        results = []
+        for arguments, error in checked:
+            if error is not None:
+                results.append(error)
+                continue
+            try:
+                if memoizable:
+                    result = self.memo.call(name, arguments, lambda: func(**arguments))
+                else:
+                    result = func(**arguments)
+            except Exception as e:
+                results.append(_error(str(e), "UNEXPECTED_ERROR"))
+                continue
+            self.contracts.observe(name, result)
+            results.append(result)
+        return results, None
+
+    async def acall(self, name: str, arguments: Dict[str, Any]) -> dict:
+        """调用异步的普通函数，返回结果字典"""
+        spec, arguments, error = self._check_kind(name, arguments, streaming=False, is_async=True)
+        if error:
+            return error
+        try:
+            result = await spec.func(**arguments)
+        except Exception as e:
+            return _error(str(e), "UNEXPECTED_ERROR")
+        self.contracts.observe(name, result)
+        return result
+
+    def stream(self, name: str, arguments: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """调用同步的流式函数，逐个产出事件；出错时产出一个 error 事件"""
+        spec, arguments, error = self._check_kind(name, arguments, streaming=True, is_async=False)
+        if error:
+            yield {"type": "error", "data": error["error"], "error_code": error["error_code"]}
+            return
+        record = self.contracts.sample(name)
+        events = spec.func(**arguments)
+        try:
+            if record is None:
+                yield from events
+            else:
+                for event in events:
+                    record(event)
+                    yield event
+        except Exception as e:
+            yield {"type": "error", "data": str(e), "error_code": "UNEXPECTED_ERROR"}
+        finally:
+            events.close()
+
+    async def astream(self, name: str, arguments: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """调用异步的流式函数，逐个产出事件；出错时产出一个 error 事件"""
+        spec, arguments, error = self._check_kind(name, arguments, streaming=True, is_async=True)
+        if error:
+            yield {"type": "error", "data": error["error"], "error_code": error["error_code"]}
+            return
+        record = self.contracts.sample(name)
+        events = spec.func(**arguments)
+        try:
+            async for event in events:
+                if record is not None:
+                    record(event)
+                yield event
+        except Exception as e:
+            yield {"type": "error", "data": str(e), "error_code": "UNEXPECTED_ERROR"}
+        finally:
+            # 客户端断开时（本生成器被关闭）同时关闭底层的异步生成器
+            await events.aclose()
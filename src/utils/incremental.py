@@ -0,0 +1,326 @@
+"""
+增量（只追加）处理
+
+日志类输入在两次调用之间只会在末尾追加内容。增量模式保存一个检查点，
+按内容识别输入：已处理到的字节偏移和对应的输出偏移、当时的输入大小、
+已处理前缀首尾两个窗口的 CRC32，以及整个已处理前缀和对应输出的 CRC32。
+之后的调用只转换新追加的字节，并追加到已有输出的末尾。
+
+检查点偏移总是紧跟在换行符之后：在换行处切分与整体处理的结果逐字节
+一致（见 sharding），不完整的最后一行会在下次调用时与追加的内容一起
+重新处理。输入变小、已处理前缀的内容有任何变化、输出被改动或管道不同
+时，都会回退到完整处理。续接时先比较首尾窗口（改写首尾时不必读完前缀），
+再按块重新计算整个前缀的 CRC32；这只需读取、不需要转换，新前缀的 CRC32
+在转换新增内容的同时累计得到。
+
+检查点默认保存在输出文件旁边。指定 state_dir 时，检查点和输出的副本
+按输出文件名和管道保存在该目录下，输出所在的目录在两次调用之间被删除
+也能续接：本地 Gateway 为每次调用新建工作空间，由 main 把状态目录放在
+共享的缓存目录中。使用状态目录时还可以在处理过程中每隔 checkpoint_bytes
+保存一次检查点，处理中途被取消（例如流式调用的客户端断开）后，下一次
+调用从最近的检查点继续。
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from contextlib import nullcontext
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+from .pipeline import Pipeline, build_ascii_transform, build_transform
+from .result_cache import _copy_file, _tmp_path
+from .sharding import _RangeReader
+from .text_stream import DEFAULT_CHUNK_SIZE, ProgressCallback, _atomic_output, transform_stream
+
+# 检查点格式版本（版本 1 按设备号和 inode 识别输入，版本 2 按大小和修改时间识别输出）
+CHECKPOINT_VERSION = 3
+
+# 校验已处理前缀时读取的首尾窗口大小（字节）
+_WINDOW = 64 * 1024
+
+# 寻找换行符时每次读取的字节数
+_SCAN_BLOCK = 64 * 1024
+
+# 校验整个已处理前缀时每次读取的字节数
+_HASH_BLOCK = 1024 * 1024
+
+# 保存检查点后的回调：(输入偏移, 输出偏移)
+CheckpointCallback = Callable[[int, int], None]
+
+
+class _CrcReader:
+    """在读取的同时累计 CRC32"""
+
+    def __init__(self, f: BinaryIO, crc: int = 0):
+        self._f = f
+        self.crc = crc
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.crc = zlib.crc32(data, self.crc)
+        return data
+
+
+class _CrcWriter:
+    """在写入的同时累计 CRC32，可选地把同样的内容写入一个副本"""
+
+    def __init__(self, f: BinaryIO, crc: int = 0, copy: Optional[BinaryIO] = None):
+        self._f = f
+        self._copy = copy
+        self.crc = crc
+
+    def write(self, data: bytes) -> int:
+        self.crc = zlib.crc32(data, self.crc)
+        if self._copy is not None:
+            self._copy.write(data)
+        return self._f.write(data)
+
+
+def checkpoint_path(output_path: Path) -> Path:
+    """输出文件对应的检查点路径（同目录下的隐藏文件）"""
+    return output_path.with_name(f".{output_path.name}.checkpoint.json")
+
+
+def _state_paths(output_path: Path, pipeline: Pipeline, state_dir: Optional[Path]) -> Tuple[Path, Optional[Path]]:
+    """检查点路径和保存的输出副本路径；不使用状态目录时检查点在输出旁边，没有副本"""
+    if state_dir is None:
+        return checkpoint_path(output_path), None
+    name = hashlib.sha256(f"{output_path.name}\0{pipeline.key}".encode("utf-8")).hexdigest()
+    return state_dir / f"{name}.json", state_dir / f"{name}.out"
+
+
+def _window_crc(f: BinaryIO, start: int, end: int) -> int:
+    """计算 [start, end) 区间的 CRC32"""
+    f.seek(start)
+    return zlib.crc32(f.read(end - start))
+
+
+def _prefix_windows(f: BinaryIO, offset: int) -> Dict[str, int]:
+    """已处理前缀 [0, offset) 的首尾窗口校验值"""
+    return {
+        "head_crc32": _window_crc(f, 0, min(offset, _WINDOW)),
+        "tail_crc32": _window_crc(f, max(0, offset - _WINDOW), offset),
+    }
+
+
+def _prefix_crc(f: BinaryIO, offset: int) -> int:
+    """按块计算整个前缀 [0, offset) 的 CRC32"""
+    f.seek(0)
+    crc = 0
+    while offset > 0:
+        block = f.read(min(_HASH_BLOCK, offset))
+        if not block:
+            break
+        crc = zlib.crc32(block, crc)
+        offset -= len(block)
+    return crc
+
+
+def _last_line_end(f: BinaryIO, start: int, end: int) -> int:
+    """返回 [start, end) 中最后一个换行符的下一个位置，没有换行符时返回 start"""
+    pos = end
+    while pos > start:
+        block_start = max(start, pos - _SCAN_BLOCK)
+        f.seek(block_start)
+        i = f.read(pos - block_start).rfind(b"\n")
+        if i >= 0:
+            return block_start + i + 1
+        pos = block_start
+    return start
+
+
+def _next_line_end(f: BinaryIO, start: int, end: int) -> int:
+    """返回 [start, end) 中第一个换行符的下一个位置，没有换行符时返回 end"""
+    f.seek(start)
+    pos = start
+    while pos < end:
+        block = f.read(min(_SCAN_BLOCK, end - pos))
+        if not block:
+            break
+        i = block.find(b"\n")
+        if i >= 0:
+            return pos + i + 1
+        pos += len(block)
+    return end
+
+
+def _load_checkpoint(path: Path, input_path: Path, output_path: Path, pipeline: Pipeline) -> Optional[dict]:
+    """读取并校验检查点（output_path 为检查点记录的输出），无法安全续接时返回 None"""
+    try:
+        checkpoint = json.loads(path.read_text(encoding="utf-8"))
+        input_size = input_path.stat().st_size
+        output_size = output_path.stat().st_size
+    except (OSError, ValueError):
+        return None
+
+    if (
+        checkpoint.get("version") != CHECKPOINT_VERSION
+        or checkpoint.get("pipeline") != pipeline.key
+        or not 0 <= checkpoint.get("input_size", -1) <= input_size
+        or not 0 <= checkpoint.get("output_offset", -1) <= output_size
+    ):
+        return None
+
+    with open(input_path, "rb") as f:
+        windows = _prefix_windows(f, checkpoint["input_offset"])
+        if any(checkpoint.get(key) != value for key, value in windows.items()):
+            return None
+        if checkpoint.get("prefix_crc32") != _prefix_crc(f, checkpoint["input_offset"]):
+            return None
+    with open(output_path, "rb") as f:
+        if checkpoint.get("output_crc32") != _prefix_crc(f, checkpoint["output_offset"]):
+            return None
+    return checkpoint
+
+
+def _save_checkpoint(path: Path, checkpoint: dict) -> None:
+    """原子地写入检查点"""
+    tmp = _tmp_path(path)
+    tmp.write_text(json.dumps(checkpoint), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _replace_with_copy(src: Path, path: Path) -> None:
+    """用 src 的一份独立副本替换 path"""
+    tmp = _tmp_path(path)
+    try:
+        _copy_file(src, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _break_hardlink(path: Path) -> None:
+    """输出与结果缓存共享 inode 时先复制一份，避免追加写入改动缓存条目"""
+    if path.stat().st_nlink > 1:
+        _replace_with_copy(path, path)
+
+
+def incremental_transform_file(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    state_dir: Optional[Path] = None,
+    resume: bool = True,
+    checkpoint_bytes: int = 0,
+    on_checkpoint: Optional[CheckpointCallback] = None,
+) -> Dict[str, int]:
+    """
+    增量转换只追加的输入文件
+
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        pipeline: 编译后的管道（不能包含 reverse）
+        chunk_size: 每次读取的字节数
+        progress: 可选的进度回调（从检查点续接时，跳过的前缀一次性上报）
+        state_dir: 可选的状态目录，检查点和输出副本保存在这里而不是输出旁边
+        resume: 是否从已保存的检查点续接；为 False 时完整处理，但仍保存新的检查点
+        checkpoint_bytes: 大于 0 且指定了 state_dir 时，处理过程中大约每隔这么多
+            输入字节（在换行符处）保存一次检查点
+        on_checkpoint: 可选的回调，每次保存检查点后以 (输入偏移, 输出偏移) 调用
+
+    Returns:
+        统计信息，见 transform_stream()；bytes_read / bytes_written 为本次
+        实际读写的字节数，original_length / processed_length 为整个文件的
+        累计值，额外的 resumed_bytes 为从检查点续接时跳过的输入字节数
+    """
+    if pipeline.reverse:
+        raise ValueError("增量处理不支持 reverse")
+
+    cp_path, saved_path = _state_paths(output_path, pipeline, state_dir)
+    checkpoint = _load_checkpoint(cp_path, input_path, saved_path or output_path, pipeline) if resume else None
+    # 处理期间输出可能处于中间状态：先作废检查点，成功后再写入新的
+    cp_path.unlink(missing_ok=True)
+
+    transform = build_transform(pipeline.maps)
+    ascii_transform = build_ascii_transform(pipeline.maps)
+    # 只处理到开始时的文件末尾，处理期间追加的内容留给下次调用
+    size = input_path.stat().st_size
+
+    if checkpoint:
+        start = checkpoint["input_offset"]
+        totals = {key: checkpoint[key] for key in ("original_length", "processed_length")}
+        if progress and start:
+            # 跳过的前缀视为已完成，进度与总字节数保持一致
+            progress(start)
+        if saved_path:
+            # 从保存的副本恢复输出，追加写入不会改动副本
+            _replace_with_copy(saved_path, output_path)
+        else:
+            _break_hardlink(output_path)
+        output = open(output_path, "r+b")
+        output.truncate(checkpoint["output_offset"])
+        output.seek(checkpoint["output_offset"])
+    else:
+        start = 0
+        totals = {"original_length": 0, "processed_length": 0}
+        output = _atomic_output(output_path)
+
+    saved = nullcontext()
+    if saved_path:
+        # 输出的副本只包含完整的行，在转换的同时写入。每次调用都换成新文件，
+        # 同时运行的调用不会写进同一个副本
+        saved_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _tmp_path(saved_path)
+        if checkpoint:
+            _copy_file(saved_path, tmp)
+            os.truncate(tmp, checkpoint["output_offset"])
+        saved = open(tmp, "ab")
+        os.replace(tmp, saved_path)
+
+    stats = {"bytes_read": 0, "bytes_written": 0}
+
+    def run(src: BinaryIO, dst: BinaryIO) -> None:
+        part = transform_stream(src, dst, transform, chunk_size, progress, ascii_transform)
+        for key in stats:
+            stats[key] += part[key]
+        for key in totals:
+            totals[key] += part[key]
+
+    with open(input_path, "rb") as src, output as dst, saved as copy:
+        # 分两段处理：完整的行（检查点记录到这里）和不完整的最后一行
+        line_end = _last_line_end(src, start, size)
+        lines = _CrcWriter(dst, checkpoint["output_crc32"] if checkpoint else 0, copy)
+        prefix_crc = checkpoint["prefix_crc32"] if checkpoint else 0
+        pos = start
+        while True:
+            # 完整的行在转换的同时接着已校验的前缀累计输入和输出的 CRC32
+            end = line_end
+            if copy is not None and checkpoint_bytes > 0 and pos + checkpoint_bytes < line_end:
+                end = _next_line_end(src, pos + checkpoint_bytes, line_end)
+            reader = _CrcReader(_RangeReader(src, pos, end), prefix_crc)
+            run(reader, lines)
+            prefix_crc, pos = reader.crc, end
+            new_checkpoint = {
+                "version": CHECKPOINT_VERSION,
+                "pipeline": pipeline.key,
+                "input_size": size,
+                "input_offset": pos,
+                "output_offset": dst.tell(),
+                "prefix_crc32": prefix_crc,
+                "output_crc32": lines.crc,
+                **_prefix_windows(src, pos),
+                **totals,
+            }
+            if pos == line_end:
+                break
+            # 处理中途的检查点只写在状态目录中，副本已包含到这里为止的输出
+            copy.flush()
+            _save_checkpoint(cp_path, new_checkpoint)
+            if on_checkpoint:
+                on_checkpoint(pos, new_checkpoint["output_offset"])
+        run(_RangeReader(src, line_end, size), dst)
+
+    _save_checkpoint(cp_path, new_checkpoint)
+    if on_checkpoint:
+        on_checkpoint(line_end, new_checkpoint["output_offset"])
+
+    stats.update(totals)
+    stats["resumed_bytes"] = start
+    return stats
@@ -0,0 +1,272 @@
+"""
+行偏移索引与按范围处理
+
+按范围处理只读取并转换 [start, end) 字节区间，区间可以按字节或按行
+（从 1 开始，包含两端）指定。按字节指定时，落在多字节字符中间的边界
+向后对齐到下一个字符开头，字符归属于它第一个字节所在的区间。
+
+按行指定时需要行号到字节偏移的映射。稀疏行索引在一次流式读取中建立：
+每隔 INDEX_INTERVAL 字节记录一个检查点（该字节偏移、此前的换行符
+个数），与读取的块大小无关，建立时只对每段调用 bytes.count()。查找第 n 行时二分找到
+最近的检查点，再向后扫描不超过一个间隔的字节，因此与文件大小无关。
+
+索引按输入内容的 SHA-256 保存在缓存目录下（<digest>.json），同时以
+文件身份和修改时间（设备号、inode、大小、mtime）记录一个指向它的引用，
+同一文件的重复调用只需一次 stat 即可找到索引，不再读取整个文件。
+行按 \\n 切分，与分片和增量处理一致。
+"""
+
+import bisect
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+from .pipeline import Pipeline, build_ascii_transform, build_transform
+from .result_cache import _tmp_path
+from .sharding import _RangeReader
+from .text_stream import DEFAULT_CHUNK_SIZE, ProgressCallback, _atomic_output, reverse_stream, transform_stream
+
+# 索引格式版本（版本 1 的检查点只落在读取块的开头，间隔可能远大于 INDEX_INTERVAL）
+INDEX_VERSION = 2
+
+# 相邻检查点之间的字节数（查找一行最多向后扫描这么多字节）
+INDEX_INTERVAL = 256 * 1024
+
+# 扫描换行符时每次读取的字节数
+_SCAN_BLOCK = 64 * 1024
+
+
+class TextRange(NamedTuple):
+    """要处理的区间：unit 为 "line"（从 1 开始，包含两端）或 "byte"（半开区间），end 为 -1 表示到文件末尾"""
+
+    unit: str
+    start: int
+    end: int
+
+
+class LineIndex(NamedTuple):
+    """稀疏行索引：offsets[k] 处之前恰好有 lines[k] 个换行符"""
+
+    size: int
+    line_count: int
+    offsets: List[int]
+    lines: List[int]
+
+    def line_start(self, f: BinaryIO, line: int) -> int:
+        """第 line 行（从 1 开始）的行首字节偏移，超过总行数时返回文件大小"""
+        if line <= 1:
+            return 0
+        if line > self.line_count:
+            return self.size
+        # 检查点可能落在行中间：取之前换行符个数严格少于 line - 1 的最后一个
+        k = bisect.bisect_left(self.lines, line - 1) - 1
+        pos = self.offsets[k]
+        skip = line - 1 - self.lines[k]
+        f.seek(pos)
+        while skip:
+            block = f.read(_SCAN_BLOCK)
+            if not block:
+                return self.size
+            count = block.count(b"\n")
+            if count >= skip:
+                # split 在 C 中完成：最后一段就是第 skip 个换行符之后的内容
+                return pos + len(block) - len(block.split(b"\n", skip)[-1])
+            skip -= count
+            pos += len(block)
+        return pos
+
+
+def parse_range(start_line: int, end_line: int, start_byte: int, end_byte: int) -> Optional[TextRange]:
+    """
+    校验范围参数，未指定范围时返回 None
+
+    Raises:
+        ValueError: 参数不是整数、超出取值范围，或同时指定了行范围和字节范围
+    """
+    for name, value in (("start_line", start_line), ("end_line", end_line),
+                        ("start_byte", start_byte), ("end_byte", end_byte)):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"{name} 必须是整数")
+
+    by_line = (start_line, end_line) != (1, -1)
+    by_byte = (start_byte, end_byte) != (0, -1)
+    if by_line and by_byte:
+        raise ValueError("不能同时指定行范围和字节范围")
+    if by_line:
+        if start_line < 1 or end_line < -1 or 0 <= end_line < start_line:
+            raise ValueError("行范围无效：start_line 从 1 开始，end_line 不小于 start_line 或为 -1")
+        return TextRange("line", start_line, end_line)
+    if by_byte:
+        if start_byte < 0 or end_byte < -1 or 0 <= end_byte < start_byte:
+            raise ValueError("字节范围无效：start_byte 从 0 开始，end_byte 不小于 start_byte 或为 -1")
+        return TextRange("byte", start_byte, end_byte)
+    return None
+
+
+def build_line_index(f: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[LineIndex, str]:
+    """
+    一次流式读取建立稀疏行索引，同时计算内容的 SHA-256
+
+    Returns:
+        (索引, 十六进制摘要)
+    """
+    digest = hashlib.sha256()
+    offsets, lines = [0], [0]
+    pos = newlines = 0
+    last = b""
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        digest.update(block)
+        # 块内每个 INDEX_INTERVAL 的整数倍处记录一个检查点，分段计数，每个字节只数一次
+        mark, counted = offsets[-1] + INDEX_INTERVAL, 0
+        while mark < pos + len(block):
+            newlines += block.count(b"\n", counted, mark - pos)
+            counted = mark - pos
+            offsets.append(mark)
+            lines.append(newlines)
+            mark += INDEX_INTERVAL
+        newlines += block.count(b"\n", counted)
+        pos += len(block)
+        last = block[-1:]
+
+    # 不以换行符结尾的最后一行也算一行
+    line_count = newlines + (1 if last and last != b"\n" else 0)
+    return LineIndex(pos, line_count, offsets, lines), digest.hexdigest()
+
+
+class LineIndexStore:
+    """
+    磁盘上的行索引
+
+    每个索引保存为 <digest>.json；<dev>-<ino>-<size>-<mtime_ns>.ref 记录
+    某个文件版本对应的摘要，文件被修改后旧的引用会被清理。
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _load(self, digest: str) -> LineIndex:
+        data = json.loads((self.root / f"{digest}.json").read_text(encoding="utf-8"))
+        if data["version"] != INDEX_VERSION:
+            raise ValueError("索引版本不兼容")
+        return LineIndex(data["size"], data["line_count"], data["offsets"], data["lines"])
+
+    def _write(self, path: Path, text: str) -> None:
+        tmp = _tmp_path(path)
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def get(self, input_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[LineIndex, bool]:
+        """
+        取得输入文件的行索引，没有可用的索引时建立并保存
+
+        Returns:
+            (索引, 是否复用了已保存的索引)
+        """
+        st = input_path.stat()
+        identity = f"{st.st_dev}-{st.st_ino}"
+        ref_path = self.root / f"{identity}-{st.st_size}-{st.st_mtime_ns}.ref"
+        try:
+            index = self._load(ref_path.read_text(encoding="utf-8").strip())
+            if index.size == st.st_size:
+                return index, True
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with open(input_path, "rb") as f:
+            index, digest = build_line_index(f, chunk_size)
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            index_path = self.root / f"{digest}.json"
+            if not index_path.exists():
+                self._write(index_path, json.dumps({"version": INDEX_VERSION, **index._asdict()}))
+            for stale in self.root.glob(f"{identity}-*.ref"):
+                stale.unlink(missing_ok=True)
+            self._write(ref_path, digest)
+        except OSError:
+            # 索引只是加速手段，保存失败不影响本次结果
+            pass
+        return index, False
+
+
+def _char_boundary(f: BinaryIO, pos: int, size: int) -> int:
+    """把字节偏移向后对齐到 UTF-8 字符开头"""
+    if pos >= size:
+        return size
+    f.seek(pos)
+    head = f.read(3)
+    skip = 0
+    while skip < len(head) and (head[skip] & 0xC0) == 0x80:
+        skip += 1
+    return pos + skip
+
+
+def resolve_range(
+    f: BinaryIO,
+    input_path: Path,
+    text_range: TextRange,
+    store: LineIndexStore,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[int, int, Optional[bool]]:
+    """
+    把行范围或字节范围换算成对齐后的字节区间
+
+    Returns:
+        (start, end, 是否复用了行索引)；按字节指定时最后一项为 None
+    """
+    size = os.fstat(f.fileno()).st_size
+    if text_range.unit == "byte":
+        end = size if text_range.end < 0 else min(text_range.end, size)
+        start = min(text_range.start, end)
+        return _char_boundary(f, start, size), _char_boundary(f, end, size), None
+
+    index, index_hit = store.get(input_path, chunk_size)
+    start = index.line_start(f, text_range.start)
+    end = size if text_range.end < 0 else index.line_start(f, text_range.end + 1)
+    return start, end, index_hit
+
+
+def transform_range_file(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    text_range: TextRange,
+    store: LineIndexStore,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, int]:
+    """
+    只处理输入文件的一个区间，结果与对该区间的内容单独处理一致
+
+    Args:
+        input_path: 输入文件路径（未压缩）
+        output_path: 输出文件路径
+        pipeline: 编译后的管道
+        text_range: 要处理的区间
+        store: 行索引存储（按行指定区间时使用）
+        chunk_size: 每次读取的字节数
+        progress: 可选的进度回调
+
+    Returns:
+        统计信息，见 transform_stream()；额外的 range_start / range_end 为
+        实际处理的字节区间，按行指定时 index_hit 表示是否复用了已保存的行索引
+    """
+    transform = build_transform(pipeline.maps)
+    ascii_transform = build_ascii_transform(pipeline.maps)
+    with open(input_path, "rb") as src, _atomic_output(output_path) as dst:
+        start, end, index_hit = resolve_range(src, input_path, text_range, store, chunk_size)
+        view = _RangeReader(src, start, end)
+        if pipeline.reverse:
+            stats = reverse_stream(view, dst, chunk_size, progress, transform, ascii_transform)
+        else:
+            stats = transform_stream(view, dst, transform, chunk_size, progress, ascii_transform)
+
+    stats["range_start"] = start
+    stats["range_end"] = end
+    if index_hit is not None:
+        stats["index_hit"] = index_hit
+    return stats
@@ -0,0 +1,192 @@
+"""
+纯函数的结果缓存
+
+manifest 中 "pure": true 的函数（同样的参数总是得到同样的结果、没有副作用，
+例如 greet、echo、add_numbers）由 Dispatcher 通过 MemoCache 调用：
+
+- 结果按 (函数名, 规范化后的参数) 缓存在内存中，按条目数做 LRU 淘汰，
+  超过 ttl 秒的条目视为过期；
+- 只缓存 success 为 True 的结果，失败结果和异常每次都重新执行；
+- 同一个键正在执行时，其他线程的相同调用不再执行，等待并共享这一次的
+  结果（singleflight）。
+
+参数规范化：值都是标量（str、int、float、bool、None）时键由参数名、值和值
+的类型组成，1、1.0 和 True 是不同的键；含列表或对象时使用排序键后的 JSON；
+无法序列化的参数不缓存，直接执行。
+
+缓存的结果在多次调用之间共享，调用方不应修改返回的字典。
+"""
+
+import json
+import operator
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# 默认最多缓存的结果数
+DEFAULT_MEMO_SIZE = 1024
+
+# 默认的缓存有效期（秒）
+DEFAULT_MEMO_TTL = 300.0
+
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+_value = operator.itemgetter(1)
+
+
+def make_key(name: str, arguments: Dict[str, Any]) -> Optional[Hashable]:
+    """规范化的缓存键，参数无法规范化时返回 None"""
+    items = tuple(sorted(arguments.items()))
+    types = tuple(map(type, map(_value, items)))
+    if _SCALAR_TYPES.issuperset(types):
+        return name, items, types
+    try:
+        return name, json.dumps(arguments, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+
+
+class MemoStats:
+    """缓存统计（在 MemoCache 的锁内更新）"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.uncacheable = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        当前统计
+
+        hits 为命中缓存的调用数，misses 为实际执行的调用数，coalesced 为等待
+        同一个键正在进行的执行而没有自己执行的调用数，evictions / expirations
+        为因容量淘汰 / 过期删除的条目数，uncacheable 为参数无法规范化而
+        直接执行的调用数
+        """
+        return dict(vars(self))
+
+
+class _Flight:
+    """一次正在进行的执行"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+
+class MemoCache:
+    """线程安全的 LRU + TTL 结果缓存，带相同调用合并"""
+
+    def __init__(self, maxsize: int = DEFAULT_MEMO_SIZE, ttl: float = DEFAULT_MEMO_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        if maxsize < 0:
+            raise ValueError("maxsize 不能小于 0")
+        if ttl < 0:
+            raise ValueError("ttl 不能小于 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = MemoStats()
+        self._clock = clock
+        # 键 -> (过期时间, 结果)，按最近使用排序
+        self._entries: "OrderedDict[Hashable, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        """maxsize 或 ttl 为 0 时不缓存也不合并"""
+        return self.maxsize > 0 and self.ttl > 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """统计加上当前条目数和命中率"""
+        with self._lock:
+            stats = self.stats.snapshot()
+            size = len(self._entries)
+        looked_up = stats["hits"] + stats["misses"] + stats["coalesced"]
+        hit_ratio = (stats["hits"] + stats["coalesced"]) / looked_up if looked_up else 0.0
+        return {**stats, "size": size, "maxsize": self.maxsize, "hit_ratio": round(hit_ratio, 4)}
+
+    def clear(self) -> None:
+        """删除所有条目（正在进行的执行不受影响）"""
+        with self._lock:
+            self._entries.clear()
+
+    def call(self, name: str, arguments: Dict[str, Any], func: Callable[[], dict]) -> dict:
+        """
+        返回 func() 的结果，优先使用缓存
+
+        Args:
+            name: 函数名
+            arguments: 调用参数（用于计算键）
+            func: 执行一次调用的无参函数
+
+        Raises:
+            func() 抛出的异常（合并的调用收到同一个异常）
+        """
+        if not self.enabled:
+            return func()
+        key = make_key(name, arguments)
+        if key is None:
+            with self._lock:
+                self.stats.uncacheable += 1
+            return func()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.stats.expirations += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = func()
+        except BaseException as e:
+            flight.error = e
+            self._finish(key, flight)
+            raise
+        flight.result = result
+        self._finish(key, flight)
+        return result
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        """结束一次执行：缓存成功的结果，唤醒等待的调用"""
+        with self._lock:
+            del self._inflight[key]
+            result = flight.result
+            if isinstance(result, dict) and result.get("success") is True:
+                self._store(key, result)
+        flight.done.set()
+
+    def _store(self, key: Hashable, result: dict) -> None:
+        """写入一个条目并按容量淘汰（调用方持有锁）"""
+        self._entries[key] = (self._clock() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
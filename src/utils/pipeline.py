@@ -0,0 +1,127 @@
+"""
+多步骤操作的融合管道
+
+operation 可以是单个操作名，也可以是按顺序执行的操作列表（例如先
+lowercase 再 reverse）。列表在处理前被编译成一个融合转换，每块只读取、
+转换、写出一次，不产生中间文件。
+
+编译规则：
+- reverse 只决定整体方向：所有 reverse 都被移到最前面，成对抵消。
+  被移过的大小写转换 M 变成它的镜像 M'(s) = M(s[::-1])[::-1]，
+  ŉ → ʼN 这类一对多映射和 Σ 的词尾形式因此与逐步执行一致
+- 相邻的相同转换是幂等的，只保留一个
+- 纯 ASCII 的块上大小写转换是逐字节一一映射，一串大小写转换等价于
+  最后一个（Unicode 下 upper 后再 lower 与直接 lower 并不总相同，
+  例如 ß，因此只在 ASCII 块上合并）
+"""
+
+from operator import methodcaller
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .text_stream import CHUNK_TRANSFORMS, AsciiTransform
+
+# 支持的单步操作
+STEPS = ("uppercase", "lowercase", "reverse")
+
+# 纯 ASCII 块上与 CHUNK_TRANSFORMS 等价的字节转换（bytes 和 bytearray 都适用）
+ASCII_TRANSFORMS: Dict[str, AsciiTransform] = {
+    "uppercase": methodcaller("upper"),
+    "lowercase": methodcaller("lower"),
+}
+
+# 操作列表的最大长度
+MAX_STEPS = 16
+
+# 编译后的大小写转换：(操作名, 是否镜像)
+CaseMap = Tuple[str, bool]
+
+
+class Pipeline(NamedTuple):
+    """编译后的管道：先按 reverse 决定读取方向，再对每块依次执行 maps"""
+
+    reverse: bool
+    maps: Tuple[CaseMap, ...]
+
+    @property
+    def key(self) -> str:
+        """规范化的管道描述，等价的操作列表得到相同的 key（用作缓存键）"""
+        parts = ["reverse"] if self.reverse else []
+        parts += [f"~{name}" if mirrored else name for name, mirrored in self.maps]
+        return "+".join(parts) or "none"
+
+
+def parse_steps(operation: Any) -> Tuple[str, ...]:
+    """
+    把 operation 参数规范化为操作列表
+
+    Raises:
+        ValueError: 操作名不支持，或列表为空、过长
+    """
+    steps = [operation] if isinstance(operation, str) else operation
+    if not isinstance(steps, (list, tuple)) or not 1 <= len(steps) <= MAX_STEPS:
+        raise ValueError(f"operation 必须是操作名或 1~{MAX_STEPS} 个操作组成的列表")
+    for step in steps:
+        if step not in STEPS:
+            raise ValueError(f"不支持的操作: {step}")
+    return tuple(steps)
+
+
+def compile_pipeline(steps: Tuple[str, ...]) -> Pipeline:
+    """把操作列表编译成 Pipeline，见模块说明中的规则"""
+    reverse = False
+    maps: List[CaseMap] = []
+    for step in steps:
+        if step == "reverse":
+            # M ∘ R = R ∘ M'：已有的转换越过 reverse 后变为镜像
+            reverse = not reverse
+            maps = [(name, not mirrored) for name, mirrored in maps]
+        elif not maps or maps[-1] != (step, False):
+            maps.append((step, False))
+    return Pipeline(reverse, tuple(maps))
+
+
+def _mirror(transform: Callable[[str], str]) -> Callable[[str], str]:
+    """M'(s) = M(s[::-1])[::-1]"""
+    return lambda text: transform(text[::-1])[::-1]
+
+
+def build_transform(maps: Tuple[CaseMap, ...]) -> Optional[Callable[[str], str]]:
+    """
+    把编译后的大小写转换融合成一个逐块执行的函数
+
+    Returns:
+        str -> str 转换；maps 为空（只有换行规范化）时返回 None
+    """
+    if not maps:
+        return None
+    if len(maps) == 1 and not maps[0][1]:
+        return CHUNK_TRANSFORMS[maps[0][0]]
+
+    funcs = [_mirror(CHUNK_TRANSFORMS[name]) if mirrored else CHUNK_TRANSFORMS[name] for name, mirrored in maps]
+    ascii_func = CHUNK_TRANSFORMS[maps[-1][0]]
+
+    def fused(text: str) -> str:
+        # str.isascii() 是 O(1) 的：CPython 在字符串对象上记录了这个标志
+        if text.isascii():
+            return ascii_func(text)
+        for func in funcs:
+            text = func(text)
+        return text
+
+    return fused
+
+
+def _ascii_identity(data: bytes) -> bytes:
+    return data
+
+
+def build_ascii_transform(maps: Tuple[CaseMap, ...]) -> AsciiTransform:
+    """
+    纯 ASCII 块上与 build_transform() 等价的字节转换
+
+    ASCII 的大小写转换是逐字节一一映射，镜像与原转换相同，
+    一串大小写转换只需执行最后一个。
+    """
+    if not maps:
+        return _ascii_identity
+    return ASCII_TRANSFORMS[maps[-1][0]]
@@ -0,0 +1,53 @@
+"""
+运行环境资源探测
+
+manifest 的 execution_environment 决定了容器可用的 CPU，这里按
+CPU 亲和性和 cgroup 配额计算实际可用的核数，用来确定并发度。
+"""
+
+import math
+import os
+from pathlib import Path
+
+# 并发度环境变量
+MAX_WORKERS_ENV = "PREFAB_MAX_WORKERS"
+
+# cgroup v2 的 CPU 配额文件，例如 "50000 100000" 表示 0.5 核
+_CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+
+
+def _cgroup_cpu_limit() -> float:
+    """读取 cgroup v2 的 CPU 配额，没有限制时返回 0"""
+    try:
+        quota, period = _CGROUP_CPU_MAX.read_text().split()[:2]
+    except (OSError, ValueError):
+        return 0
+    if quota == "max":
+        return 0
+    return int(quota) / int(period)
+
+
+def available_cpus() -> int:
+    """
+    返回当前进程实际可用的 CPU 核数（至少为 1）
+
+    同时考虑 CPU 亲和性和 cgroup 配额，例如 manifest 中的
+    "cpu": "500m" 在容器里会得到 1。
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit > 0:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def max_workers(default: int) -> int:
+    """读取并发度配置（PREFAB_MAX_WORKERS），未配置时使用 default"""
+    value = os.environ.get(MAX_WORKERS_ENV)
+    if not value:
+        return max(1, default)
+    return max(1, int(value))
@@ -0,0 +1,142 @@
+"""
+内容寻址的结果缓存
+
+以输入文件内容的 SHA-256（流式计算）加上操作参数作为键，把处理结果
+保存在磁盘上。命中时通过硬链接（跨文件系统时退而使用 copy_file_range
+或普通复制）把缓存的输出放到 data/outputs/，不再重复转换。
+
+缓存按总大小做 LRU 淘汰：每次命中都会刷新条目的 mtime，写入新条目后
+从最久未使用的条目开始删除，直到总大小不超过上限。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+# 键格式版本，处理逻辑发生不兼容变化时递增
+_KEY_VERSION = b"v1"
+
+
+def _tmp_path(path: Path) -> Path:
+    """
+    path 同目录下的临时文件路径
+
+    名字包含进程号和线程号：Gateway 预先 fork 的工作进程中，主线程的
+    线程号彼此相同，只用线程号会让多个进程写同一个临时文件。
+    """
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _copy_file(src: Path, dst: Path) -> None:
+    """复制文件，优先使用内核态的 copy_file_range"""
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """把 src 原子地放到 dst：同一文件系统内用硬链接，否则复制"""
+    tmp = _tmp_path(dst)
+    tmp.unlink(missing_ok=True)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            _copy_file(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+class ResultCache:
+    """
+    磁盘上的结果缓存
+
+    每个条目由两个文件组成：<key>.out（输出内容）和 <key>.json（统计信息）。
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(input_path: Path, variant: str) -> str:
+        """
+        计算缓存键
+
+        Args:
+            input_path: 输入文件路径（内容会被流式哈希）
+            variant: 影响输出的参数（例如操作名）
+
+        Returns:
+            十六进制的键
+        """
+        with open(input_path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256")
+        digest.update(b"\0" + _KEY_VERSION + b"\0" + variant.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _paths(self, key: str):
+        return self.root / f"{key}.out", self.root / f"{key}.json"
+
+    def fetch(self, key: str, output_path: Path) -> Optional[dict]:
+        """
+        查找缓存，命中时把结果放到 output_path
+
+        Returns:
+            命中时返回保存的统计信息，未命中返回 None
+        """
+        data_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            _link_or_copy(data_path, output_path)
+            # 刷新 LRU 时间
+            os.utime(data_path)
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def store(self, key: str, output_path: Path, meta: dict) -> None:
+        """把刚生成的输出加入缓存，并按需淘汰旧条目"""
+        data_path, meta_path = self._paths(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(output_path, data_path)
+        tmp_meta = _tmp_path(meta_path)
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_meta, meta_path)
+        self._evict()
+
+    def _evict(self) -> None:
+        """按 mtime 从旧到新删除条目，直到总大小不超过上限"""
+        with self._lock:
+            entries = []
+            for path in self.root.glob("*.out"):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.with_suffix(".json").unlink(missing_ok=True)
+                path.unlink(missing_ok=True)
+                total -= size
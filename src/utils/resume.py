@@ -0,0 +1,61 @@
+"""
+流式函数的可续传状态
+
+SSE 客户端断线后用 Last-Event-ID 重连时，Gateway 先尝试把仍在运行（或
+刚结束）的流接回去，补发断线期间的事件；流已经不在（过期、由其他工作
+进程处理）时，只能重新调用函数。可续传的流式函数在每个事件之后用
+save_checkpoint() 记录一个足以继续执行的状态（可 JSON 序列化的 dict），
+Gateway 把它放进事件 ID；重新调用时 resume_state() 返回客户端最后收到的
+那个事件之后的状态，函数据此跳过已经完成的部分。
+
+状态与工作空间一样保存在 contextvars 中，Gateway 之外（直接调用、测试）
+resume_state() 总是返回 None，resumable() 返回 False，save_checkpoint()
+什么也不做。
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class StreamCheckpoint:
+    """一次流式调用的续传状态"""
+
+    __slots__ = ("resume", "state")
+
+    def __init__(self, resume: Optional[dict] = None):
+        # 续传的起点（重新调用时来自 Last-Event-ID），None 表示从头开始
+        self.resume = resume
+        # 函数最近一次保存的状态
+        self.state: Optional[dict] = None
+
+
+_current: ContextVar[Optional[StreamCheckpoint]] = ContextVar("prefab_stream_checkpoint", default=None)
+
+
+def resumable() -> bool:
+    """当前调用是否可续传（保存检查点只在这时才有意义）"""
+    return _current.get() is not None
+
+
+def resume_state() -> Optional[dict]:
+    """续传的起点状态，从头开始时返回 None"""
+    checkpoint = _current.get()
+    return checkpoint.resume if checkpoint else None
+
+
+def save_checkpoint(state: dict) -> None:
+    """记录刚产出的事件之后的状态（在 yield 该事件之前调用）"""
+    checkpoint = _current.get()
+    if checkpoint is not None:
+        checkpoint.state = state
+
+
+@contextmanager
+def use_checkpoint(checkpoint: StreamCheckpoint) -> Iterator[StreamCheckpoint]:
+    """在当前上下文中启用续传状态，退出时恢复"""
+    token = _current.set(checkpoint)
+    try:
+        yield checkpoint
+    finally:
+        _current.reset(token)
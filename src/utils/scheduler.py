@@ -0,0 +1,117 @@
+"""
+共享的定时唤醒调度器
+
+count_stream_async 这类按固定间隔推送事件的流，如果各自 await
+asyncio.sleep()，每个流每次等待都会在事件循环上创建一个定时器；上万
+个流同时打开时，定时器堆里就有上万个条目，每个到期的流都单独唤醒一次。
+
+TickScheduler 是每个事件循环一个的共享调度器：流把下一次事件的截止
+时间（loop.time() 时钟上的绝对时间）登记进来，截止时间按 resolution
+向上取整到时间槽，同一个槽里的所有等待者放在一个桶中。调度器只为最早
+的槽在事件循环上挂一个定时器，到期时一次性唤醒整个桶，然后再为下一个
+槽挂定时器。向上取整保证不会提前唤醒，延后不超过一个 resolution。
+
+截止时间是绝对时间：流按 开始时间 + i * interval 登记，事件处理本身的
+耗时不会累积成漂移。
+"""
+
+import asyncio
+import heapq
+import math
+import weakref
+from typing import Dict, List, Optional
+
+# 时间槽宽度（秒）：同一个槽内到期的等待者一起唤醒
+DEFAULT_RESOLUTION = 0.001
+
+
+class TickScheduler:
+    """单个事件循环上的共享定时器（只能在该事件循环的线程中使用）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, resolution: float = DEFAULT_RESOLUTION):
+        if resolution <= 0:
+            raise ValueError("resolution 必须大于 0")
+        self._loop = loop
+        self._resolution = resolution
+        # 槽号 -> 等待该槽的 future；_slots 是槽号的最小堆
+        self._buckets: Dict[int, List[asyncio.Future]] = {}
+        self._slots: List[int] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_slot: Optional[int] = None
+        self._stats = {"registered": 0, "woken": 0, "batches": 0, "timers": 0}
+
+    def time(self) -> float:
+        """调度器使用的时钟（即 loop.time()）"""
+        return self._loop.time()
+
+    async def sleep_until(self, deadline: float) -> None:
+        """
+        等待到 deadline（loop.time() 时钟）
+
+        已经到期时只让出一次事件循环，与 asyncio.sleep(0) 相同。
+        """
+        if deadline <= self._loop.time():
+            await asyncio.sleep(0)
+            return
+        await self._register(deadline)
+
+    def _register(self, deadline: float) -> asyncio.Future:
+        slot = math.ceil(deadline / self._resolution)
+        future = self._loop.create_future()
+        bucket = self._buckets.get(slot)
+        if bucket is None:
+            self._buckets[slot] = bucket = []
+            heapq.heappush(self._slots, slot)
+            if self._timer_slot is None or slot < self._timer_slot:
+                self._arm(slot)
+        bucket.append(future)
+        self._stats["registered"] += 1
+        return future
+
+    def _arm(self, slot: int) -> None:
+        """为 slot 挂定时器（替换掉更晚的那个）"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._loop.call_at(slot * self._resolution, self._fire)
+        self._timer_slot = slot
+        self._stats["timers"] += 1
+
+    def _fire(self) -> None:
+        """唤醒所有已到期槽中的等待者，再为下一个槽挂定时器"""
+        self._timer = self._timer_slot = None
+        now = self._loop.time()
+        while self._slots and self._slots[0] * self._resolution <= now:
+            bucket = self._buckets.pop(heapq.heappop(self._slots))
+            self._stats["batches"] += 1
+            for future in bucket:
+                # 客户端断开时等待的任务被取消，future 也随之取消
+                if not future.done():
+                    future.set_result(None)
+                    self._stats["woken"] += 1
+        if self._slots:
+            self._arm(self._slots[0])
+
+    def pending(self) -> int:
+        """尚未唤醒的等待者个数（含已取消、等待清理的）"""
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def stats(self) -> Dict[str, int]:
+        """
+        累计统计
+
+        registered: 登记的等待次数；woken: 实际唤醒的次数；batches: 唤醒的槽数
+        （每个槽一次批量唤醒）；timers: 在事件循环上挂过的定时器个数
+        """
+        return dict(self._stats)
+
+
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TickScheduler]" = weakref.WeakKeyDictionary()
+
+
+def get_scheduler() -> TickScheduler:
+    """当前事件循环的共享调度器（第一次使用时创建）"""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        _schedulers[loop] = scheduler = TickScheduler(loop)
+    return scheduler
@@ -0,0 +1,278 @@
+"""
+单文件并行分片处理
+
+大小写转换没有跨块依赖，大文件可以在换行符处切成若干分片，
+由进程池并行转换，每个分片直接写入预分配输出文件中的对应偏移。
+
+分片边界紧跟在 \\n 之后：既不会拆开多字节字符和 \\r\\n，也不会影响
+lower() 中 Σ 的词尾形式，因此结果与串行路径逐字节一致。
+
+各分片先写入预分配输出文件中与输入相同的偏移，不需要事先扫描输入。
+转换后字节数变化的分片（例如 ß → SS、\\r\\n → \\n）在工作进程中发现后，
+把已写的内容转移到自己的临时文件继续写；全部完成后只移动这些分片之后
+受影响的内容，拼成连续的输出，仍然是并行处理。
+
+工作进程用 forkserver（不支持时用 spawn）方式启动：Gateway 等调用方是
+多线程的，在多线程进程中 fork 可能让子进程卡在其他线程持有的锁上。
+"""
+
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from .pipeline import CaseMap, Pipeline, build_ascii_transform, build_transform
+from .text_stream import DEFAULT_CHUNK_SIZE, ProgressCallback, _atomic_output, transform_stream
+
+# 每个工作进程分到的分片数，多切几片可以平衡各分片的耗时差异
+SHARDS_PER_WORKER = 4
+
+# 寻找分片边界（换行符）时最多向后扫描的字节数，超出则与下一个分片合并
+_BOUNDARY_SCAN_LIMIT = 1024 * 1024
+
+# 移动、拼接分片输出时每次读写的字节数
+_COPY_BLOCK_SIZE = 1024 * 1024
+
+# 工作进程的启动方式
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class _RangeReader:
+    """只读取 [start, end) 区间的输入流，seek 的偏移相对于区间开头"""
+
+    def __init__(self, f: BinaryIO, start: int, end: int):
+        f.seek(start)
+        self._f = f
+        self._start = start
+        self._end = end
+        self._remaining = end - start
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        """定位到区间内的偏移（只支持 SEEK_SET 和 SEEK_END，超出区间时截到边界）"""
+        base = self._end if whence == os.SEEK_END else self._start
+        pos = min(max(base + offset, self._start), self._end)
+        self._f.seek(pos)
+        self._remaining = self._end - pos
+        return pos - self._start
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+class _ShardWriter:
+    """
+    分片的输出流：先写入输出文件中 [start, end) 区间，字节数超出区间时
+    把已写的内容转移到 spill_path 并继续写在那里
+    """
+
+    def __init__(self, f: BinaryIO, start: int, end: int, spill_path: str):
+        f.seek(start)
+        self._f = f
+        self._start = start
+        self._spill_path = spill_path
+        self.written = 0
+        self.remaining = end - start
+        self.spill: Optional[BinaryIO] = None
+
+    def write(self, data: bytes) -> int:
+        if self.spill is None and len(data) > self.remaining:
+            self.spill_out()
+        if self.spill is not None:
+            return self.spill.write(data)
+        self.written += len(data)
+        self.remaining -= len(data)
+        return self._f.write(data)
+
+    def spill_out(self) -> None:
+        """把区间中已写的内容复制到 spill_path，之后的写入都追加到那里"""
+        self._f.flush()
+        self.spill = open(self._spill_path, "wb")
+        for pos in range(0, self.written, _COPY_BLOCK_SIZE):
+            size = min(_COPY_BLOCK_SIZE, self.written - pos)
+            self.spill.write(os.pread(self._f.fileno(), size, self._start + pos))
+
+
+def _find_boundary(f: BinaryIO, offset: int, end: int) -> int:
+    """返回 offset 之后第一个换行符的下一个位置，找不到时返回 -1"""
+    f.seek(offset)
+    scanned = 0
+    while scanned < _BOUNDARY_SCAN_LIMIT and offset + scanned < end:
+        block = f.read(min(64 * 1024, end - offset - scanned))
+        if not block:
+            break
+        i = block.find(b"\n")
+        if i >= 0:
+            return offset + scanned + i + 1
+        scanned += len(block)
+    return -1
+
+
+def plan_shards(input_path: Path, shard_count: int) -> List[Tuple[int, int]]:
+    """
+    把文件切成最多 shard_count 个分片，边界都紧跟在换行符之后
+
+    Returns:
+        [(start, end), ...]，按偏移排序且首尾相接
+    """
+    size = input_path.stat().st_size
+    if size == 0:
+        return []
+
+    target = max(1, size // max(1, shard_count))
+    bounds = [0]
+    with open(input_path, "rb") as f:
+        offset = target
+        while offset < size:
+            boundary = _find_boundary(f, max(offset, bounds[-1]), size)
+            if boundary < 0 or boundary >= size:
+                break
+            bounds.append(boundary)
+            offset = boundary + target
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _transform_shard(input_path: str, output_path: str, spill_path: str, start: int, end: int,
+                     maps: Tuple[CaseMap, ...], chunk_size: int) -> Tuple[Dict[str, int], bool]:
+    """
+    工作进程：转换一个分片
+
+    结果写入输出文件中与输入相同的偏移；转换后的字节数与分片不同时改为
+    写入 spill_path。返回 (统计信息, 是否写入了 spill_path)
+    """
+    with open(input_path, "rb") as src, open(output_path, "r+b") as dst:
+        writer = _ShardWriter(dst, start, end, spill_path)
+        try:
+            stats = transform_stream(_RangeReader(src, start, end), writer, build_transform(maps), chunk_size,
+                                     ascii_transform=build_ascii_transform(maps))
+            if writer.spill is None and writer.remaining:
+                writer.spill_out()
+        finally:
+            if writer.spill is not None:
+                writer.spill.close()
+    return stats, writer.spill is not None
+
+
+def _move_range(fd: int, src: int, dst: int, length: int) -> None:
+    """在同一个文件中把 [src, src + length) 移到 dst 处（两个区间可以重叠）"""
+    positions = range(0, length, _COPY_BLOCK_SIZE)
+    for pos in (positions if dst < src else reversed(positions)):
+        os.pwrite(fd, os.pread(fd, min(_COPY_BLOCK_SIZE, length - pos), src + pos), dst + pos)
+
+
+def _write_file_at(path: str, fd: int, offset: int) -> None:
+    """把 path 的内容写到 fd 的 offset 处，优先使用内核态的 copy_file_range"""
+    with open(path, "rb") as src:
+        size = os.fstat(src.fileno()).st_size
+        done = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                while done < size:
+                    copied = os.copy_file_range(src.fileno(), fd, size - done, done, offset + done)
+                    if not copied:
+                        break
+                    done += copied
+            except OSError:
+                # 不支持时（例如旧内核跨文件系统）剩下的部分改用普通读写
+                pass
+        while done < size:
+            block = os.pread(src.fileno(), min(_COPY_BLOCK_SIZE, size - done), done)
+            os.pwrite(fd, block, offset + done)
+            done += len(block)
+
+
+def _join_shards(dst: BinaryIO, shards: List[Tuple[int, int]], spills: List[Optional[str]]) -> None:
+    """
+    把原地写入的分片和写入临时文件的分片拼成连续的输出
+
+    spills[i] 为 None 表示分片 i 已写在与输入相同的偏移，否则为它的临时
+    文件。原地分片移到最终偏移时，右移的从后往前、左移的从前往后处理，
+    都不会覆盖还没移动的分片；临时文件中的分片最后写入。
+    """
+    targets, offset = [], 0
+    for (start, end), spill in zip(shards, spills):
+        targets.append(offset)
+        offset += end - start if spill is None else os.path.getsize(spill)
+    moves = [(start, target, end - start) for (start, end), spill, target in zip(shards, spills, targets)
+             if spill is None and target != start]
+
+    # dst 是只写打开的，移动分片需要另外以读写方式打开
+    dst.flush()
+    fd = os.open(dst.name, os.O_RDWR)
+    try:
+        for start, target, length in [m for m in reversed(moves) if m[1] > m[0]] + [m for m in moves if m[1] < m[0]]:
+            _move_range(fd, start, target, length)
+        for spill, target in zip(spills, targets):
+            if spill is not None:
+                _write_file_at(spill, fd, target)
+        os.ftruncate(fd, offset)
+    finally:
+        os.close(fd)
+
+
+def shard_transform_file(
+    input_path: Path,
+    output_path: Path,
+    pipeline: Pipeline,
+    workers: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, int]:
+    """
+    在进程池中并行转换单个大文件
+
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        pipeline: 编译后的管道（不能包含 reverse）
+        workers: 工作进程数
+        chunk_size: 每个分片内部每次读取的字节数
+        progress: 可选的进度回调，每完成一个分片调用一次
+
+    Returns:
+        统计信息，见 transform_stream()；额外的 shards 为实际并行处理的
+        分片数（文件太小无法分片、串行处理时为 1）
+    """
+    if pipeline.reverse:
+        raise ValueError("分片处理不支持 reverse")
+    shards = plan_shards(input_path, workers * SHARDS_PER_WORKER)
+
+    with _atomic_output(output_path) as dst:
+        if len(shards) <= 1:
+            with open(input_path, "rb") as src:
+                stats = transform_stream(src, dst, build_transform(pipeline.maps), chunk_size, progress,
+                                         build_ascii_transform(pipeline.maps))
+            stats["shards"] = 1
+            return stats
+
+        # 预分配输出文件，各分片写入与输入相同的偏移；字节数变化的分片改写到同目录下的临时文件
+        dst.truncate(shards[-1][1])
+        dst.flush()
+        with tempfile.TemporaryDirectory(dir=output_path.parent, prefix=f".{output_path.name}.") as tmp_dir:
+            spill_paths = [os.path.join(tmp_dir, f"{i}.part") for i in range(len(shards))]
+            context = multiprocessing.get_context(_START_METHOD)
+            with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as pool:
+                futures = {}
+                for (start, end), spill_path in zip(shards, spill_paths):
+                    future = pool.submit(_transform_shard, str(input_path), dst.name, spill_path, start, end,
+                                         pipeline.maps, chunk_size)
+                    futures[future] = end - start
+                if progress:
+                    for future in as_completed(futures):
+                        progress(futures[future])
+                results = [f.result() for f in futures]
+
+            spills = [path if spilled else None for path, (_, spilled) in zip(spill_paths, results)]
+            if any(spills):
+                _join_shards(dst, shards, spills)
+
+    stats = {key: sum(r[key] for r, _ in results)
+             for key in ("bytes_read", "bytes_written", "original_length", "processed_length")}
+    stats["shards"] = len(shards)
+    return stats
@@ -0,0 +1,344 @@
+"""
+SSE 流的有界事件缓冲和编码
+
+流式函数产出事件的速度和客户端读取的速度无关：客户端慢时，事件如果
+逐个排队，内存会持续增长，客户端读到的也是一串过时的进度。EventBuffer
+把生产者（流式函数）和消费者（写套接字）隔开：
+
+- 每个流一个缓冲区，最多 maxsize 个事件；
+- 新事件是 progress、且缓冲区末尾也是一个尚未被取走的 progress 时，
+  用新事件替换末尾的事件（progress 携带的是累计值，最新的一个包含了
+  之前所有的信息）；
+- start / done / error 等其他事件从不合并或丢弃：缓冲区满时生产者等待，
+  背压传递回流式函数。
+
+客户端跟得上时，每个 progress 在下一个到来之前就已被取走，不会发生合并。
+
+encode_sse() 把事件编码成 SSE 消息。同一个流的事件形状固定（相同的
+type、相同的键），只有值在变化：第一次遇到某个形状时把它编译成模板，
+事件行、"type" 字段和所有键名都预先拼好，之后每个事件只格式化变化的
+值，输出与 json.dumps(event, ensure_ascii=False) 逐字节一致。
+
+每个发出的事件带一个 ID（"id: <流 ID>-<序号>[.<检查点>]"），序号在流内
+单调递增。客户端断线重连时用 Last-Event-ID 带回最后收到的 ID：ReplayBuffer
+保存每个流最近发出的事件，用于补发；检查点是流式函数在该事件之后的
+可续传状态（见 src/utils/resume.py），流已不在时据此续传而不是从头开始。
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+from collections import deque
+from json.encoder import encode_basestring
+from typing import Any, Callable, Deque, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+# 每个流默认最多缓冲的事件数
+DEFAULT_BUFFER_SIZE = 16
+
+# 可以被后来的同类事件替换的事件类型
+COALESCE_TYPES: FrozenSet[str] = frozenset({"progress"})
+
+# 每个流默认保存的已发出事件数（用于断线重连后补发）
+DEFAULT_REPLAY_SIZE = 256
+
+# 事件 ID 中检查点的最大长度（超出时不附带检查点）
+_MAX_CHECKPOINT_TOKEN = 1024
+
+
+class BufferedEvent(NamedTuple):
+    """缓冲区中的一个事件，以及流式函数在产出它之后的检查点（没有时为 None）"""
+
+    event: Dict[str, Any]
+    checkpoint: Optional[dict]
+
+
+class StreamMetrics:
+    """一个进程内所有流的缓冲统计（只在事件循环线程中更新）"""
+
+    def __init__(self):
+        self.streams_open = 0
+        self.streams_total = 0
+        self.events_in = 0
+        self.events_out = 0
+        self.events_coalesced = 0
+        self.buffer_depth = 0
+        self.buffer_depth_max = 0
+        self.streams_resumed = 0
+        self.events_replayed = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        当前统计
+
+        buffer_depth 为所有打开的流当前缓冲的事件总数，buffer_depth_max 为
+        单个流缓冲深度的历史最大值，events_coalesced 为被合并掉的事件数，
+        streams_resumed / events_replayed 为断线重连续传的流数和补发的事件数
+        """
+        return dict(vars(self))
+
+
+class EventBuffer:
+    """单个流的有界事件缓冲（生产者和消费者都在同一个事件循环中）"""
+
+    def __init__(self, maxsize: int = DEFAULT_BUFFER_SIZE, metrics: Optional[StreamMetrics] = None):
+        if maxsize < 1:
+            raise ValueError("maxsize 必须大于 0")
+        self._events: Deque[BufferedEvent] = deque()
+        self._maxsize = maxsize
+        self._metrics = metrics or StreamMetrics()
+        self._closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self.coalesced = 0
+        self.max_depth = 0
+        self._metrics.streams_open += 1
+        self._metrics.streams_total += 1
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def put(self, event: Dict[str, Any], checkpoint: Optional[dict] = None) -> bool:
+        """
+        放入一个事件（和产出它之后的检查点），缓冲区满且无法合并时等待
+
+        Returns:
+            缓冲区已关闭（消费者已离开）时返回 False，生产者应停止
+        """
+        while not self._closed:
+            metrics = self._metrics
+            if (self._events and event.get("type") in COALESCE_TYPES
+                    and self._events[-1].event.get("type") == event.get("type")):
+                self._events[-1] = BufferedEvent(event, checkpoint)
+                self.coalesced += 1
+                metrics.events_in += 1
+                metrics.events_coalesced += 1
+                return True
+            if len(self._events) < self._maxsize:
+                self._events.append(BufferedEvent(event, checkpoint))
+                self.max_depth = max(self.max_depth, len(self._events))
+                metrics.events_in += 1
+                metrics.buffer_depth += 1
+                metrics.buffer_depth_max = max(metrics.buffer_depth_max, len(self._events))
+                self._readable.set()
+                return True
+            self._writable.clear()
+            await self._writable.wait()
+        return False
+
+    async def get(self) -> Optional[BufferedEvent]:
+        """取出最早的事件；缓冲区已关闭且取空时返回 None"""
+        while not self._events:
+            if self._closed:
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+        self._metrics.events_out += 1
+        self._metrics.buffer_depth -= 1
+        event = self._events.popleft()
+        self._writable.set()
+        return event
+
+    def close(self) -> None:
+        """
+        关闭缓冲区（可以重复调用）
+
+        生产者结束时关闭：消费者取完剩余事件后得到 None；消费者离开时关闭：
+        生产者下一次 put() 返回 False，剩余事件被丢弃。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._readable.set()
+        self._writable.set()
+        self._metrics.streams_open -= 1
+
+    def discard(self) -> None:
+        """丢弃尚未取走的事件（消费者离开时调用）"""
+        self._metrics.buffer_depth -= len(self._events)
+        self._events.clear()
+        self.close()
+
+
+# 与 json.dumps(..., ensure_ascii=False) 相同的配置；复用同一个实例，每次编码不再新建编码器
+_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+# 最多缓存的事件形状个数（超出后的新形状走通用路径）
+_MAX_TEMPLATES = 256
+
+
+def _encode_float(value: float) -> str:
+    # 与 json 模块一致：有限值用 repr，NaN / 无穷大用 JavaScript 的写法
+    if value - value == 0:
+        return float.__repr__(value)
+    if value != value:
+        return "NaN"
+    return "Infinity" if value > 0 else "-Infinity"
+
+
+# 标量值按精确类型直接格式化，其他值（子类、列表、嵌套对象）交给 _ENCODER
+_SCALARS: Dict[type, Callable[[Any], str]] = {
+    str: encode_basestring,
+    int: int.__repr__,
+    float: _encode_float,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "null",
+}
+
+
+class _Template:
+    """一种事件形状编译后的模板：head + 值 + tails[0] + 值 + tails[1] ..."""
+
+    __slots__ = ("head", "fields", "tails")
+
+    def __init__(self, head: str, fields: List[Tuple[str, Optional[str]]], tails: List[str]):
+        self.head = head
+        # 每个变化的值的位置：(顶层键, data 中的键或 None)
+        self.fields = fields
+        self.tails = tails
+
+    def encode(self, event: Dict[str, Any]) -> bytes:
+        parts = [self.head]
+        for (key, sub), tail in zip(self.fields, self.tails):
+            value = event[key] if sub is None else event[key][sub]
+            fmt = _SCALARS.get(type(value))
+            parts.append(fmt(value) if fmt else _ENCODER.encode(value))
+            parts.append(tail)
+        return "".join(parts).encode("utf-8")
+
+
+def _compile(event_type: str, keys: Tuple[str, ...], data_keys: Optional[Tuple[str, ...]]) -> _Template:
+    """把事件形状编译成模板：键名、分隔符和 "type" 的值都是静态片段"""
+    static = [f"event: {event_type}\ndata: {{"]
+    fields: List[Tuple[str, Optional[str]]] = []
+    for i, key in enumerate(keys):
+        static[-1] += (", " if i else "") + encode_basestring(key) + ": "
+        if key == "type":
+            static[-1] += encode_basestring(event_type)
+        elif key == "data" and data_keys:
+            for j, sub in enumerate(data_keys):
+                static[-1] += ("{" if j == 0 else ", ") + encode_basestring(sub) + ": "
+                fields.append((key, sub))
+                static.append("")
+            static[-1] += "}"
+        else:
+            fields.append((key, None))
+            static.append("")
+    static[-1] += "}\n\n"
+    return _Template(static[0], fields, static[1:])
+
+
+_templates: Dict[Tuple[Any, ...], Optional[_Template]] = {}
+
+
+def _template(event: Dict[str, Any]) -> Optional[_Template]:
+    """事件形状对应的模板，不能使用模板（type 不是字符串、键不是字符串）时返回 None"""
+    data = event.get("data")
+    data_keys = tuple(data) if type(data) is dict else None
+    shape = (event.get("type"), tuple(event), data_keys)
+    try:
+        return _templates[shape]
+    except KeyError:
+        pass
+    except TypeError:
+        # type 的值不可哈希
+        return None
+
+    event_type, keys, _ = shape
+    template = None
+    if (
+        type(event_type) is str
+        and all(type(key) is str for key in keys)
+        and all(type(key) is str for key in data_keys or ())
+    ):
+        template = _compile(event_type, keys, data_keys)
+    if len(_templates) < _MAX_TEMPLATES:
+        _templates[shape] = template
+    return template
+
+
+def encode_sse(event: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+    """把一个事件编码成 SSE 消息（可选的 "id: <ID>" + "event: <type>" + "data: <JSON>"）"""
+    template = _template(event)
+    if template is not None:
+        message = template.encode(event)
+    else:
+        data = _ENCODER.encode(event)
+        message = f"event: {event.get('type', 'message')}\ndata: {data}\n\n".encode("utf-8")
+    if event_id is not None:
+        return f"id: {event_id}\n".encode("utf-8") + message
+    return message
+
+
+class EventId(NamedTuple):
+    """解析后的事件 ID"""
+
+    stream_id: str
+    seq: int
+    checkpoint: Optional[dict]
+
+
+def format_event_id(stream_id: str, seq: int, checkpoint: Optional[dict] = None) -> str:
+    """
+    生成事件 ID：<流 ID>-<序号>，有检查点时追加 .<base64url(JSON)>
+
+    流 ID 中不能包含 "-" 和 "."
+    """
+    event_id = f"{stream_id}-{seq}"
+    if checkpoint is not None:
+        payload = json.dumps(checkpoint, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        token = base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+        if len(token) <= _MAX_CHECKPOINT_TOKEN:
+            event_id += f".{token}"
+    return event_id
+
+
+def parse_event_id(value: str) -> Optional[EventId]:
+    """解析 Last-Event-ID，格式不对时返回 None"""
+    head, _, token = value.strip().partition(".")
+    stream_id, _, seq = head.partition("-")
+    if not stream_id or not seq.isdigit():
+        return None
+    checkpoint = None
+    if token:
+        try:
+            checkpoint = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        except (binascii.Error, ValueError):
+            return None
+        if not isinstance(checkpoint, dict):
+            return None
+    return EventId(stream_id, int(seq), checkpoint)
+
+
+class ReplayBuffer:
+    """一个流最近发出的 maxsize 个事件（编码后的 SSE 消息）"""
+
+    def __init__(self, maxsize: int = DEFAULT_REPLAY_SIZE):
+        self._messages: Deque[Tuple[int, bytes]] = deque(maxlen=maxsize)
+
+    def append(self, seq: int, message: bytes) -> None:
+        """记录一个已发出的事件（序号递增）"""
+        self._messages.append((seq, message))
+
+    def since(self, seq: int, last_seq: int) -> Optional[List[bytes]]:
+        """
+        序号大于 seq 的事件
+
+        Args:
+            seq: 客户端最后收到的序号
+            last_seq: 流最后发出的序号
+
+        Returns:
+            需要补发的消息；其中一部分已被挤出缓冲区（或 seq 不合理）时返回 None
+        """
+        if seq > last_seq:
+            return None
+        if seq == last_seq:
+            return []
+        if not self._messages or self._messages[0][0] > seq + 1:
+            return None
+        return [message for s, message in self._messages if s > seq]
@@ -0,0 +1,573 @@
+"""
+文本流式处理引擎
+
+按固定大小的块读取输入文件，增量解码 UTF-8，逐块转换并立即写出。
+反转操作则从文件末尾向前按块读取，反转后顺序写出。
+峰值内存只与块大小有关，与输入文件大小无关。
+
+纯 ASCII 的输入走字节级快速路径：直接用 bytes.upper() / bytes.lower()
+和切片反转处理原始字节，跳过解码、编码和中间字符串。第一次遇到非
+ASCII 字节后，剩余部分都回退到 Unicode 路径。
+
+输出与一次性 read_text() / write_text() 的结果逐字节一致：
+- 多字节字符跨块时由增量解码器拼接
+- 换行符按通用换行模式处理（\\r\\n、\\r → \\n），与 read_text() 相同
+- 切块点只落在安全位置，不会拆开 \\r\\n，也不会影响 lower() 中
+  希腊字母 Σ 依赖上下文的词尾形式
+
+长时间（块大小的 _MAX_PENDING_FACTOR 倍）找不到安全切分点时，为保证内存
+有界会切在一个锚点字符（不是 case-ignorable 的字符，见 _is_anchor()）
+旁边，并把转换 Σ 所需的最少上下文（锚点字符本身，以及锚点为 Σ 时它前面
+到上一个锚点为止的文本）带过切分点，结果仍然一致。
+
+已知限制：如果这么长的文本中连可用的锚点字符都没有（几乎全是组合符号
+这类 case-ignorable 字符），只能直接切分，切分点附近 Σ 的词尾形式可能与
+一次性转换不同。
+"""
+
+import codecs
+import os
+import threading
+import unicodedata
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, FrozenSet, Iterator, Optional, Tuple
+
+# 默认块大小（字节）
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# 找不到安全切分点时，待处理文本最多累积到块大小的多少倍
+_MAX_PENDING_FACTOR = 4
+
+# 没有空白字符时，最多向前扫描多少个字符寻找普通字符切分点
+_PLAIN_SCAN_LIMIT = 1024
+
+# 这些类别的字符既不是 case-ignorable，也不会参与 Σ 的上下文判断
+_PLAIN_CATEGORIES = frozenset({"Lu", "Ll", "Lt", "Lo", "Nd", "Nl", "No"})
+
+# lower() 中依赖上下文的字母
+_SIGMAS = frozenset("Σσς")
+
+# 上面类别中的 ASCII 字符（字母和数字）
+_ASCII_PLAIN = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789")
+
+# 不是 case-ignorable 的 ASCII 字符（除 ' . : ^ ` 以外的全部），可以作为锚点
+_ASCII_ANCHORS = frozenset(range(128)) - frozenset(b"'.:^`")
+
+# 平台换行符（与 write_text() 一致）
+_LINESEP = os.linesep.encode("ascii")
+
+# 进度回调：参数为本次新处理的输入字节数
+ProgressCallback = Callable[[int], None]
+
+# 纯 ASCII 块上与 str 转换等价的 bytes -> bytes 转换
+AsciiTransform = Callable[[bytes], bytes]
+
+# 可以逐块执行的转换
+CHUNK_TRANSFORMS: Dict[str, Callable[[str], str]] = {
+    "uppercase": str.upper,
+    "lowercase": str.lower,
+}
+
+
+@lru_cache(maxsize=None)
+def _case_forms(ch: str) -> FrozenSet[str]:
+    """字符本身以及它经过任意次大小写转换后的所有结果"""
+    seen = {ch}
+    frontier = [ch]
+    while frontier:
+        text = frontier.pop()
+        for mapped in (text.upper(), text.lower()):
+            if mapped not in seen:
+                seen.add(mapped)
+                frontier.append(mapped)
+    return frozenset(seen)
+
+
+def _is_bounded(text: str) -> bool:
+    """首尾字符都不是 case-ignorable（lower() 判断 Σ 的上下文时不会越过它们）"""
+    return all(
+        (ord(ch) in _ASCII_ANCHORS) if ch.isascii() else unicodedata.category(ch) in _PLAIN_CATEGORIES
+        for ch in (text[0], text[-1])
+    )
+
+
+@lru_cache(maxsize=None)
+def _is_plain(ch: str) -> bool:
+    """
+    字符两侧可以安全切分
+
+    字符本身以及它经过任意次大小写转换后的结果都不含 Σ（σ、ς），首尾
+    也不是 case-ignorable 字符。多步管道中前一步的输出（例如 σ → Σ、
+    ǰ → J̌）因此不会影响下一步 lower() 在切分点两侧的上下文判断。
+    """
+    return all(
+        not _SIGMAS.intersection(text)
+        and unicodedata.category(text[0]) in _PLAIN_CATEGORIES
+        and unicodedata.category(text[-1]) in _PLAIN_CATEGORIES
+        for text in _case_forms(ch)
+    )
+
+
+@lru_cache(maxsize=None)
+def _is_anchor(ch: str) -> bool:
+    """
+    字符可以作为强制切分时携带的上下文
+
+    与 _is_plain() 相比允许 Σ 和不是 case-ignorable 的 ASCII 标点：lower()
+    在 Σ 两侧寻找 cased 字母时，到锚点字符为止就有了结论，而锚点的各种
+    大小写形式是否 cased 都相同（Σ、σ、ς 都是）。
+    """
+    return all(_is_bounded(text) for text in _case_forms(ch))
+
+
+def _transform_in_context(
+    transform: Optional[Callable[[str], str]], text: str, before: str = "", after: str = ""
+) -> str:
+    """
+    转换 text，before / after 只作为 Σ 词尾形式的上下文，不出现在结果中
+
+    大小写转换中只有 Σ 依赖上下文，而它总是转换为一个字符，所以上下文
+    转换结果的长度与单独转换时相同，可以按长度去掉。
+    """
+    if transform is None or not (before or after):
+        return transform(text) if transform else text
+    before, after = _normalize_newlines(before), _normalize_newlines(after)
+    result = transform(before + text + after)
+    return result[len(transform(before)):len(result) - len(transform(after))]
+
+
+def _safe_split(text: str, scan_limit: int = _PLAIN_SCAN_LIMIT) -> int:
+    """
+    返回安全切分位置 cut，使 text[:cut] 可以独立转换
+
+    优先切在最后一个空白字符（不含 \\r）之后；没有空白时退而在末尾
+    scan_limit 个字符内寻找两个相邻的普通字符。找不到安全位置时返回 0。
+    """
+    cut = max(text.rfind("\n"), text.rfind(" "), text.rfind("\t"))
+    if cut >= 0:
+        return cut + 1
+
+    for i in range(len(text) - 1, max(0, len(text) - scan_limit), -1):
+        if _is_plain(text[i - 1]) and _is_plain(text[i]):
+            return i
+    return 0
+
+
+def _safe_split_from_start(text: str, scan_limit: int = _PLAIN_SCAN_LIMIT) -> int:
+    """
+    与 _safe_split() 相同，但返回最靠前的安全切分位置（用于反向读取）
+
+    text[cut:] 可以独立转换，text[:cut] 需要与更靠前的内容拼接后再处理。
+    找不到安全位置时返回 len(text)。
+    """
+    found = [i for i in (text.find("\n"), text.find(" "), text.find("\t")) if i >= 0]
+    if found:
+        return min(found) + 1
+
+    for i in range(1, min(len(text), scan_limit)):
+        if _is_plain(text[i - 1]) and _is_plain(text[i]):
+            return i
+    return len(text)
+
+
+def _ascii_split(data: bytes, scan_limit: int = _PLAIN_SCAN_LIMIT) -> int:
+    """_safe_split() 的 ASCII 字节版本"""
+    cut = max(data.rfind(b"\n"), data.rfind(b" "), data.rfind(b"\t"))
+    if cut >= 0:
+        return cut + 1
+
+    for i in range(len(data) - 1, max(0, len(data) - scan_limit), -1):
+        if data[i - 1] in _ASCII_PLAIN and data[i] in _ASCII_PLAIN:
+            return i
+    return 0
+
+
+def _ascii_split_from_start(data: bytes, scan_limit: int = _PLAIN_SCAN_LIMIT) -> int:
+    """_safe_split_from_start() 的 ASCII 字节版本"""
+    found = [i for i in (data.find(b"\n"), data.find(b" "), data.find(b"\t")) if i >= 0]
+    if found:
+        return min(found) + 1
+
+    for i in range(1, min(len(data), scan_limit)):
+        if data[i - 1] in _ASCII_PLAIN and data[i] in _ASCII_PLAIN:
+            return i
+    return len(data)
+
+
+def _anchor_split(text: str) -> Tuple[int, str]:
+    """
+    没有安全切分点时的强制切分，返回 (cut, lookbehind)
+
+    切在最后一个锚点字符之前：text[:cut] 以 text[cut] 作为后文转换，
+    text[cut:] 以 lookbehind（锚点为 Σ 之类时它前面到上一个锚点为止的
+    文本）作为前文转换。找不到可用的锚点时 cut 为 0。
+    """
+    anchors = (i for i in range(len(text) - 1, -1, -1) if _is_anchor(text[i]))
+    cut = next(anchors, 0)
+    if cut == 0 or _is_plain(text[cut]):
+        return cut, ""
+    start = next(anchors, None)
+    if start is None:
+        return 0, ""
+    return cut, text[start:cut]
+
+
+def _anchor_split_from_start(text: str) -> Tuple[int, str]:
+    """
+    _anchor_split() 的反向版本，返回 (cut, lookahead)
+
+    切在第一个锚点字符之后：text[cut:] 反转后以 text[cut - 1] 作为后文
+    转换，text[:cut] 以 lookahead 作为（反转前的）后文。\r\n 中的 \r
+    不作为锚点，以免把换行拆成两半。找不到可用的锚点时 cut 为 len(text)。
+    """
+    anchors = (
+        i for i in range(len(text))
+        if _is_anchor(text[i]) and not (text[i] == "\r" and text[i + 1:i + 2] == "\n")
+    )
+    anchor = next(anchors, len(text) - 1)
+    if anchor >= len(text) - 1:
+        return len(text), ""
+    if _is_plain(text[anchor]):
+        return anchor + 1, ""
+    end = next(anchors, None)
+    if end is None:
+        return len(text), ""
+    return anchor + 1, text[anchor + 1:end + 1]
+
+
+def _ascii_anchor_split(data: bytes) -> int:
+    """_anchor_split() 的 ASCII 字节版本（字节转换不依赖上下文，不需要前文）"""
+    for i in range(len(data) - 1, 0, -1):
+        if data[i] in _ASCII_ANCHORS:
+            return i
+    return 0
+
+
+def _ascii_anchor_split_from_start(data: bytes) -> int:
+    """_anchor_split_from_start() 的 ASCII 字节版本"""
+    for i in range(len(data) - 1):
+        if data[i] in _ASCII_ANCHORS and not (data[i] == 13 and data[i + 1] == 10):
+            return i + 1
+    return len(data)
+
+
+def _write_ascii(
+    dst: BinaryIO,
+    data: bytes,
+    ascii_transform: AsciiTransform,
+    stats: Dict[str, int],
+    reverse: bool = False,
+) -> None:
+    """在字节上规范化换行、（反转、）转换并写出纯 ASCII 文本（每个字节就是一个字符）"""
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if reverse:
+        # 原地反转 bytearray 比切片 data[::-1] 快
+        data = bytearray(data)
+        data.reverse()
+    result = ascii_transform(data)
+    out = result.replace(b"\n", _LINESEP) if _LINESEP != b"\n" else result
+    dst.write(out)
+    stats["original_length"] += len(data)
+    stats["processed_length"] += len(result)
+    stats["bytes_written"] += len(out)
+
+
+def _normalize_newlines(text: str) -> str:
+    """通用换行模式：\\r\\n 和单独的 \\r 都转换为 \\n"""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _encode(text: str) -> bytes:
+    """编码为 UTF-8，并按平台换行符写出（与 write_text() 一致）"""
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+def transform_stream(
+    src: BinaryIO,
+    dst: BinaryIO,
+    transform: Optional[Callable[[str], str]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    ascii_transform: Optional[AsciiTransform] = None,
+) -> Dict[str, int]:
+    """
+    从 src 逐块读取、转换并写入 dst
+
+    Args:
+        src: 以二进制模式打开的输入流
+        dst: 以二进制模式打开的输出流
+        transform: 逐块执行的 str -> str 转换，None 表示原样写出（只规范化换行）
+        chunk_size: 每次读取的字节数
+        progress: 可选的进度回调，每写出一块调用一次
+        ascii_transform: 可选的等价字节转换；提供时纯 ASCII 的开头部分
+            走字节级快速路径
+
+    Returns:
+        统计信息：bytes_read, bytes_written, original_length, processed_length
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须大于 0")
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    stats = {"bytes_read": 0, "bytes_written": 0, "original_length": 0, "processed_length": 0}
+    ascii_mode = ascii_transform is not None
+    # 快速路径上尚未处理的 ASCII 尾部（切分规则与 Unicode 路径相同）
+    carry = b""
+    # 强制切分后 pending 开头的 Σ 需要的前文
+    lookbehind = ""
+
+    while True:
+        block = src.read(chunk_size)
+        final = not block
+        stats["bytes_read"] += len(block)
+
+        if ascii_mode and block.isascii():
+            data = carry + block
+            cut = len(data)
+            if not final:
+                cut = _ascii_split(data)
+                if cut == 0 and len(data) > chunk_size * _MAX_PENDING_FACTOR:
+                    cut = _ascii_split(data, len(data)) or _ascii_anchor_split(data)
+                    if cut == 0:
+                        cut = len(data) - 1 if data.endswith(b"\r") else len(data)
+            data, carry = data[:cut], data[cut:]
+            if data:
+                _write_ascii(dst, data, ascii_transform, stats)
+            if progress and block:
+                progress(len(block))
+            if final:
+                return stats
+            continue
+
+        if ascii_mode:
+            # 出现了非 ASCII 字节：未处理的 ASCII 尾部交给 Unicode 路径，之后不再切换回来
+            ascii_mode = False
+            pending = carry.decode("ascii")
+        text = pending + decoder.decode(block, final=final)
+
+        before, after = lookbehind, ""
+        if final:
+            pending = ""
+        else:
+            cut = _safe_split(text)
+            if cut == 0 and len(text) > chunk_size * _MAX_PENDING_FACTOR:
+                # 长时间没有安全切分点：完整扫描一遍，仍然没有时切在锚点字符前并带上上下文，
+                # 连锚点都没有时直接切分，以保证内存有界
+                cut = _safe_split(text, len(text))
+                if cut == 0:
+                    cut, lookbehind = _anchor_split(text)
+                    after = text[cut:cut + 1] if cut else ""
+                if cut == 0:
+                    cut = len(text) - 1 if text.endswith("\r") else len(text)
+            text, pending = text[:cut], text[cut:]
+
+        if text:
+            if not after:
+                lookbehind = ""
+            text = _normalize_newlines(text)
+            result = _transform_in_context(transform, text, before, after)
+            data = _encode(result)
+            dst.write(data)
+            stats["original_length"] += len(text)
+            stats["processed_length"] += len(result)
+            stats["bytes_written"] += len(data)
+
+        if progress and block:
+            progress(len(block))
+
+        if final:
+            return stats
+
+
+def reverse_stream(
+    src: BinaryIO,
+    dst: BinaryIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    transform: Optional[Callable[[str], str]] = None,
+    ascii_transform: Optional[AsciiTransform] = None,
+) -> Dict[str, int]:
+    """
+    按码点反转 src 的全部文本并写入 dst，结果等价于 content[::-1]
+
+    从文件末尾向前按块读取（src 必须可 seek），每块开头若落在多字节
+    字符中间，则把这几个续字节留给前一块拼接；反转后的文本顺序写出，
+    输出只需一次顺序写入。
+
+    Args:
+        src: 以二进制模式打开、可 seek 的输入流
+        dst: 以二进制模式打开的输出流
+        chunk_size: 每次读取的字节数
+        progress: 可选的进度回调，每读取一块调用一次
+        transform: 可选的 str -> str 转换，作用于反转后的每一块，
+            结果等价于 transform(content[::-1])
+        ascii_transform: 可选的等价字节转换；提供时纯 ASCII 的末尾部分
+            走字节级快速路径（用切片反转字节）
+
+    Returns:
+        统计信息，见 transform_stream()
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须大于 0")
+
+    pos = src.seek(0, os.SEEK_END)
+    head = b""
+    pending = ""
+    stats = {"bytes_read": 0, "bytes_written": 0, "original_length": 0, "processed_length": 0}
+    ascii_mode = ascii_transform is not None
+    # 快速路径上尚未处理的 ASCII 开头部分（需要与更靠前的内容拼接）
+    carry = b""
+    # 强制切分后 pending 末尾的 Σ 需要的后文
+    lookahead = ""
+
+    while pos > 0:
+        start = max(0, pos - chunk_size)
+        src.seek(start)
+        block = src.read(pos - start)
+        stats["bytes_read"] += len(block)
+        read_size = len(block)
+        pos = start
+
+        if ascii_mode and block.isascii():
+            data = block + carry
+            cut = 0
+            if pos > 0:
+                cut = _ascii_split_from_start(data)
+                if cut == len(data) and len(data) > chunk_size * _MAX_PENDING_FACTOR:
+                    cut = _ascii_split_from_start(data, len(data))
+                    if cut == len(data):
+                        cut = _ascii_anchor_split_from_start(data)
+                    if cut == len(data):
+                        cut = 1 if data.startswith(b"\n") else 0
+            carry, data = data[:cut], data[cut:]
+            if data:
+                _write_ascii(dst, data, ascii_transform, stats, reverse=True)
+            if progress:
+                progress(read_size)
+            continue
+
+        if ascii_mode:
+            # 出现了非 ASCII 字节：未处理的 ASCII 开头交给 Unicode 路径，之后不再切换回来
+            ascii_mode = False
+            pending = carry.decode("ascii")
+        block += head
+
+        # 对齐到码点边界：开头的续字节（10xxxxxx）属于更靠前的字符
+        skip = 0
+        if pos > 0:
+            while skip < min(len(block), 3) and (block[skip] & 0xC0) == 0x80:
+                skip += 1
+        head = block[:skip]
+        text = block[skip:].decode("utf-8") + pending
+
+        # 反转后的文本中，上一块（文件中更靠后）在前，pending（更靠前）在后
+        before, after = lookahead[::-1], ""
+        if pos > 0:
+            cut = _safe_split_from_start(text)
+            if cut == len(text) and len(text) > chunk_size * _MAX_PENDING_FACTOR:
+                # 长时间没有安全切分点：完整扫描一遍，仍然没有时切在锚点字符后并带上上下文，
+                # 连锚点都没有时直接切分，以保证内存有界
+                cut = _safe_split_from_start(text, len(text))
+                if cut == len(text):
+                    cut, lookahead = _anchor_split_from_start(text)
+                    after = text[cut - 1:cut] if cut < len(text) else ""
+                if cut == len(text):
+                    cut = 1 if text.startswith("\n") else 0
+            pending, text = text[:cut], text[cut:]
+        else:
+            pending = ""
+
+        if text:
+            if not after:
+                lookahead = ""
+            text = _normalize_newlines(text)
+            result = _transform_in_context(transform, text[::-1], before, after)
+            data = _encode(result)
+            dst.write(data)
+            stats["original_length"] += len(text)
+            stats["processed_length"] += len(result)
+            stats["bytes_written"] += len(data)
+
+        if progress:
+            progress(read_size)
+
+    return stats
+
+
+@contextmanager
+def _atomic_output(output_path: Path) -> Iterator[BinaryIO]:
+    """
+    打开输出文件用于写入
+
+    先写入同目录下的临时文件，成功后再原子替换为 output_path，
+    失败时不会在输出目录留下半成品。临时文件名包含进程号和线程号，
+    多个进程同时写同一个输出时互不干扰。
+    """
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        with open(tmp_path, "wb") as dst:
+            yield dst
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def transform_file(
+    input_path: Path,
+    output_path: Path,
+    transform: Optional[Callable[[str], str]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    ascii_transform: Optional[AsciiTransform] = None,
+) -> Dict[str, int]:
+    """
+    流式转换整个文件
+
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        transform: 逐块执行的 str -> str 转换，None 表示原样写出
+        chunk_size: 每次读取的字节数
+        progress: 可选的进度回调
+        ascii_transform: 可选的等价字节转换，见 transform_stream()
+
+    Returns:
+        统计信息，见 transform_stream()
+    """
+    with open(input_path, "rb") as src, _atomic_output(output_path) as dst:
+        return transform_stream(src, dst, transform, chunk_size, progress, ascii_transform)
+
+
+def reverse_file(
+    input_path: Path,
+    output_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    transform: Optional[Callable[[str], str]] = None,
+    ascii_transform: Optional[AsciiTransform] = None,
+) -> Dict[str, int]:
+    """
+    流式反转整个文件，见 reverse_stream()
+
+    Args:
+        input_path: 输入文件路径
+        output_path: 输出文件路径
+        chunk_size: 每次读取的字节数
+        progress: 可选的进度回调
+        transform: 可选的转换，作用于反转后的每一块
+        ascii_transform: 可选的等价字节转换，见 reverse_stream()
+
+    Returns:
+        统计信息，见 transform_stream()
+    """
+    with open(input_path, "rb") as src, _atomic_output(output_path) as dst:
+        return reverse_stream(src, dst, chunk_size, progress, transform, ascii_transform)
@@ -0,0 +1,216 @@
+"""
+按 manifest 校验调用参数
+
+prefab-manifest.json 的 parameters 已经描述了每个参数的类型、是否必需、
+默认值和取值范围。compile_parameters() 在加载 manifest 时把它编译成一个
+校验函数：每个参数的声明只解析一次，生成只包含该参数实际需要的检查的
+闭包（例如没有 enum 的字符串参数只检查类型），调用时不再遍历 schema。
+
+支持的声明：
+- type：string / integer / number / boolean / array / object，或它们的列表
+  （联合类型）；bool 不算作 integer / number，小数部分为 0 的浮点数传给
+  integer 参数时转换为 int；
+- enum（标量值）、minimum / maximum（数字）、minLength / maxLength（字符串）、
+  minItems / maxItems、items.type、items.enum（数组）；
+- default：未传入的参数用默认值补齐；
+- error_code：该参数不合法时返回的错误代码（应是函数 returns.error_code
+  中声明的值），未声明时为 INVALID_PARAMETERS；数组参数可以在 items 中另外
+  声明 error_code，元素个数（minItems / maxItems）或元素不合法时使用它。
+
+参数名错误（未声明、缺少必需参数）总是返回 INVALID_PARAMETERS。
+"""
+
+import copy
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+# 校验函数：返回 (补齐默认值、转换后的参数, None)，或 (None, 错误结果)
+ArgumentValidator = Callable[[Any], Tuple[Optional[Dict[str, Any]], Optional[dict]]]
+
+# 未声明 error_code 的参数校验失败时的错误代码
+DEFAULT_ERROR_CODE = "INVALID_PARAMETERS"
+
+# manifest 类型对应的 Python 类型（按精确类型匹配，bool 不是 integer）
+_PYTHON_TYPES: Dict[str, FrozenSet[type]] = {
+    "string": frozenset({str}),
+    "integer": frozenset({int}),
+    "number": frozenset({int, float}),
+    "boolean": frozenset({bool}),
+    "array": frozenset({list, tuple}),
+    "object": frozenset({dict}),
+}
+
+Check = Callable[[Any], Any]
+
+
+class _Invalid(Exception):
+    """参数值不合法（error_code 为 None 时使用参数的 error_code）"""
+
+    def __init__(self, message: str, error_code: Optional[str] = None):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _error(error: str, error_code: str) -> dict:
+    return {"success": False, "error": error, "error_code": error_code}
+
+
+def _declared_types(spec: dict) -> List[str]:
+    types = spec.get("type", [])
+    return types if isinstance(types, list) else [types]
+
+
+def _accepted(types: List[str]) -> FrozenSet[type]:
+    return frozenset().union(*(_PYTHON_TYPES.get(t, ()) for t in types))
+
+
+def _compile_bounds(name: str, spec: dict, unit: str, low_key: str, high_key: str,
+                    measure: Callable[[Any], Any], error_code: Optional[str] = None) -> List[Check]:
+    checks: List[Check] = []
+    low, high = spec.get(low_key), spec.get(high_key)
+    if low is not None:
+        def check_low(value):
+            if measure(value) < low:
+                raise _Invalid(f"{name} {unit}不能小于 {low}", error_code)
+            return value
+        checks.append(check_low)
+    if high is not None:
+        def check_high(value):
+            if measure(value) > high:
+                raise _Invalid(f"{name} {unit}不能大于 {high}", error_code)
+            return value
+        checks.append(check_high)
+    return checks
+
+
+def _compile_items(name: str, spec: dict) -> List[Check]:
+    items = spec.get("items", {})
+    error_code = items.get("error_code")
+    checks = _compile_bounds(name, spec, "的元素个数", "minItems", "maxItems", len, error_code)
+    accepted = _accepted(_declared_types(items))
+    if accepted:
+        label = " 或 ".join(_declared_types(items))
+
+        def check_item_types(value):
+            # 逐元素的类型检查在 C 层完成
+            if not accepted.issuperset(map(type, value)):
+                raise _Invalid(f"{name} 的元素必须是 {label}", error_code)
+            return value
+        checks.append(check_item_types)
+    if isinstance(items.get("enum"), list):
+        allowed = frozenset(items["enum"])
+
+        def check_item_enum(value):
+            if not allowed.issuperset(value):
+                invalid = [item for item in value if item not in allowed]
+                raise _Invalid(f"{name} 中的 {invalid[0]!r} 不在可选值 {sorted(allowed, key=repr)} 中", error_code)
+            return value
+        checks.append(check_item_enum)
+    return checks
+
+
+def _compile_constraints(name: str, spec: dict, types: List[str]) -> Dict[type, Tuple[Check, ...]]:
+    """按值的 Python 类型分组的约束检查"""
+    by_type: Dict[type, List[Check]] = {}
+    if isinstance(spec.get("enum"), list):
+        allowed = frozenset(spec["enum"])
+
+        def check_enum(value):
+            if value not in allowed:
+                raise _Invalid(f"{name} 的值 {value!r} 不在可选值 {sorted(allowed, key=repr)} 中")
+            return value
+        for python_type in _accepted([t for t in types if t not in ("array", "object")]):
+            by_type.setdefault(python_type, []).append(check_enum)
+    if "string" in types:
+        by_type.setdefault(str, []).extend(_compile_bounds(name, spec, "的长度", "minLength", "maxLength", len))
+    for python_type in _accepted([t for t in types if t in ("integer", "number")]):
+        by_type.setdefault(python_type, []).extend(_compile_bounds(name, spec, "", "minimum", "maximum", _identity))
+    if "array" in types:
+        for python_type in _PYTHON_TYPES["array"]:
+            by_type.setdefault(python_type, []).extend(_compile_items(name, spec))
+    return {python_type: tuple(checks) for python_type, checks in by_type.items() if checks}
+
+
+def _compile_parameter(spec: dict) -> Check:
+    """
+    把一个参数的声明编译成检查函数
+
+    Returns:
+        check(value)：返回（可能转换过的）值，不合法时抛出 _Invalid
+    """
+    name = spec["name"]
+    types = _declared_types(spec)
+    accepted = _accepted(types)
+    label = " 或 ".join(types)
+    # 只声明了 integer 时，接受 3.0 这样的整数值浮点数
+    integral_floats = "integer" in types and "number" not in types
+    constraints = _compile_constraints(name, spec, types)
+
+    if not accepted:
+        # 未声明类型（或类型未知）：不做检查
+        return lambda value: value
+
+    def check(value):
+        kind = type(value)
+        if kind not in accepted:
+            if integral_floats and kind is float and value.is_integer():
+                value, kind = int(value), int
+            else:
+                raise _Invalid(f"{name} 必须是 {label}")
+        for constraint in constraints.get(kind, ()):
+            value = constraint(value)
+        return value
+
+    if not constraints and not integral_floats:
+        # 只需检查类型
+        def check_type(value):
+            if type(value) not in accepted:
+                raise _Invalid(f"{name} 必须是 {label}")
+            return value
+        return check_type
+    return check
+
+
+def compile_parameters(parameters: List[dict]) -> ArgumentValidator:
+    """
+    把函数的 parameters 声明编译成参数校验函数
+
+    Args:
+        parameters: manifest 中函数的 parameters 列表
+
+    Returns:
+        validate(arguments) -> (补齐默认值、转换后的参数, None) 或 (None, 错误结果)
+    """
+    names = frozenset(param["name"] for param in parameters)
+    required = frozenset(param["name"] for param in parameters if param.get("required"))
+    checks = {
+        param["name"]: (_compile_parameter(param), param.get("error_code", DEFAULT_ERROR_CODE))
+        for param in parameters
+    }
+    defaults = {param["name"]: param["default"] for param in parameters if "default" in param}
+    # 列表、对象默认值每次调用复制一份，函数修改它不会影响下一次调用
+    mutable_defaults = any(isinstance(value, (list, dict)) for value in defaults.values())
+
+    def validate(arguments: Any) -> Tuple[Optional[Dict[str, Any]], Optional[dict]]:
+        if not isinstance(arguments, dict):
+            return None, _error("参数必须是对象", DEFAULT_ERROR_CODE)
+        if not names.issuperset(arguments):
+            unknown = sorted(arguments.keys() - names)
+            return None, _error(f"未声明的参数: {', '.join(unknown)}", DEFAULT_ERROR_CODE)
+        if not required.issubset(arguments):
+            missing = sorted(required - arguments.keys())
+            return None, _error(f"缺少必需参数: {', '.join(missing)}", DEFAULT_ERROR_CODE)
+
+        values = copy.deepcopy(defaults) if mutable_defaults else dict(defaults)
+        for key, value in arguments.items():
+            check, error_code = checks[key]
+            try:
+                values[key] = check(value)
+            except _Invalid as e:
+                return None, _error(str(e), e.error_code or error_code)
+        return values, None
+
+    return validate
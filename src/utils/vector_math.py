@@ -0,0 +1,150 @@
+"""
+数组加法
+
+add_numbers 的数组模式：两个等长的数字数组逐元素相加，或一个数组加一个
+标量（广播）。整个数组在一次向量化运算中完成：安装了 NumPy 时用
+numpy.add，否则把输入装进标准库 array（'q' 为 64 位整数、'd' 为双精度
+浮点）后用 map(operator.add) 在 C 循环中相加。
+
+两种实现的结果一致：输入全是整数时结果是整数，否则全部是浮点数。bool
+不是数字（与 manifest 中 number 类型的校验一致），作为元素或标量都会被
+拒绝。超出 64 位整数范围的整数不能用定长类型表示，退回到逐个
+元素的 Python 加法，结果仍然精确。
+"""
+
+import operator
+from array import array
+from itertools import repeat
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
+
+Number = Union[int, float]
+
+# 可用的实现：优先使用 NumPy
+BACKENDS = ("numpy", "array") if np is not None else ("array",)
+
+# 一次最多相加的元素个数
+MAX_LENGTH = 1_000_000
+
+# 数字的类型（按精确类型匹配，bool 不是数字）
+_NUMBER_TYPES = frozenset({int, float})
+
+# 绝对值小于该值的两个整数相加不会超出 int64
+_INT64_SAFE = 2 ** 62
+
+
+class _NeedExact(Exception):
+    """定长类型放不下，需要逐个元素用 Python 整数相加"""
+
+
+def is_array(value: Any) -> bool:
+    """是否为数组参数（JSON 数组反序列化为 list）"""
+    return isinstance(value, (list, tuple))
+
+
+def _is_number(value: Any) -> bool:
+    return type(value) in _NUMBER_TYPES
+
+
+def _add_numpy(a: Union[Sequence[Number], Number], b: Union[Sequence[Number], Number]) -> List[Number]:
+    operands = []
+    for value in (a, b):
+        arr = np.asarray(value)
+        if arr.ndim > 1 or arr.dtype.kind not in "iuf":
+            # 超出 int64 的整数会变成 object 数组，交给逐元素相加判断
+            if arr.dtype.kind == "O":
+                raise _NeedExact
+            raise ValueError("数组元素必须是数字")
+        if arr.dtype.kind in "iu" and arr.size and int(np.abs(arr).max()) >= _INT64_SAFE:
+            raise _NeedExact
+        operands.append(arr)
+    return np.add(*operands).tolist()
+
+
+def _to_array(value: Union[Sequence[Number], Number], typecode: str) -> Union[array, Number]:
+    if not is_array(value):
+        return value
+    return array(typecode, value)
+
+
+def _add_stdlib(a: Union[Sequence[Number], Number], b: Union[Sequence[Number], Number]) -> List[Number]:
+    try:
+        x, y, typecode = _to_array(a, "q"), _to_array(b, "q"), "q"
+        if type(x) is float or type(y) is float:
+            raise TypeError
+    except TypeError:
+        # 有浮点数（或非数字）：全部按浮点数计算
+        try:
+            x, y, typecode = _to_array(a, "d"), _to_array(b, "d"), "d"
+        except TypeError:
+            raise ValueError("数组元素必须是数字")
+        x = float(x) if not is_array(a) else x
+        y = float(y) if not is_array(b) else y
+    except OverflowError:
+        raise _NeedExact
+
+    left = x if is_array(a) else repeat(x)
+    right = y if is_array(b) else repeat(y)
+    try:
+        return array(typecode, map(operator.add, left, right)).tolist()
+    except OverflowError:
+        raise _NeedExact
+
+
+def _add_exact(a: Union[Sequence[Number], Number], b: Union[Sequence[Number], Number]) -> List[Number]:
+    items = [item for value in (a, b) for item in (value if is_array(value) else [value])]
+    if not all(_is_number(item) for item in items):
+        raise ValueError("数组元素必须是数字")
+    floats = any(isinstance(item, float) for item in items)
+    left = a if is_array(a) else repeat(a)
+    right = b if is_array(b) else repeat(b)
+    result = list(map(operator.add, left, right))
+    return [float(item) for item in result] if floats else [int(item) for item in result]
+
+
+def add_arrays(
+    a: Union[Sequence[Number], Number],
+    b: Union[Sequence[Number], Number],
+    backend: Optional[str] = None,
+) -> Tuple[List[Number], str]:
+    """
+    逐元素相加，至少一个参数是数组
+
+    Args:
+        a: 数字数组或标量
+        b: 数字数组或标量（两个都是数组时长度必须相同）
+        backend: "numpy" 或 "array"，默认使用可用的第一个
+
+    Returns:
+        (结果数组, 实际使用的实现："numpy" / "array" / "python")
+
+    Raises:
+        ValueError: 长度不一致、超过 MAX_LENGTH，或元素 / 标量不是数字（包括 bool）
+    """
+    backend = backend or BACKENDS[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"不可用的实现: {backend}")
+    if not (is_array(a) or is_array(b)):
+        raise ValueError("a 和 b 至少有一个是数组")
+    for value in (a, b):
+        if is_array(value):
+            if len(value) > MAX_LENGTH:
+                raise ValueError(f"数组长度不能超过 {MAX_LENGTH}")
+            # 逐元素的类型检查在 C 层完成
+            if not _NUMBER_TYPES.issuperset(map(type, value)):
+                raise ValueError("数组元素必须是数字")
+        elif not _is_number(value):
+            raise ValueError("标量参数必须是数字")
+    if is_array(a) and is_array(b) and len(a) != len(b):
+        raise ValueError(f"数组长度不一致: {len(a)} 和 {len(b)}")
+
+    try:
+        if backend == "numpy":
+            return _add_numpy(a, b), backend
+        return _add_stdlib(a, b), backend
+    except _NeedExact:
+        return _add_exact(a, b), "python"
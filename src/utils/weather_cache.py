@@ -0,0 +1,205 @@
+"""
+天气查询结果缓存
+
+同样几个城市会被反复查询，而天气不会每秒都变。WeatherCache 按城市（和
+API Key）缓存天气服务返回的结果：
+
+- 结果获取后 ttl 秒内是新鲜的，直接返回；
+- 过期后的 grace 秒内先返回旧结果，同时在后台线程中刷新（stale-while-
+  revalidate），刷新失败时继续使用旧结果直到 grace 用完；
+- 超过 ttl + grace 或没有缓存时同步获取；同一个键正在获取（包括后台刷新）
+  时，其他调用等待并共享这一次的结果（singleflight）；
+- 只缓存获取成功的结果，失败的调用每次都重新请求；按条目数做 LRU 淘汰。
+
+返回结果的同时返回它的缓存时间（秒），fetch_weather 以 cache_age_seconds
+报告给调用方。缓存键包含 API Key，换了（或错误的）Key 不会读到别的 Key
+获取的结果。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# 默认的新鲜时间和过期后仍可返回旧结果的时间（秒）
+DEFAULT_TTL = 300.0
+DEFAULT_GRACE = 60.0
+
+# 默认最多缓存的结果数
+DEFAULT_MAXSIZE = 1024
+
+# 后台刷新的线程数
+REFRESH_THREADS = 4
+
+
+class WeatherCacheStats:
+    """缓存统计（在 WeatherCache 的锁内更新）"""
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        当前统计
+
+        hits / stale_hits 为返回新鲜 / 过期（grace 内）结果的调用数，misses 为
+        同步获取的调用数，coalesced 为等待同一个键正在进行的获取的调用数，
+        refreshes / refresh_errors 为后台刷新次数和其中失败的次数，
+        expirations / evictions 为超过 grace / 因容量删除的条目数
+        """
+        return dict(vars(self))
+
+
+class _Flight:
+    """一次正在进行的获取（同步获取或后台刷新）"""
+
+    __slots__ = ("done", "result", "error", "fetched_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.fetched_at = 0.0
+
+
+class WeatherCache:
+    """线程安全的 TTL + stale-while-revalidate 缓存，带相同请求合并"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, grace: float = DEFAULT_GRACE, maxsize: int = DEFAULT_MAXSIZE,
+                 clock: Callable[[], float] = time.monotonic, executor: Optional[Executor] = None):
+        if ttl < 0 or grace < 0:
+            raise ValueError("ttl 和 grace 不能小于 0")
+        if maxsize < 0:
+            raise ValueError("maxsize 不能小于 0")
+        self.ttl = ttl
+        self.grace = grace
+        self.maxsize = maxsize
+        self.stats = WeatherCacheStats()
+        self._clock = clock
+        self._executor = executor
+        # 键 -> (获取时间, 结果)，按最近使用排序
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        """maxsize 或 ttl 为 0 时不缓存也不合并"""
+        return self.maxsize > 0 and self.ttl > 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """统计加上当前条目数"""
+        with self._lock:
+            return {**self.stats.snapshot(), "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self) -> None:
+        """删除所有条目（正在进行的获取不受影响）"""
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: Hashable, fetch: Callable[[], Any]) -> Tuple[Any, float]:
+        """
+        返回 key 的结果，需要时调用 fetch() 获取
+
+        Args:
+            key: 缓存键
+            fetch: 获取一次结果的无参函数，失败时抛出异常
+
+        Returns:
+            (结果, 缓存时间（秒）)，刚获取的结果缓存时间为 0
+
+        Raises:
+            同步获取时 fetch() 抛出的异常（合并的调用收到同一个异常）
+        """
+        if not self.enabled:
+            return fetch(), 0.0
+
+        refresh = None
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl + self.grace:
+                    self._entries.move_to_end(key)
+                    if age < self.ttl:
+                        self.stats.hits += 1
+                        return entry[1], age
+                    self.stats.stale_hits += 1
+                    if key not in self._inflight:
+                        refresh = self._inflight[key] = _Flight()
+                        self.stats.refreshes += 1
+                else:
+                    del self._entries[key]
+                    self.stats.expirations += 1
+                    entry = None
+            if entry is None:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    self.stats.misses += 1
+                else:
+                    self.stats.coalesced += 1
+
+        if entry is not None:
+            # grace 内：返回旧结果，需要时在后台刷新
+            if refresh is not None:
+                self._refresh_executor().submit(self._refresh, key, fetch, refresh)
+            return entry[1], age
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, max(self._clock() - flight.fetched_at, 0.0)
+
+        try:
+            flight.result = fetch()
+        except BaseException as e:
+            flight.error = e
+            self._finish(key, flight)
+            raise
+        self._finish(key, flight)
+        return flight.result, 0.0
+
+    def _refresh_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REFRESH_THREADS,
+                                                    thread_name_prefix="weather-refresh")
+            return self._executor
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Any], flight: _Flight) -> None:
+        """后台刷新：失败时保留旧结果"""
+        try:
+            flight.result = fetch()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.stats.refresh_errors += 1
+        self._finish(key, flight)
+
+    def _finish(self, key: Hashable, flight: _Flight) -> None:
+        """结束一次获取：缓存成功的结果，唤醒等待的调用"""
+        with self._lock:
+            del self._inflight[key]
+            if flight.error is None:
+                flight.fetched_at = self._clock()
+                self._entries[key] = (flight.fetched_at, flight.result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.stats.evictions += 1
+        flight.done.set()
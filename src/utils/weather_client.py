@@ -0,0 +1,250 @@
+"""
+天气服务客户端
+
+fetch_weather 通过 WeatherClient 调用天气服务的 GET {base_url}/current?city=...，
+API Key 放在 X-API-Key 请求头中（每次请求时传入，不保存在客户端里）。
+
+每次请求都新建连接要多付一次 TCP（以及 HTTPS 的 TLS）握手。WeatherClient
+在一个有上限的连接池中复用 HTTP/1.1 keep-alive 连接：
+
+- 空闲连接后进先出，最近用过的连接最先复用；空闲超过 idle_timeout 秒的
+  连接直接关闭（服务端多半已经关掉了它）；
+- 同时打开的连接最多 pool_size 个，都在使用中时请求等待空闲连接，等待
+  时间计入该请求的超时；
+- 每个请求有自己的超时（连接、发送、等待响应各自受它限制）；
+- 复用的连接在收到任何响应之前就断开时（服务端关闭了空闲连接），用新
+  连接重试一次，GET 请求重试是安全的。
+
+客户端是线程安全的，在多个线程之间共享同一个连接池。Gateway 的工作进程
+在 fork 之后第一次调用时才创建客户端，连接不会跨进程共享。
+"""
+
+import http.client
+import json
+import ssl
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+# 默认的连接池大小（同时打开的连接数上限）
+DEFAULT_POOL_SIZE = 8
+
+# 默认的单次请求超时（秒）
+DEFAULT_TIMEOUT = 5.0
+
+# 空闲连接保留的秒数
+DEFAULT_IDLE_TIMEOUT = 30.0
+
+# 复用的连接被服务端关闭时的异常（此时请求还没有被处理）
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class WeatherAPIError(Exception):
+    """天气服务调用失败"""
+
+    def __init__(self, message: str, error_code: str):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+class PoolStats:
+    """连接池统计（在 ConnectionPool 的锁内更新）"""
+
+    def __init__(self):
+        self.requests = 0
+        self.opened = 0
+        self.reused = 0
+        self.retries = 0
+        self.discarded = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        当前统计
+
+        requests 为发出的请求数，opened 为新建的连接数，reused 为复用空闲
+        连接的请求数，retries 为复用的连接已断开而重试的次数，discarded 为
+        出错、过期或服务端要求关闭而丢弃的连接数
+        """
+        return dict(vars(self))
+
+
+class ConnectionPool:
+    """到同一个主机的 keep-alive 连接池"""
+
+    def __init__(self, base_url: str, maxsize: int = DEFAULT_POOL_SIZE,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"不支持的服务地址: {base_url}")
+        if maxsize < 1:
+            raise ValueError("maxsize 不能小于 1")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.stats = PoolStats()
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        # (连接, 归还时间)，右端是最近归还的
+        self._idle: Deque[Tuple[http.client.HTTPConnection, float]] = deque()
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def snapshot(self) -> Dict[str, int]:
+        """统计加上当前打开和空闲的连接数"""
+        with self._cond:
+            return {**self.stats.snapshot(), "open": self._open, "idle": len(self._idle)}
+
+    def close(self) -> None:
+        """关闭所有空闲连接（使用中的连接归还时关闭）"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        if self._ssl_context is not None:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, deadline: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """取一个连接，返回 (连接, 是否为复用的连接)"""
+        expired = []
+        try:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                        expired.append(self._idle.popleft()[0])
+                        self._open -= 1
+                        self.stats.discarded += 1
+                    if self._idle:
+                        self.stats.reused += 1
+                        return self._idle.pop()[0], True
+                    if self._open < self.maxsize:
+                        self._open += 1
+                        self.stats.opened += 1
+                        break
+                    if now >= deadline or not self._cond.wait(deadline - now):
+                        raise WeatherAPIError("等待天气服务连接超时", "WEATHER_API_TIMEOUT")
+        finally:
+            for conn in expired:
+                conn.close()
+        return self._connect(max(deadline - time.monotonic(), 0.001)), False
+
+    def _release(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        with self._cond:
+            if reusable and conn.sock is not None:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._open -= 1
+                self.stats.discarded += 1
+                reusable = False
+            self._cond.notify()
+        if not reusable:
+            conn.close()
+
+    def request(self, path: str, headers: Dict[str, str], timeout: float) -> Tuple[int, bytes]:
+        """
+        在池中的连接上发送一个 GET 请求
+
+        Returns:
+            (状态码, 响应体)
+
+        Raises:
+            WeatherAPIError: 超时（WEATHER_API_TIMEOUT）或连接失败（WEATHER_API_UNAVAILABLE）
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.stats.requests += 1
+        while True:
+            conn, reused = self._acquire(deadline)
+            remaining = max(deadline - time.monotonic(), 0.001)
+            conn.timeout = remaining
+            if conn.sock is not None:
+                conn.sock.settimeout(remaining)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except _STALE_ERRORS:
+                self._release(conn, False)
+                if reused:
+                    # 空闲时被服务端关闭的连接，换一个连接重试
+                    with self._cond:
+                        self.stats.retries += 1
+                    continue
+                raise WeatherAPIError("天气服务断开了连接", "WEATHER_API_UNAVAILABLE")
+            except TimeoutError:
+                self._release(conn, False)
+                raise WeatherAPIError(f"天气服务在 {timeout} 秒内没有响应", "WEATHER_API_TIMEOUT")
+            except (OSError, http.client.HTTPException) as e:
+                self._release(conn, False)
+                raise WeatherAPIError(f"无法连接天气服务: {e}", "WEATHER_API_UNAVAILABLE")
+            except BaseException:
+                self._release(conn, False)
+                raise
+            self._release(conn, not response.will_close)
+            return response.status, body
+
+
+class WeatherClient:
+    """天气服务客户端"""
+
+    def __init__(self, base_url: str, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.base_path = urlsplit(base_url).path.rstrip("/")
+        self.timeout = timeout
+        self.pool = ConnectionPool(base_url, pool_size, idle_timeout)
+
+    def current(self, city: str, api_key: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        查询城市的当前天气
+
+        Args:
+            city: 城市名称
+            api_key: API Key
+            timeout: 本次请求的超时（秒），默认使用构造时的 timeout
+
+        Returns:
+            {"city", "temperature", "condition"}
+
+        Raises:
+            WeatherAPIError: 调用失败，error_code 为 INVALID_API_KEY、CITY_NOT_FOUND、
+                WEATHER_API_TIMEOUT、WEATHER_API_UNAVAILABLE 或 WEATHER_API_ERROR
+        """
+        path = f"{self.base_path}/current?city={quote(city, safe='')}"
+        headers = {"X-API-Key": api_key, "Accept": "application/json"}
+        status, body = self.pool.request(path, headers, self.timeout if timeout is None else timeout)
+
+        if status in (401, 403):
+            raise WeatherAPIError("天气服务拒绝了 WEATHER_API_KEY", "INVALID_API_KEY")
+        if status == 404:
+            raise WeatherAPIError(f"天气服务找不到城市: {city}", "CITY_NOT_FOUND")
+        if status >= 500:
+            raise WeatherAPIError(f"天气服务暂时不可用（HTTP {status}）", "WEATHER_API_UNAVAILABLE")
+        if status != 200:
+            raise WeatherAPIError(f"天气服务返回 HTTP {status}", "WEATHER_API_ERROR")
+
+        try:
+            data = json.loads(body)
+            result = {
+                "city": data.get("city", city),
+                "temperature": data["temperature"],
+                "condition": data["condition"],
+            }
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise WeatherAPIError("天气服务返回了无法解析的数据", "WEATHER_API_ERROR")
+        if (not isinstance(result["city"], str) or not isinstance(result["condition"], str)
+                or type(result["temperature"]) not in (int, float)):
+            raise WeatherAPIError("天气服务返回了无法解析的数据", "WEATHER_API_ERROR")
+        return result
+
+    def close(self) -> None:
+        """关闭空闲连接"""
+        self.pool.close()
@@ -0,0 +1,51 @@
+"""
+每次调用的工作空间
+
+文件处理函数的输入、输出目录（data/inputs/{key}/、data/outputs/）都是
+相对路径。默认相对于当前工作目录解析，与 Gateway 为每次调用准备的
+目录布局一致；同一进程中需要并发执行多个调用时，每个调用在自己的
+use_workspace() 中运行，目录相对于各自的根目录解析，互相看不到对方的
+文件，也不需要 os.chdir()。
+
+工作空间保存在 contextvars 中：asyncio 任务创建时自动继承当前上下文，
+线程不会继承，需要用 contextvars.copy_context().run() 启动。
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, NamedTuple, Union
+
+
+class Workspace(NamedTuple):
+    """工作空间：相对路径都相对于 root 解析"""
+
+    root: Path
+
+    def resolve(self, path: Union[str, Path]) -> Path:
+        """把相对路径解析到工作空间下（绝对路径原样返回）"""
+        return self.root / path
+
+
+_current: ContextVar[Workspace] = ContextVar("prefab_workspace", default=Workspace(Path()))
+
+
+def current_workspace() -> Workspace:
+    """当前上下文的工作空间，未设置时为当前工作目录"""
+    return _current.get()
+
+
+@contextmanager
+def use_workspace(root: Union[str, Path]) -> Iterator[Workspace]:
+    """
+    在当前上下文中切换工作空间，退出时恢复
+
+    Args:
+        root: 工作空间根目录（包含 data/inputs/ 和 data/outputs/）
+    """
+    workspace = Workspace(Path(root))
+    token = _current.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current.reset(token)
@@ -0,0 +1,121 @@
+"""
+压缩输入/输出测试
+"""
+
+import bz2
+import gzip
+import lzma
+
+import pytest
+
+from src.utils.compression import CODECS, detect_compression, estimated_size, transform_compressed_file
+from src.utils.pipeline import compile_pipeline
+
+TEXT = "héllo wörld ΟΔΟΣ\r\nsecond line 你好\n" * 50
+
+COMPRESS = {
+    "gzip": gzip.compress,
+    "bz2": bz2.compress,
+    "xz": lzma.compress,
+}
+
+UPPERCASE = compile_pipeline(("uppercase",))
+
+DECOMPRESS = {
+    "gzip": gzip.decompress,
+    "bz2": bz2.decompress,
+    "xz": lzma.decompress,
+}
+
+
+def _expected(operation):
+    text = TEXT.replace("\r\n", "\n")
+    if operation == "reverse":
+        return text[::-1].encode("utf-8")
+    return getattr(text, "upper" if operation == "uppercase" else "lower")().encode("utf-8")
+
+
+class TestDetectCompression:
+    """测试魔数识别"""
+
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_detects_codec(self, tmp_path, codec):
+        path = tmp_path / "in.bin"
+        path.write_bytes(COMPRESS[codec](TEXT.encode("utf-8")))
+        assert detect_compression(path) == codec
+
+    def test_plain_text(self, tmp_path):
+        path = tmp_path / "in.gz"
+        path.write_text(TEXT, encoding="utf-8")
+        assert detect_compression(path) is None
+
+    @pytest.mark.parametrize("head", [b"BZh", b"BZh is not bzip2\n", b"BZh91AY&S"])
+    def test_plain_text_starting_with_bz2_magic(self, tmp_path, head):
+        """只有 "BZh" 前缀、没有完整 bzip2 头部的纯文本不识别为压缩文件"""
+        path = tmp_path / "in.txt"
+        path.write_bytes(head)
+        assert detect_compression(path) is None
+
+    def test_empty_bz2_stream(self, tmp_path):
+        path = tmp_path / "in.bz2"
+        path.write_bytes(bz2.compress(b""))
+        assert detect_compression(path) == "bz2"
+
+    def test_gzip_size_from_trailer(self, tmp_path):
+        path = tmp_path / "in.gz"
+        path.write_bytes(gzip.compress(TEXT.encode("utf-8")))
+        assert estimated_size(path, "gzip") == len(TEXT.encode("utf-8"))
+
+
+class TestTransformCompressedFile:
+    """测试压缩输入和压缩输出的流式处理"""
+
+    @pytest.mark.parametrize("operation", ["uppercase", "lowercase", "reverse"])
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_compressed_input(self, tmp_path, operation, codec):
+        """压缩输入解压后处理，结果与未压缩时一致"""
+        src = tmp_path / "in"
+        src.write_bytes(COMPRESS[codec](TEXT.encode("utf-8")))
+        out = tmp_path / "out.txt"
+        progress = []
+
+        stats = transform_compressed_file(src, out, compile_pipeline((operation,)), codec, None, 7, progress.append)
+
+        assert out.read_bytes() == _expected(operation)
+        assert stats["bytes_read"] == len(TEXT.encode("utf-8"))
+        assert stats["raw_bytes_read"] == src.stat().st_size == sum(progress)
+        assert stats["raw_bytes_written"] == stats["bytes_written"]
+
+    @pytest.mark.parametrize("operation", ["uppercase", "reverse"])
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_compressed_output(self, tmp_path, operation, codec):
+        """输出压缩后解压得到相同结果"""
+        src = tmp_path / "in.txt"
+        src.write_bytes(TEXT.encode("utf-8"))
+        out = tmp_path / "out.txt"
+
+        stats = transform_compressed_file(src, out, compile_pipeline((operation,)), None, codec, 64)
+
+        assert DECOMPRESS[codec](out.read_bytes()) == _expected(operation)
+        assert stats["raw_bytes_written"] == out.stat().st_size < stats["bytes_written"]
+        assert stats["raw_bytes_read"] == stats["bytes_read"]
+
+    def test_gzip_output_is_deterministic(self, tmp_path):
+        """gzip 头部不含时间戳和文件名，相同输入得到相同输出"""
+        src = tmp_path / "in.txt"
+        src.write_bytes(TEXT.encode("utf-8"))
+        transform_compressed_file(src, tmp_path / "a", UPPERCASE, None, "gzip")
+        transform_compressed_file(src, tmp_path / "b", UPPERCASE, None, "gzip")
+        assert (tmp_path / "a").read_bytes() == (tmp_path / "b").read_bytes()
+
+    def test_corrupt_input_leaves_no_output(self, tmp_path):
+        """解压失败时不留下半成品"""
+        src = tmp_path / "in.gz"
+        src.write_bytes(gzip.compress(TEXT.encode("utf-8"))[:-20])
+        out_dir = tmp_path / "out"
+        out_dir.mkdir()
+
+        with pytest.raises(EOFError):
+            transform_compressed_file(src, out_dir / "x.txt", UPPERCASE, "gzip", None)
+
+        assert list(out_dir.iterdir()) == []
@@ -0,0 +1,131 @@
+"""
+返回值抽样检查测试
+"""
+
+import asyncio
+
+import pytest
+
+from src import main as prefab_main
+from src.utils import contracts
+from src.utils.contracts import ContractChecker, compile_schema
+from src.utils.dispatch import Dispatcher, load_manifest
+from src.utils.workspace import use_workspace
+
+RETURNS = {
+    "type": "object",
+    "properties": {
+        "success": {"type": "boolean"},
+        "value": {"type": ["number", "array"], "optional": True, "items": {"type": "integer"}},
+        "info": {"type": "object", "optional": True, "properties": {"name": {"type": "string"}}},
+        "error_code": {"type": "string", "optional": True, "enum": ["BAD"]},
+    },
+}
+
+
+class TestCompileSchema:
+    """测试编译后的返回值检查"""
+
+    @pytest.mark.parametrize("value", [
+        {"success": True},
+        {"success": True, "value": 1.5},
+        {"success": True, "value": [1, 2]},
+        {"success": True, "info": {"name": "x"}},
+        {"success": False, "error_code": "BAD"},
+    ])
+    def test_valid(self, value):
+        assert compile_schema(RETURNS)(value) == []
+
+    @pytest.mark.parametrize("value, problem", [
+        ("x", "返回值 应为 object，实际是 str"),
+        ({}, "缺少字段 success"),
+        ({"success": 1}, "success 应为 boolean，实际是 int"),
+        ({"success": True, "value": True}, "value 应为 number 或 array，实际是 bool"),
+        ({"success": True, "value": [1, "2"]}, "value[] 应为 integer，实际是 str"),
+        ({"success": True, "info": {}}, "缺少字段 info.name"),
+        ({"success": True, "info": {"name": "x", "age": 1}}, "未声明的字段 info.age"),
+        ({"success": False, "error_code": "OTHER"}, "error_code 的值 'OTHER' 不在 enum 中"),
+        ({"success": True, "extra": 1}, "未声明的字段 extra"),
+    ])
+    def test_violations(self, value, problem):
+        assert compile_schema(RETURNS)(value) == [problem]
+
+
+class TestContractChecker:
+    """测试抽样和计数"""
+
+    MANIFEST = {"functions": [{"name": "f", "returns": RETURNS}]}
+
+    def test_records_violations_without_raising(self):
+        checker = ContractChecker(self.MANIFEST, 1.0)
+        checker.observe("f", {"success": True})
+        checker.observe("f", {"success": True, "extra": 1})
+        checker.observe("f", {"success": True, "extra": 1})
+
+        snapshot = checker.snapshot()
+        assert (snapshot["checked"], snapshot["violations"]) == (3, 2)
+        assert snapshot["functions"]["f"]["problems"] == {"未声明的字段 extra": 2}
+        assert snapshot["recent"] == ["f: 未声明的字段 extra"] * 2
+
+    def test_sample_rate(self, monkeypatch):
+        checker = ContractChecker(self.MANIFEST, 0.25)
+        draws = iter([0.1, 0.3, 0.2, 0.9])
+        monkeypatch.setattr(checker, "_random", lambda: next(draws))
+        for _ in range(4):
+            checker.observe("f", {"success": True})
+        assert checker.checked == 2
+
+    def test_disabled_and_unknown_functions(self):
+        assert ContractChecker(self.MANIFEST, 0).sample("f") is None
+        assert ContractChecker(self.MANIFEST, 1).sample("missing") is None
+
+    @pytest.mark.parametrize("value, rate", [("1", 1.0), ("0", 0.0), ("5", 1.0), ("abc", 0.01), (None, 0.01)])
+    def test_rate_from_environment(self, monkeypatch, value, rate):
+        if value is None:
+            monkeypatch.delenv(contracts.SAMPLE_RATE_ENV, raising=False)
+        else:
+            monkeypatch.setenv(contracts.SAMPLE_RATE_ENV, value)
+        assert ContractChecker(self.MANIFEST).sample_rate == rate
+
+
+class TestShippedContracts:
+    """测试模式：检查每一次调用，仓库中的函数都符合自己的 manifest 声明"""
+
+    def test_functions_match_manifest(self, tmp_path, monkeypatch):
+        manifest = load_manifest()
+        checker = ContractChecker(manifest, 1.0)
+        dispatcher = Dispatcher(manifest, prefab_main, contracts=checker)
+        inputs = tmp_path / "data" / "inputs" / "input"
+        inputs.mkdir(parents=True)
+        (inputs / "a.txt").write_text("Hello World\nsecond line\n", encoding="utf-8")
+
+        calls = [
+            ("greet", {}), ("greet", {"name": "Alice"}), ("echo", {"text": "hi"}),
+            ("add_numbers", {"a": 1, "b": 2.5}), ("add_numbers", {"a": [1, 2], "b": 1}),
+            ("add_numbers", {"a": [1, 2], "b": [1]}),
+            ("batch_call", {"function": "greet", "items": [{"name": "a"}, {"nam": "b"}]}),
+            ("fetch_weather", {"city": "Beijing"}),
+        ]
+        monkeypatch.delenv("WEATHER_API_KEY", raising=False)
+        with use_workspace(tmp_path):
+            for name, arguments in calls:
+                dispatcher.call(name, arguments)
+            monkeypatch.setenv("WEATHER_API_KEY", "test-key")
+            dispatcher.call("fetch_weather", {"city": "Beijing"})
+            dispatcher.call("process_text_file", {"operation": ["lowercase", "reverse"]})
+            dispatcher.call("process_text_file", {"start_line": 2, "end_line": 2})
+            list(dispatcher.stream("process_text_file_stream", {"output_compression": "gzip"}))
+            list(dispatcher.stream("count_stream", {"count": 2, "interval": 0}))
+
+        async def consume():
+            async for _ in dispatcher.astream("count_stream_async", {"count": 2, "interval": 0}):
+                pass
+        asyncio.run(consume())
+
+        # 绕过参数校验直接调用时的错误事件
+        for event in prefab_main.count_stream(0, 0):
+            checker.observe("count_stream", event)
+
+        snapshot = checker.snapshot()
+        assert snapshot["violations"] == 0, snapshot["recent"]
+        assert set(snapshot["functions"]) == {f["name"] for f in manifest["functions"]}
@@ -0,0 +1,279 @@
+"""
+Dispatcher 测试
+"""
+
+import asyncio
+import types
+
+import pytest
+
+from src import main as prefab_main
+from src.utils.contracts import ContractChecker
+from src.utils.dispatch import Dispatcher, load_manifest
+from src.utils.memo import MemoCache
+
+
+@pytest.fixture(scope="module")
+def dispatcher():
+    return Dispatcher(load_manifest(), prefab_main)
+
+
+def _fake_dispatcher():
+    """用一个简单的模块构造 Dispatcher"""
+    def boom(x):
+        raise RuntimeError("boom")
+
+    def ticks(n):
+        for i in range(n):
+            yield {"type": "progress", "data": i}
+        raise RuntimeError("broken stream")
+
+    module = types.SimpleNamespace(boom=boom, ticks=ticks)
+    manifest = {"functions": [
+        {"name": "boom", "parameters": [{"name": "x", "type": "integer", "required": True}]},
+        {"name": "ticks", "streaming": True, "parameters": [{"name": "n", "type": "integer", "required": True}]},
+    ]}
+    return Dispatcher(manifest, module)
+
+
+class TestDispatcher:
+    """测试按 manifest 调用函数"""
+
+    def test_loads_all_declared_functions(self, dispatcher):
+        names = {f["name"] for f in load_manifest()["functions"]}
+        assert set(dispatcher.functions) == names
+        spec = dispatcher.get("process_text_file")
+        assert spec.input_keys == ("input",)
+        assert spec.output_keys == ("output",)
+        assert dispatcher.get("count_stream").streaming is True
+        assert dispatcher.get("missing") is None
+
+    def test_call(self, dispatcher):
+        assert dispatcher.call("greet", {"name": "Alice"})["message"] == "Hello, Alice!"
+        assert dispatcher.call("add_numbers", {"a": 1, "b": 2})["sum"] == 3
+
+    @pytest.mark.parametrize("name, arguments, error_code", [
+        ("missing", {}, "FUNCTION_NOT_FOUND"),
+        ("greet", {"nam": "x"}, "INVALID_PARAMETERS"),
+        ("greet", ["x"], "INVALID_PARAMETERS"),
+        ("echo", {}, "INVALID_PARAMETERS"),
+        ("count_stream", {}, "STREAMING_FUNCTION"),
+    ])
+    def test_call_errors(self, dispatcher, name, arguments, error_code):
+        result = dispatcher.call(name, arguments)
+        assert result["success"] is False
+        assert result["error_code"] == error_code
+
+    def test_stream(self, dispatcher):
+        events = list(dispatcher.stream("count_stream", {"count": 2, "interval": 0}))
+        assert [e["type"] for e in events] == ["start", "progress", "progress", "done"]
+
+        events = list(dispatcher.stream("greet", {}))
+        assert events == [{"type": "error", "data": events[0]["data"], "error_code": "NOT_STREAMING_FUNCTION"}]
+
+    def test_batchable_functions_match_manifest_enum(self, dispatcher):
+        """batch_call 的 function 枚举就是能批量调用的函数"""
+        batch = next(f for f in load_manifest()["functions"] if f["name"] == "batch_call")
+        declared = next(p for p in batch["parameters"] if p["name"] == "function")["enum"]
+        batchable = [name for name, spec in dispatcher.functions.items() if spec.batchable and name != "batch_call"]
+        assert declared == batchable
+
+    def test_batch(self):
+        dispatcher = _fake_dispatcher()
+        results, error = dispatcher.batch("boom", [{"x": 1}, {"y": 1}])
+        assert error is None
+        assert [r["error_code"] for r in results] == ["UNEXPECTED_ERROR", "INVALID_PARAMETERS"]
+
+        assert dispatcher.batch("ticks", [])[1]["error_code"] == "NOT_BATCHABLE"
+        assert dispatcher.batch("missing", [])[1]["error_code"] == "FUNCTION_NOT_FOUND"
+        assert dispatcher.batch("boom", None)[1]["error_code"] == "INVALID_ITEMS"
+
+    @pytest.mark.parametrize("name, arguments, error_code", [
+        ("greet", {"name": ""}, "INVALID_NAME"),
+        ("greet", {"name": 1}, "INVALID_NAME"),
+        ("echo", {"text": ""}, "EMPTY_TEXT"),
+        ("add_numbers", {"a": 1, "b": "x"}, "CALCULATION_ERROR"),
+        ("batch_call", {"function": "fetch_weather", "items": []}, "NOT_BATCHABLE"),
+        ("process_text_file", {"operation": "title"}, "INVALID_OPERATION"),
+        ("process_text_file", {"start_line": 0}, "INVALID_RANGE"),
+    ])
+    def test_declared_error_codes(self, dispatcher, name, arguments, error_code):
+        """参数校验失败时返回 manifest 中为该参数声明的错误代码"""
+        assert dispatcher.check(name, arguments)[1]["error_code"] == error_code
+        assert dispatcher.call(name, arguments)["error_code"] == error_code
+
+    @pytest.mark.parametrize("arguments", [
+        {"a": [1, "x"], "b": 1},
+        {"a": [1, True], "b": 1},
+        {"a": [1, [2]], "b": [1, 2]},
+        {"a": [1, 2], "b": [1]},
+        {"a": [1, 2], "b": "x"},
+        {"a": [1, 2], "b": True},
+        {"a": True, "b": 1},
+        {"a": "x", "b": "y"},
+        {"a": None, "b": 1},
+        {"a": [0] * 1_000_001, "b": 1},
+    ])
+    def test_add_numbers_validation_matches_function(self, dispatcher, arguments):
+        """manifest 校验拒绝的参数，直接调用函数得到同样的错误代码"""
+        direct = prefab_main.add_numbers(**arguments)
+        dispatched = dispatcher.call("add_numbers", arguments)
+        batched = dispatcher.batch("add_numbers", [arguments])[0][0]
+
+        assert direct["success"] is False
+        assert dispatched["error_code"] == batched["error_code"] == direct["error_code"]
+
+    def test_stream_arguments_are_validated(self, dispatcher):
+        events = list(dispatcher.stream("count_stream", {"count": 0}))
+        assert [(e["type"], e["error_code"]) for e in events] == [("error", "INVALID_COUNT")]
+
+    def test_defaults_and_coercion(self):
+        seen = []
+        module = types.SimpleNamespace(f=lambda n, label: seen.append((n, label)) or {"success": True})
+        manifest = {"functions": [{"name": "f", "parameters": [
+            {"name": "n", "type": "integer", "required": True},
+            {"name": "label", "type": "string", "default": "x"},
+        ]}]}
+        Dispatcher(manifest, module).call("f", {"n": 2.0})
+        assert seen == [(2, "x")] and type(seen[0][0]) is int
+
+    def test_memoizable_functions(self, dispatcher):
+        """只有声明为 pure 的普通函数经过结果缓存"""
+        memoizable = [name for name, spec in dispatcher.functions.items() if spec.memoizable]
+        assert memoizable == ["greet", "echo", "add_numbers"]
+
+    def test_pure_results_are_memoized(self):
+        calls = []
+
+        def square(x):
+            calls.append(x)
+            return {"success": True, "value": x * x}
+
+        module = types.SimpleNamespace(square=square, leaky=square)
+        params = [{"name": "x", "type": "integer", "required": True}]
+        manifest = {"functions": [
+            {"name": "square", "pure": True, "parameters": params},
+            # 误标为 pure 的有副作用函数（使用 secrets）不缓存
+            {"name": "leaky", "pure": True, "parameters": params, "secrets": [{"name": "KEY"}]},
+        ]}
+        dispatcher = Dispatcher(manifest, module)
+
+        assert dispatcher.call("square", {"x": 3})["value"] == 9
+        results, _ = dispatcher.batch("square", [{"x": 3}, {"x": 4}, {"x": 4}])
+        assert [r["value"] for r in results] == [9, 16, 16]
+        assert calls == [3, 4]
+
+        dispatcher.call("leaky", {"x": 3})
+        dispatcher.call("leaky", {"x": 3})
+        assert calls == [3, 4, 3, 3]
+        assert dispatcher.memo.snapshot()["hits"] == 2
+
+    def test_batch_call_uses_calling_dispatcher(self):
+        """经 Dispatcher 调用的 batch_call 共用该 Dispatcher 的结果缓存和返回值检查"""
+        manifest = load_manifest()
+        memo = MemoCache()
+        dispatcher = Dispatcher(manifest, prefab_main, memo, ContractChecker(manifest, 1.0))
+        items = [{"name": "batch"}, {"name": "batch"}, {"name": 1}]
+
+        result = dispatcher.call("batch_call", {"function": "greet", "items": items})
+
+        assert result["succeeded"] == 2
+        assert (memo.stats.misses, memo.stats.hits) == (1, 1)
+        functions = dispatcher.contracts.snapshot()["functions"]
+        assert functions["greet"]["checked"] == 2 and functions["batch_call"]["checked"] == 1
+
+    def test_memo_can_be_disabled(self):
+        calls = []
+        module = types.SimpleNamespace(f=lambda: calls.append(1) or {"success": True})
+        dispatcher = Dispatcher({"functions": [{"name": "f", "pure": True}]}, module, MemoCache(0))
+        dispatcher.call("f", {})
+        dispatcher.call("f", {})
+        assert len(calls) == 2
+
+    def test_contracts_check_function_results_only(self):
+        returns = {"type": "object", "properties": {"success": {"type": "boolean"}}}
+        module = types.SimpleNamespace(f=lambda x: {"success": True, "x": x})
+        manifest = {"functions": [
+            {"name": "f", "parameters": [{"name": "x", "type": "integer"}], "returns": returns},
+        ]}
+        dispatcher = Dispatcher(manifest, module, contracts=ContractChecker(manifest, 1.0))
+
+        assert dispatcher.call("f", {"x": 1}) == {"success": True, "x": 1}
+        # 参数校验失败由 Dispatcher 生成，不属于函数的返回值
+        assert dispatcher.call("f", {"x": "1"})["error_code"] == "INVALID_PARAMETERS"
+        assert dispatcher.contracts.snapshot()["functions"]["f"]["problems"] == {"未声明的字段 x": 1}
+        assert dispatcher.contracts.checked == 1
+
+    def test_exceptions_become_errors(self):
+        dispatcher = _fake_dispatcher()
+        assert dispatcher.call("boom", {"x": 1})["error_code"] == "UNEXPECTED_ERROR"
+
+        events = list(dispatcher.stream("ticks", {"n": 2}))
+        assert [e["type"] for e in events] == ["progress", "progress", "error"]
+        assert events[-1]["error_code"] == "UNEXPECTED_ERROR"
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+class TestAsyncDispatcher:
+    """测试异步函数的调用"""
+
+    def test_async_stream_matches_sync(self, dispatcher):
+        assert dispatcher.get("count_stream_async").is_async is True
+        arguments = {"count": 3, "interval": 0}
+        events = asyncio.run(_collect(dispatcher.astream("count_stream_async", arguments)))
+        assert events == list(dispatcher.stream("count_stream", arguments))
+
+    @pytest.mark.parametrize("method, name, error_code", [
+        ("stream", "count_stream_async", "ASYNC_FUNCTION"),
+        ("astream", "count_stream", "SYNC_FUNCTION"),
+        ("astream", "greet", "NOT_STREAMING_FUNCTION"),
+    ])
+    def test_stream_kind_errors(self, dispatcher, method, name, error_code):
+        events = getattr(dispatcher, method)(name, {})
+        events = asyncio.run(_collect(events)) if method == "astream" else list(events)
+        assert [e["error_code"] for e in events] == [error_code]
+
+    def test_acall(self):
+        async def double(x):
+            await asyncio.sleep(0)
+            return {"success": True, "value": x * 2}
+
+        async def fail(x):
+            raise RuntimeError("boom")
+
+        module = types.SimpleNamespace(double=double, fail=fail)
+        params = [{"name": "x", "type": "integer", "required": True}]
+        dispatcher = Dispatcher({"functions": [
+            {"name": "double", "async": True, "parameters": params},
+            {"name": "fail", "async": True, "parameters": params},
+        ]}, module)
+
+        assert asyncio.run(dispatcher.acall("double", {"x": 2}))["value"] == 4
+        assert asyncio.run(dispatcher.acall("fail", {"x": 2}))["error_code"] == "UNEXPECTED_ERROR"
+        assert dispatcher.call("double", {"x": 2})["error_code"] == "ASYNC_FUNCTION"
+
+    def test_closing_async_stream_closes_function(self):
+        closed = []
+
+        async def ticks():
+            try:
+                while True:
+                    yield {"type": "progress"}
+                    await asyncio.sleep(0)
+            finally:
+                closed.append(True)
+
+        dispatcher = Dispatcher({"functions": [{"name": "ticks", "streaming": True, "async": True}]},
+                                types.SimpleNamespace(ticks=ticks))
+
+        async def first_event():
+            events = dispatcher.astream("ticks", {})
+            event = await events.__anext__()
+            await events.aclose()
+            return event
+
+        assert asyncio.run(first_event()) == {"type": "progress"}
+        assert closed == [True]
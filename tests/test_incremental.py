@@ -0,0 +1,219 @@
+"""
+增量处理测试
+
+验证多次追加后的增量输出与一次性完整处理逐字节一致。
+"""
+
+import os
+
+import pytest
+
+from src.utils.incremental import _WINDOW, checkpoint_path, incremental_transform_file
+from src.utils.pipeline import compile_pipeline
+from src.utils.text_stream import CHUNK_TRANSFORMS, transform_file
+
+LOWERCASE = compile_pipeline(("lowercase",))
+
+
+def _full(tmp_path, input_path, operation="lowercase"):
+    """参考实现：完整处理整个文件"""
+    out = tmp_path / "full.txt"
+    transform_file(input_path, out, CHUNK_TRANSFORMS[operation], 7)
+    return out.read_bytes()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "log.txt", tmp_path / "out.txt"
+
+
+class TestIncrementalTransform:
+    """测试增量转换"""
+
+    @pytest.mark.parametrize("appends", [
+        ["first LINE\n", "second LINE\n", "THIRD\n"],
+        ["no newline yet ", "ΑΣ", " still ΟΔΟΣ\n", "ΑΣ\r", "\nΣ done"],
+        ["", "ab", "", "CD\n"],
+    ])
+    def test_appends_match_full_run(self, tmp_path, paths, appends):
+        """每次追加后的输出都与完整处理一致"""
+        input_path, output_path = paths
+        input_path.write_bytes(b"")
+        for i, text in enumerate(appends):
+            with open(input_path, "ab") as f:
+                f.write(text.encode("utf-8"))
+            stats = incremental_transform_file(input_path, output_path, LOWERCASE, chunk_size=7)
+
+            assert output_path.read_bytes() == _full(tmp_path, input_path)
+            assert stats["original_length"] == len(input_path.read_text(encoding="utf-8"))
+
+    def test_only_new_bytes_are_read(self, paths):
+        """续接时只读取最后一个完整行之后的内容"""
+        input_path, output_path = paths
+        input_path.write_text("old line\n" * 100, encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        with open(input_path, "a", encoding="utf-8") as f:
+            f.write("NEW\n")
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        assert stats["resumed_bytes"] == 900
+        assert stats["bytes_read"] == 4
+        assert output_path.read_text(encoding="utf-8") == "old line\n" * 100 + "new\n"
+
+    @pytest.mark.parametrize("rewrite", [
+        lambda p: p.write_text("SHORT\n", encoding="utf-8"),
+        lambda p: p.write_text("X" + p.read_text(encoding="utf-8")[1:] + "MORE\n", encoding="utf-8"),
+    ], ids=["truncated", "rewritten"])
+    def test_rewrite_falls_back_to_full_run(self, tmp_path, paths, rewrite):
+        """截断或改写输入后回退到完整处理"""
+        input_path, output_path = paths
+        input_path.write_text("Line ONE\nLine TWO\n", encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        rewrite(input_path)
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        assert stats["resumed_bytes"] == 0
+        assert output_path.read_bytes() == _full(tmp_path, input_path)
+
+    def test_pipeline_change_falls_back(self, tmp_path, paths):
+        """管道不同时不复用检查点"""
+        input_path, output_path = paths
+        input_path.write_text("Line ONE\n", encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        stats = incremental_transform_file(input_path, output_path, compile_pipeline(("uppercase",)))
+
+        assert stats["resumed_bytes"] == 0
+        assert output_path.read_bytes() == _full(tmp_path, input_path, "uppercase")
+
+    def test_hardlinked_output_is_not_modified(self, paths, tmp_path):
+        """追加前断开与结果缓存共享的硬链接"""
+        input_path, output_path = paths
+        input_path.write_text("Line ONE\n", encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE)
+        # 模拟结果缓存：与输出共享 inode，且不改变输出的 mtime
+        os.link(output_path, tmp_path / "cached.out")
+
+        with open(input_path, "a", encoding="utf-8") as f:
+            f.write("Line TWO\n")
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        assert stats["resumed_bytes"] > 0
+        assert (tmp_path / "cached.out").read_text(encoding="utf-8") == "line one\n"
+        assert output_path.read_text(encoding="utf-8") == "line one\nline two\n"
+
+    def test_reverse_not_supported(self, paths):
+        input_path, output_path = paths
+        input_path.write_text("abc\n", encoding="utf-8")
+        with pytest.raises(ValueError):
+            incremental_transform_file(input_path, output_path, compile_pipeline(("reverse",)))
+        assert not checkpoint_path(output_path).exists()
+
+    def test_mid_file_rewrite_falls_back(self, tmp_path, paths):
+        """大小不变、落在首尾窗口之间的原地改写由整个前缀的 CRC32 检测到"""
+        input_path, output_path = paths
+        original = "Line ONE\n" * 30000
+        input_path.write_text(original, encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        with open(input_path, "r+b") as f:
+            f.seek(len(original) // 2)
+            f.write(b"CHANGED\n")
+        with open(input_path, "a", encoding="utf-8") as f:
+            f.write("NEW\n")
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        assert len(original) > 4 * _WINDOW
+        assert stats["resumed_bytes"] == 0
+        assert output_path.read_bytes() == _full(tmp_path, input_path)
+
+    def test_replaced_input_with_same_prefix_resumes(self, tmp_path, paths):
+        """按内容而不是 inode 识别输入：换成同样前缀的新文件也能续接"""
+        input_path, output_path = paths
+        input_path.write_text("Line ONE\n", encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        replacement = tmp_path / "new.txt"
+        replacement.write_text("Line ONE\nLine TWO\n", encoding="utf-8")
+        os.replace(replacement, input_path)
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE)
+
+        assert stats["resumed_bytes"] == 9
+        assert output_path.read_text(encoding="utf-8") == "line one\nline two\n"
+
+
+class TestStateDir:
+    """测试把检查点和输出副本保存在状态目录"""
+
+    def test_resumes_after_output_dir_is_removed(self, tmp_path):
+        """每次调用都是新的输入和输出目录（如 Gateway 的工作空间）时也能续接"""
+        state_dir = tmp_path / "state"
+        content = ""
+        for i, text in enumerate(["Line ONE\n", "Line TWO\n", "ΟΔΟΣ\n"]):
+            call_dir = tmp_path / f"call-{i}"
+            call_dir.mkdir()
+            content += text
+            input_path, output_path = call_dir / "log.txt", call_dir / "out.txt"
+            input_path.write_text(content, encoding="utf-8")
+
+            stats = incremental_transform_file(input_path, output_path, LOWERCASE, state_dir=state_dir)
+
+            assert stats["resumed_bytes"] == len(content.encode("utf-8")) - len(text.encode("utf-8"))
+            assert output_path.read_bytes() == _full(tmp_path, input_path)
+            assert not checkpoint_path(output_path).exists()
+
+    def test_modified_saved_output_falls_back(self, tmp_path, paths):
+        """保存的输出副本被改动时不续接"""
+        input_path, output_path = paths
+        state_dir = tmp_path / "state"
+        input_path.write_text("Line ONE\n", encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE, state_dir=state_dir)
+        output_path.unlink()
+        for saved in state_dir.glob("*.out"):
+            saved.write_text("garbage\n", encoding="utf-8")
+
+        with open(input_path, "a", encoding="utf-8") as f:
+            f.write("Line TWO\n")
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE, state_dir=state_dir)
+
+        assert stats["resumed_bytes"] == 0
+        assert output_path.read_text(encoding="utf-8") == "line one\nline two\n"
+
+    def test_interrupted_run_resumes_from_last_checkpoint(self, tmp_path, paths):
+        """处理中途保存检查点：被取消后下一次调用从最近的检查点继续"""
+        input_path, output_path = paths
+        state_dir = tmp_path / "state"
+        input_path.write_text("".join(f"Line {i} ΟΔΟΣ\n" for i in range(200)), encoding="utf-8")
+        saved = []
+
+        def cancel(nbytes):
+            if len(saved) >= 3:
+                raise RuntimeError("cancelled")
+
+        with pytest.raises(RuntimeError):
+            incremental_transform_file(input_path, output_path, LOWERCASE, 16, cancel, state_dir,
+                                       resume=False, checkpoint_bytes=100,
+                                       on_checkpoint=lambda i, o: saved.append((i, o)))
+        assert not output_path.exists()
+        offset = saved[-1][0]
+        assert 0 < offset < input_path.stat().st_size
+
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE, 16, state_dir=state_dir,
+                                           checkpoint_bytes=100)
+
+        assert stats["resumed_bytes"] == offset
+        assert output_path.read_bytes() == _full(tmp_path, input_path)
+
+    def test_resume_false_ignores_checkpoint(self, tmp_path, paths):
+        """resume 为 False 时完整处理"""
+        input_path, output_path = paths
+        state_dir = tmp_path / "state"
+        input_path.write_text("Line ONE\n", encoding="utf-8")
+        incremental_transform_file(input_path, output_path, LOWERCASE, state_dir=state_dir)
+
+        stats = incremental_transform_file(input_path, output_path, LOWERCASE, state_dir=state_dir, resume=False)
+
+        assert stats["resumed_bytes"] == 0
+        assert output_path.read_text(encoding="utf-8") == "line one\n"
@@ -0,0 +1,192 @@
+"""
+行索引与按范围处理测试
+
+验证行号换算与逐行切分一致，按范围处理的结果与对区间内容单独处理一致。
+"""
+
+import io
+import os
+import random
+
+import pytest
+
+from src.utils import line_index
+from src.utils.line_index import (
+    LineIndexStore,
+    TextRange,
+    build_line_index,
+    parse_range,
+    transform_range_file,
+)
+from src.utils.pipeline import compile_pipeline
+
+SAMPLES = [
+    b"",
+    b"single line",
+    b"one\ntwo\nthree\n",
+    b"\n\n\nblank lines\n\n",
+    "ΟΔΟΣ Σ\nstraße ǰ\r\nmixed ŉ\nend".encode("utf-8"),
+]
+
+
+@pytest.fixture
+def small_interval(monkeypatch):
+    """缩小检查点间隔和扫描块，让小样本也覆盖多个检查点"""
+    monkeypatch.setattr(line_index, "INDEX_INTERVAL", 5)
+    monkeypatch.setattr(line_index, "_SCAN_BLOCK", 3)
+
+
+def _line_starts(data: bytes):
+    return [0] + [i + 1 for i, c in enumerate(data) if c == ord("\n")]
+
+
+class TestLineIndex:
+    """测试稀疏行索引"""
+
+    @pytest.mark.parametrize("data", SAMPLES + [b"x" * 40 + b"\n" + b"y\n" * 30])
+    @pytest.mark.parametrize("chunk_size", [1, 4, 64])
+    def test_line_start_matches_split(self, small_interval, data, chunk_size):
+        index, _ = build_line_index(io.BytesIO(data), chunk_size)
+        lines = data.splitlines()
+        assert index.line_count == len(lines)
+
+        starts = _line_starts(data)
+        f = io.BytesIO(data)
+        for line in range(1, len(lines) + 3):
+            expected = starts[line - 1] if line <= len(lines) else len(data)
+            assert index.line_start(f, line) == expected
+
+    def test_random_line_starts(self, small_interval):
+        rng = random.Random(7)
+        for _ in range(50):
+            data = b"".join(rng.choice([b"\n", b"a", b"bc\n", b"long line " * 3]) for _ in range(rng.randint(0, 40)))
+            index, _ = build_line_index(io.BytesIO(data), rng.randint(1, 9))
+            starts = _line_starts(data)
+            f = io.BytesIO(data)
+            for line in range(1, index.line_count + 1):
+                assert index.line_start(f, line) == starts[line - 1]
+
+    @pytest.mark.parametrize("chunk_size", [1, 4, 64])
+    def test_checkpoint_spacing(self, small_interval, chunk_size):
+        """检查点间隔是 INDEX_INTERVAL，与读取的块大小无关"""
+        data = b"ab\ncd\n" * 20
+        index, _ = build_line_index(io.BytesIO(data), chunk_size)
+        assert index.offsets == list(range(0, len(data), 5))
+        assert index.lines == [data.count(b"\n", 0, offset) for offset in index.offsets]
+
+    def test_checkpoint_spacing_with_default_blocks(self):
+        """默认块大小（1 MiB）下检查点同样每 INDEX_INTERVAL 字节一个"""
+        data = b"0123456789abcde\n" * (3 * 1024 * 1024 // 16)
+        index, _ = build_line_index(io.BytesIO(data))
+        gaps = {b - a for a, b in zip(index.offsets, index.offsets[1:])}
+        assert gaps == {line_index.INDEX_INTERVAL}
+        assert len(index.offsets) == len(data) // line_index.INDEX_INTERVAL
+
+
+class TestParseRange:
+    """测试范围参数校验"""
+
+    def test_defaults_mean_no_range(self):
+        assert parse_range(1, -1, 0, -1) is None
+
+    def test_valid_ranges(self):
+        assert parse_range(3, 5, 0, -1) == TextRange("line", 3, 5)
+        assert parse_range(1, -1, 10, -1) == TextRange("byte", 10, -1)
+
+    @pytest.mark.parametrize("args", [
+        (0, -1, 0, -1),
+        (5, 3, 0, -1),
+        (1, -1, 5, 3),
+        (2, -1, 5, -1),
+        (1.5, -1, 0, -1),
+        (True, -1, 0, -1),
+    ])
+    def test_invalid_ranges(self, args):
+        with pytest.raises(ValueError):
+            parse_range(*args)
+
+
+class TestLineIndexStore:
+    """测试索引的保存和复用"""
+
+    def test_reuse_and_invalidate(self, tmp_path):
+        input_path = tmp_path / "input.txt"
+        input_path.write_bytes(b"a\nb\nc\n")
+        store = LineIndexStore(tmp_path / "index")
+
+        first, hit = store.get(input_path)
+        assert hit is False
+        second, hit = store.get(input_path)
+        assert hit is True
+        assert second == first
+
+        # 修改文件后重建索引，并清理指向旧版本的引用
+        input_path.write_bytes(b"a\nb\nc\nd\n")
+        index, hit = store.get(input_path)
+        assert hit is False
+        assert index.line_count == 4
+        assert len(list((tmp_path / "index").glob("*.ref"))) == 1
+
+    def test_same_content_shares_index(self, tmp_path):
+        store = LineIndexStore(tmp_path / "index")
+        for name in ("a.txt", "b.txt"):
+            (tmp_path / name).write_bytes(b"same\ncontent\n")
+            store.get(tmp_path / name)
+        assert len(list((tmp_path / "index").glob("*.json"))) == 1
+
+
+class TestTransformRange:
+    """测试按范围处理"""
+
+    @pytest.mark.parametrize("data", SAMPLES)
+    @pytest.mark.parametrize("steps", [("uppercase",), ("lowercase",), ("reverse",), ("uppercase", "reverse")])
+    def test_line_ranges_match_slices(self, tmp_path, small_interval, data, steps):
+        input_path = tmp_path / "input.txt"
+        input_path.write_bytes(data)
+        output_path = tmp_path / "out.txt"
+        store = LineIndexStore(tmp_path / "index")
+        pipeline = compile_pipeline(steps)
+        starts = _line_starts(data) + [len(data)]
+        line_count = len(data.splitlines())
+
+        for start in range(1, line_count + 2):
+            for end in [-1] + list(range(start, line_count + 2)):
+                stats = transform_range_file(input_path, output_path, pipeline, TextRange("line", start, end),
+                                             store, chunk_size=3)
+                lo = starts[min(start - 1, line_count)]
+                hi = len(data) if end < 0 else starts[min(end, line_count)]
+                assert (stats["range_start"], stats["range_end"]) == (lo, hi)
+
+                expected = tmp_path / "expected.txt"
+                (tmp_path / "slice.txt").write_bytes(data[lo:hi])
+                transform_range_file(tmp_path / "slice.txt", expected, pipeline, TextRange("byte", 0, -1), store)
+                assert output_path.read_bytes() == expected.read_bytes()
+
+    def test_byte_range_aligns_to_characters(self, tmp_path):
+        input_path = tmp_path / "input.txt"
+        input_path.write_text("aσb€c", encoding="utf-8")
+        output_path = tmp_path / "out.txt"
+        store = LineIndexStore(tmp_path / "index")
+
+        # σ 占 2 字节（1~2），€ 占 3 字节（4~6）：落在字符中间的边界向后对齐
+        stats = transform_range_file(input_path, output_path, compile_pipeline(("uppercase",)),
+                                     TextRange("byte", 2, 5), store)
+
+        assert (stats["range_start"], stats["range_end"]) == (3, 7)
+        assert output_path.read_text(encoding="utf-8") == "B€"
+        assert "index_hit" not in stats
+
+    def test_repeated_line_ranges_reuse_index(self, tmp_path):
+        input_path = tmp_path / "input.txt"
+        input_path.write_text("".join(f"line {i}\n" for i in range(1, 101)), encoding="utf-8")
+        output_path = tmp_path / "out.txt"
+        store = LineIndexStore(tmp_path / "index")
+        pipeline = compile_pipeline(("uppercase",))
+
+        first = transform_range_file(input_path, output_path, pipeline, TextRange("line", 10, 11), store)
+        second = transform_range_file(input_path, output_path, pipeline, TextRange("line", 50, 50), store)
+
+        assert first["index_hit"] is False
+        assert second["index_hit"] is True
+        assert second["bytes_read"] == len("line 50\n")
+        assert output_path.read_text(encoding="utf-8") == "LINE 50" + os.linesep
@@ -0,0 +1,278 @@
+"""
+本地 Gateway 测试
+
+在后台线程中启动单个工作进程的 Gateway，通过 HTTP 调用函数。
+"""
+
+import asyncio
+import base64
+import http.client
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scripts.local_gateway import Gateway, encode_sse
+from src import main as prefab_main
+from src.utils.dispatch import Dispatcher, load_manifest
+from src.utils.sse import format_event_id, parse_event_id
+
+
+@pytest.fixture
+def gateway(tmp_path):
+    """启动 Gateway，返回端口"""
+    sock = socket.create_server(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = Gateway(Dispatcher(load_manifest(), prefab_main), threads=4, workspace_root=tmp_path)
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(sock),), daemon=True)
+    thread.start()
+    for _ in range(100):
+        if server._stopped is not None:
+            break
+        time.sleep(0.01)
+    yield port
+    server.stop()
+    thread.join(timeout=5)
+
+
+def _request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request(method, path, body=json.dumps(body) if isinstance(body, dict) else body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.getheader("Content-Type"), response.read()
+    finally:
+        conn.close()
+
+
+def _call(port, name, parameters=None, files=None):
+    body = {"parameters": parameters or {}}
+    if files:
+        body["files"] = {"input": [{"name": n, "content": base64.b64encode(c).decode()} for n, c in files.items()]}
+    status, _, data = _request(port, "POST", f"/functions/{name}", body)
+    return status, json.loads(data)
+
+
+def _parse_sse_with_ids(data: bytes):
+    """[(事件 ID, 事件)]"""
+    events = []
+    for message in data.decode("utf-8").split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in message.splitlines() if line)
+        if lines:
+            event = json.loads(lines["data"])
+            assert lines["event"] == event["type"]
+            events.append((lines.get("id"), event))
+    return events
+
+
+def _parse_sse(data: bytes):
+    return [event for _, event in _parse_sse_with_ids(data)]
+
+
+def _read_first_events(port, name, parameters, count):
+    """发起流式调用，读到 count 个事件后断开连接，返回 [(事件 ID, 事件)]"""
+    body = json.dumps({"parameters": parameters}).encode()
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(f"POST /functions/{name} HTTP/1.1\r\nHost: test\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        data = b""
+        while data.count(b"\n\n") < count + 1:
+            data += sock.recv(65536)
+    head, _, rest = data.partition(b"\r\n\r\n")
+    messages = rest.split(b"\n\n")[:count]
+    return _parse_sse_with_ids(b"\n\n".join(messages) + b"\n\n")
+
+
+class TestLocalGateway:
+    """测试 HTTP 接口"""
+
+    def test_health_and_manifest(self, gateway):
+        status, _, data = _request(gateway, "GET", "/health")
+        assert status == 200 and json.loads(data)["status"] == "ok"
+
+        status, _, data = _request(gateway, "GET", "/manifest")
+        assert json.loads(data)["functions"] == load_manifest()["functions"]
+
+    def test_unary_call_with_keep_alive(self, gateway):
+        conn = http.client.HTTPConnection("127.0.0.1", gateway, timeout=10)
+        for name in ("Alice", "Bob"):
+            conn.request("POST", "/functions/greet", json.dumps({"parameters": {"name": name}}))
+            response = conn.getresponse()
+            assert response.status == 200
+            assert json.loads(response.read()) == {
+                "result": {"success": True, "message": f"Hello, {name}!", "name": name},
+                "output_files": [],
+            }
+        conn.close()
+
+    @pytest.mark.parametrize("method, path, body, status, error_code", [
+        ("POST", "/functions/missing", {}, 404, "FUNCTION_NOT_FOUND"),
+        ("POST", "/functions/greet", {"parameters": {"nam": "x"}}, 400, "INVALID_PARAMETERS"),
+        ("POST", "/functions/greet", b"{not json", 400, "INVALID_REQUEST"),
+        ("GET", "/functions/greet", None, 405, "METHOD_NOT_ALLOWED"),
+        ("GET", "/nothing", None, 404, "NOT_FOUND"),
+        ("POST", "/functions/process_text_file", {"files": {"video": []}}, 400, "INVALID_FILES"),
+    ])
+    def test_errors(self, gateway, method, path, body, status, error_code):
+        actual_status, _, data = _request(gateway, method, path, body)
+        assert actual_status == status
+        assert json.loads(data)["error_code"] == error_code
+
+    def test_file_function(self, gateway, tmp_path):
+        """输入文件写入工作空间，输出文件随结果返回，工作空间随后删除"""
+        status, body = _call(gateway, "process_text_file", {"operation": "uppercase"},
+                             {"a.txt": b"hello", "b.txt": b"world"})
+
+        assert status == 200
+        assert body["result"]["success"] is True
+        assert {f["name"]: base64.b64decode(f["content"]) for f in body["output_files"]} == {
+            "processed_a.txt": b"HELLO",
+            "processed_b.txt": b"WORLD",
+        }
+        assert list(tmp_path.glob("call-*")) == []
+
+    def test_concurrent_file_calls_are_isolated(self, gateway):
+        def call(i):
+            return _call(gateway, "process_text_file", {"operation": "lowercase"}, {f"f{i}.txt": f"CALL {i}".encode()})
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(call, range(16)))
+
+        for i, (status, body) in enumerate(results):
+            assert status == 200
+            assert [(f["name"], base64.b64decode(f["content"])) for f in body["output_files"]] == [
+                (f"processed_f{i}.txt", f"call {i}".encode())
+            ]
+
+    def test_incremental_resumes_across_calls(self, gateway, tmp_path, monkeypatch):
+        """每次调用的工作空间都是新的，增量模式的检查点保存在共享的缓存目录中，仍然可以续接"""
+        # 与 main() 一样把缓存目录放在所有调用共享的位置
+        monkeypatch.setenv(prefab_main.CACHE_DIR_ENV, str(tmp_path / "cache"))
+        content = b""
+        for resumed, line in ((0, b"Line ONE\n"), (9, b"Line TWO\n")):
+            content += line
+            status, body = _call(gateway, "process_text_file", {"operation": "lowercase", "incremental": True},
+                                 {"log.txt": content})
+            assert status == 200
+            assert body["result"]["resumed_bytes"] == resumed
+            assert base64.b64decode(body["output_files"][0]["content"]) == content.lower()
+
+    def test_streaming_function_as_sse(self, gateway):
+        status, content_type, data = _request(gateway, "POST", "/functions/count_stream",
+                                              {"parameters": {"count": 3, "interval": 0}})
+
+        assert status == 200
+        assert content_type.startswith("text/event-stream")
+        events = _parse_sse(data)
+        assert [e["type"] for e in events] == ["start", "progress", "progress", "progress", "done"]
+
+    def test_async_streaming_function(self, gateway):
+        _, _, sync_data = _request(gateway, "POST", "/functions/count_stream",
+                                   {"parameters": {"count": 2, "interval": 0}})
+        status, content_type, data = _request(gateway, "POST", "/functions/count_stream_async",
+                                              {"parameters": {"count": 2, "interval": 0}})
+
+        assert status == 200
+        assert content_type.startswith("text/event-stream")
+        assert _parse_sse(data) == _parse_sse(sync_data)
+
+    def test_async_streams_do_not_hold_threads(self, gateway):
+        # 固定装置的线程池只有少量线程：异步流在等待期间不占线程，可以同时打开远多于线程数的流
+        body = {"parameters": {"count": 2, "interval": 0.2}}
+        start = time.monotonic()
+        with ThreadPoolExecutor(32) as pool:
+            results = list(pool.map(lambda _: _request(gateway, "POST", "/functions/count_stream_async", body),
+                                    range(32)))
+        assert time.monotonic() - start < 2
+        assert all(_parse_sse(data)[-1]["type"] == "done" for _, _, data in results)
+
+    def test_stream_metrics(self, gateway):
+        _request(gateway, "POST", "/functions/count_stream", {"parameters": {"count": 3, "interval": 0}})
+        status, _, data = _request(gateway, "GET", "/metrics")
+
+        metrics = json.loads(data)["sse"]
+        assert status == 200
+        assert metrics["streams_total"] == 1
+        assert metrics["streams_open"] == metrics["buffer_depth"] == 0
+        assert metrics["events_in"] == metrics["events_out"] + metrics["events_coalesced"] == 5
+
+    def test_memo_metrics(self, gateway):
+        for _ in range(3):
+            _call(gateway, "greet", {"name": "memo"})
+        _call(gateway, "fetch_weather", {"city": "Beijing"})
+        metrics = json.loads(_request(gateway, "GET", "/metrics")[2])["memo"]
+
+        # fetch_weather 不是纯函数，不经过缓存
+        assert (metrics["misses"], metrics["hits"], metrics["size"]) == (1, 2, 1)
+
+    def test_batch_items_use_gateway_memo(self, gateway):
+        _call(gateway, "greet", {"name": "batched"})
+        _call(gateway, "batch_call", {"function": "greet", "items": [{"name": "batched"}] * 3})
+        metrics = json.loads(_request(gateway, "GET", "/metrics")[2])
+
+        assert (metrics["memo"]["misses"], metrics["memo"]["hits"]) == (1, 3)
+        assert metrics["contracts"]["violations"] == 0
+
+    def test_contract_metrics(self, gateway):
+        _call(gateway, "echo", {"text": "contract"})
+        metrics = json.loads(_request(gateway, "GET", "/metrics")[2])["contracts"]
+
+        assert metrics["violations"] == 0
+        assert {"sample_rate", "checked", "functions", "recent"} <= set(metrics)
+
+    def test_event_ids_increase(self, gateway):
+        _, _, data = _request(gateway, "POST", "/functions/count_stream", {"parameters": {"count": 3, "interval": 0}})
+
+        ids = [parse_event_id(event_id) for event_id, _ in _parse_sse_with_ids(data)]
+        assert len({i.stream_id for i in ids}) == 1
+        assert [i.seq for i in ids] == [1, 2, 3, 4, 5]
+        assert [i.checkpoint for i in ids] == [None, {"current": 1}, {"current": 2}, {"current": 3}, {"current": 3}]
+
+    def test_reconnect_replays_without_rerunning(self, gateway):
+        parameters = {"count": 4, "interval": 0.05}
+        first = _read_first_events(gateway, "count_stream_async", parameters, 2)
+        assert [e["type"] for _, e in first] == ["start", "progress"]
+
+        last_id = first[-1][0]
+        _, _, data = _request(gateway, "POST", "/functions/count_stream_async", {"parameters": parameters},
+                              headers={"Last-Event-ID": last_id})
+        rest = _parse_sse_with_ids(data)
+
+        ids = [parse_event_id(event_id) for event_id, _ in rest]
+        # 接回同一个流：序号紧接着断线前的最后一个，不再有 start 事件
+        assert {i.stream_id for i in ids} == {parse_event_id(last_id).stream_id}
+        assert ids[0].seq == parse_event_id(last_id).seq + 1
+        assert rest[-1][1]["type"] == "done"
+        assert "start" not in [e["type"] for _, e in rest]
+        metrics = json.loads(_request(gateway, "GET", "/metrics")[2])["sse"]
+        assert metrics["streams_resumed"] == 1
+        assert metrics["streams_total"] == 1
+
+    def test_reconnect_resumes_from_checkpoint(self, gateway):
+        # 流已不在（例如由其他工作进程处理）：从事件 ID 中的检查点续传
+        last_id = format_event_id("gone", 3, {"current": 2})
+        _, _, data = _request(gateway, "POST", "/functions/count_stream", {"parameters": {"count": 4, "interval": 0}},
+                              headers={"Last-Event-ID": last_id})
+
+        events = _parse_sse_with_ids(data)
+        assert [(e["type"], e["data"].get("current")) for _, e in events] == [
+            ("progress", 3), ("progress", 4), ("done", None)]
+        assert [parse_event_id(event_id).seq for event_id, _ in events] == [4, 5, 6]
+
+    def test_streaming_file_function(self, gateway):
+        body = {"files": {"input": [{"name": "a.txt", "content": base64.b64encode(b"abc").decode()}]},
+                "parameters": {"operation": "reverse"}}
+        _, _, data = _request(gateway, "POST", "/functions/process_text_file_stream", body)
+
+        events = _parse_sse(data)
+        assert events[-2]["type"] == "done"
+        assert events[-1]["type"] == "output_files"
+        assert base64.b64decode(events[-1]["data"][0]["content"]) == b"cba"
+
+    def test_encode_sse(self):
+        assert encode_sse({"type": "done", "data": "完成"}) == (
+            'event: done\ndata: {"type": "done", "data": "完成"}\n\n'.encode("utf-8")
+        )
@@ -4,14 +4,24 @@
 测试所有暴露给 AI 的函数，确保它们按预期工作。
 """
 
-import os
-import shutil
-import tempfile
-from pathlib import Path
+import gzip
 
 import pytest
 
-from src.main import add_numbers, echo, fetch_weather, greet, process_text_file
+from scripts.weather_server import running, weather_for
+from src.main import (
+    WEATHER_API_URL_ENV,
+    WEATHER_CACHE_TTL_ENV,
+    add_numbers,
+    batch_call,
+    echo,
+    fetch_weather,
+    greet,
+    process_text_file,
+    process_text_file_stream,
+)
+from src.utils.resume import StreamCheckpoint, use_checkpoint
+from src.utils.workspace import use_workspace
 
 
 class TestBasicFunctions:
@@ -62,33 +72,80 @@ class TestBasicFunctions:
         assert result["success"] is True
         assert result["sum"] == -2
 
+    def test_add_numbers_arrays(self):
+        """测试数组逐元素相加和广播"""
+        result = add_numbers(a=[1, 2, 3], b=[10, 20, 30])
+        assert result["success"] is True
+        assert result["sum"] == [11, 22, 33]
+        assert result["length"] == 3
+        assert "a" not in result and "b" not in result
+
+        assert add_numbers(a=[1, 2.5], b=0.5)["sum"] == [1.5, 3.0]
+        assert add_numbers(a=1, b=[])["sum"] == []
+
+    def test_add_numbers_invalid_array(self):
+        """测试长度不一致和非数字元素"""
+        assert add_numbers(a=[1, 2], b=[1])["error_code"] == "INVALID_ARRAY"
+        assert add_numbers(a=[1, "x"], b=1)["error_code"] == "INVALID_ARRAY"
+
+
+class TestBatchCall:
+    """测试批量调用"""
+
+    def test_results_in_order(self):
+        """结果按顺序排列，与单独调用相同"""
+        items = [{"name": f"u{i}"} for i in range(50)]
+        result = batch_call("greet", items)
+        assert result["success"] is True
+        assert result["count"] == result["succeeded"] == 50
+        assert result["results"] == [greet(**item) for item in items]
+
+    def test_per_item_errors(self):
+        """单项失败不影响其他项"""
+        items = [{"a": 1, "b": 2}, {"a": 1}, {"a": 1, "b": 2, "c": 3}, "x", {"a": 1, "b": "y"}]
+        result = batch_call("add_numbers", items)
+        assert result["success"] is True
+        assert [r.get("error_code") for r in result["results"]] == [
+            None, "INVALID_PARAMETERS", "INVALID_PARAMETERS", "INVALID_PARAMETERS", "CALCULATION_ERROR"]
+        assert (result["succeeded"], result["failed"]) == (1, 4)
+
+    def test_empty_batch(self):
+        result = batch_call("echo", [])
+        assert result["success"] is True
+        assert result["results"] == []
+
+    @pytest.mark.parametrize("function, items, error_code", [
+        ("missing", [], "FUNCTION_NOT_FOUND"),
+        ("batch_call", [], "NOT_BATCHABLE"),
+        ("count_stream", [], "NOT_BATCHABLE"),
+        ("process_text_file", [], "NOT_BATCHABLE"),
+        ("fetch_weather", [], "NOT_BATCHABLE"),
+        ("greet", {"name": "x"}, "INVALID_ITEMS"),
+        ("greet", [{}] * 1001, "INVALID_ITEMS"),
+    ])
+    def test_batch_errors(self, function, items, error_code):
+        result = batch_call(function, items)
+        assert result["success"] is False
+        assert result["error_code"] == error_code
+
 
 class TestFileHandling:
     """测试文件处理功能"""
 
     @pytest.fixture
-    def workspace(self):
+    def workspace(self, tmp_path):
         """创建临时工作空间"""
-        temp_dir = tempfile.mkdtemp()
-        workspace_path = Path(temp_dir)
-
         # 创建目录结构（文件按 manifest key 组织）
-        inputs_dir = workspace_path / "data" / "inputs" / "input"
+        inputs_dir = tmp_path / "data" / "inputs" / "input"
         inputs_dir.mkdir(parents=True)
 
         # 创建测试输入文件
         test_file = inputs_dir / "test.txt"
         test_file.write_text("Hello World", encoding="utf-8")
 
-        # 切换到工作空间
-        original_cwd = os.getcwd()
-        os.chdir(workspace_path)
-
-        yield workspace_path
-
-        # 清理
-        os.chdir(original_cwd)
-        shutil.rmtree(temp_dir)
+        # 在工作空间中运行（不切换当前工作目录）
+        with use_workspace(tmp_path):
+            yield tmp_path
 
     def test_process_text_file_uppercase(self, workspace):
         """测试文本转大写"""
@@ -131,6 +188,134 @@ class TestFileHandling:
         assert len(output_files) == 1
         assert output_files[0].read_text(encoding="utf-8") == "dlroW olleH"
 
+    def test_process_text_file_small_chunks(self, workspace, monkeypatch):
+        """测试多字节字符落在块边界上"""
+        monkeypatch.setenv("PREFAB_CHUNK_SIZE", "3")
+        test_file = workspace / "data" / "inputs" / "input" / "test.txt"
+        test_file.write_text("straße 你好 world\r\n", encoding="utf-8")
+
+        result = process_text_file(operation="uppercase")
+
+        assert result["success"] is True
+        assert result["original_length"] == 16
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "STRASSE 你好 WORLD\n"
+
+    def test_process_text_file_multiple_files(self, workspace, monkeypatch):
+        """测试并发处理输入目录中的所有文件"""
+        monkeypatch.setenv("PREFAB_MAX_WORKERS", "2")
+        inputs_dir = workspace / "data" / "inputs" / "input"
+        (inputs_dir / "a.txt").write_text("abc", encoding="utf-8")
+        (inputs_dir / "b.txt").write_text("déf", encoding="utf-8")
+
+        result = process_text_file(operation="uppercase")
+
+        assert result["success"] is True
+        assert result["file_count"] == 3
+        assert [f["name"] for f in result["files"]] == ["a.txt", "b.txt", "test.txt"]
+        assert result["original_length"] == 17
+        assert result["input_bytes"] == 18
+        assert result["throughput_mb_per_s"] >= 0
+
+        outputs_dir = workspace / "data" / "outputs"
+        assert sorted(p.name for p in outputs_dir.glob("*")) == [
+            "processed_a.txt", "processed_b.txt", "processed_test.txt"
+        ]
+        assert (outputs_dir / "processed_b.txt").read_text(encoding="utf-8") == "DÉF"
+
+    def test_process_text_file_partial_failure(self, workspace):
+        """测试部分文件处理失败"""
+        (workspace / "data" / "inputs" / "input" / "bad.txt").write_bytes(b"\xff\xfe")
+
+        result = process_text_file(operation="lowercase")
+
+        assert result["success"] is False
+        assert result["error_code"] == "PROCESSING_ERROR"
+        by_name = {f["name"]: f for f in result["files"]}
+        assert by_name["bad.txt"]["success"] is False
+        assert by_name["test.txt"]["success"] is True
+
+        output_files = list((workspace / "data/outputs").glob("*"))
+        assert [p.name for p in output_files] == ["processed_test.txt"]
+
+    def test_process_text_file_cache_hit(self, workspace):
+        """测试相同内容 + 相同操作命中结果缓存"""
+        first = process_text_file(operation="uppercase")
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        output_file.unlink()
+
+        second = process_text_file(operation="uppercase")
+
+        assert (first["cache_hits"], first["cache_misses"]) == (0, 1)
+        assert (second["cache_hits"], second["cache_misses"]) == (1, 0)
+        assert second["files"][0]["cache_hit"] is True
+        assert second["original_length"] == first["original_length"]
+        assert output_file.read_text(encoding="utf-8") == "HELLO WORLD"
+
+        # 操作不同时不会命中
+        third = process_text_file(operation="lowercase")
+        assert third["cache_misses"] == 1
+        assert output_file.read_text(encoding="utf-8") == "hello world"
+
+    def test_process_text_file_cache_disabled(self, workspace, monkeypatch):
+        """测试容量为 0 时禁用缓存"""
+        monkeypatch.setenv("PREFAB_CACHE_MAX_BYTES", "0")
+        process_text_file(operation="uppercase")
+        result = process_text_file(operation="uppercase")
+
+        assert result["cache_hits"] == 0
+        assert not (workspace / "data" / "cache").exists()
+
+    def test_process_text_file_compressed_input(self, workspace):
+        """测试 gzip 输入按魔数识别并流式解压"""
+        inputs_dir = workspace / "data" / "inputs" / "input"
+        (inputs_dir / "test.txt").unlink()
+        (inputs_dir / "test.txt.gz").write_bytes(gzip.compress(b"Hello World"))
+
+        result = process_text_file(operation="uppercase")
+
+        assert result["success"] is True
+        assert result["files"][0]["input_compression"] == "gzip"
+        assert result["input_uncompressed_bytes"] == 11
+        assert result["input_bytes"] == (inputs_dir / "test.txt.gz").stat().st_size
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "HELLO WORLD"
+
+    @pytest.mark.parametrize("content", [b"BZh is a prefix\n", b"BZh91AY&SY looks like bzip2\n"])
+    def test_process_text_file_magic_in_plain_text(self, workspace, content):
+        """以压缩魔数开头但无法解压的纯文本按未压缩处理"""
+        inputs_dir = workspace / "data" / "inputs" / "input"
+        (inputs_dir / "test.txt").write_bytes(content)
+
+        result = process_text_file(operation="uppercase")
+
+        assert result["success"] is True
+        assert result["files"][0]["input_compression"] == "none"
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_bytes() == content.upper()
+
+    def test_process_text_file_compressed_output(self, workspace, monkeypatch):
+        """测试按阈值压缩输出"""
+        result = process_text_file(operation="uppercase", output_compression="gzip")
+        assert result["files"][0]["output_compression"] == "none"
+
+        monkeypatch.setenv("PREFAB_COMPRESS_MIN_BYTES", "0")
+        result = process_text_file(operation="uppercase", output_compression="gzip")
+
+        assert result["success"] is True
+        assert result["files"][0]["output_compression"] == "gzip"
+        assert result["output_uncompressed_bytes"] == 11
+        output_file = workspace / "data" / "outputs" / "processed_test.txt.gz"
+        assert result["output_bytes"] == output_file.stat().st_size
+        assert gzip.decompress(output_file.read_bytes()) == b"HELLO WORLD"
+
+    def test_process_text_file_invalid_compression(self, workspace):
+        """测试无效压缩格式"""
+        result = process_text_file(operation="uppercase", output_compression="zip")
+
+        assert result["success"] is False
+        assert result["error_code"] == "INVALID_COMPRESSION"
+
     def test_process_text_file_no_input(self, workspace):
         """测试没有输入文件"""
         # 删除所有输入文件
@@ -142,6 +327,72 @@ class TestFileHandling:
         assert result["success"] is False
         assert result["error_code"] == "NO_INPUT_FILE"
 
+    def test_process_text_file_pipeline(self, workspace):
+        """测试操作列表在一次读写中完成"""
+        result = process_text_file(operation=["uppercase", "reverse", "lowercase"])
+
+        assert result["success"] is True
+        assert result["pipeline"] == "reverse+~uppercase+lowercase"
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "dlrow olleh"
+        assert [p.name for p in output_file.parent.iterdir()] == ["processed_test.txt"]
+
+    def test_process_text_file_incremental(self, workspace):
+        """测试增量模式只处理新追加的内容"""
+        input_file = workspace / "data" / "inputs" / "input" / "test.txt"
+        input_file.write_text("Line ONE\n", encoding="utf-8")
+        first = process_text_file(operation="uppercase", incremental=True)
+        assert first["resumed_bytes"] == 0
+
+        with open(input_file, "a", encoding="utf-8") as f:
+            f.write("Line two\n")
+        result = process_text_file(operation="uppercase", incremental=True)
+
+        assert result["success"] is True
+        assert result["resumed_bytes"] == 9
+        assert result["files"][0]["cache_hit"] is False
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "LINE ONE\nLINE TWO\n"
+
+    def test_process_text_file_line_range(self, workspace):
+        """测试只处理指定的行"""
+        input_file = workspace / "data" / "inputs" / "input" / "test.txt"
+        input_file.write_text("".join(f"line {i}\n" for i in range(1, 11)), encoding="utf-8")
+
+        result = process_text_file(operation="uppercase", start_line=3, end_line=4)
+        assert result["success"] is True
+        assert result["files"][0]["byte_range"] == [14, 28]
+        assert result["files"][0]["index_hit"] is False
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "LINE 3\nLINE 4\n"
+
+        result = process_text_file(operation="reverse", start_line=10)
+        assert result["files"][0]["index_hit"] is True
+        assert output_file.read_text(encoding="utf-8") == "\n01 enil"
+
+    def test_process_text_file_byte_range(self, workspace):
+        """测试只处理指定的字节区间"""
+        result = process_text_file(operation="uppercase", start_byte=6)
+
+        assert result["success"] is True
+        assert result["input_bytes"] == 5
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "WORLD"
+
+    @pytest.mark.parametrize("kwargs", [
+        {"start_line": 0},
+        {"start_line": 2, "start_byte": 1},
+        {"end_byte": 3, "start_byte": 5},
+        {"start_line": 2, "incremental": True},
+        {"start_byte": 2, "output_compression": "gzip"},
+    ])
+    def test_process_text_file_invalid_range(self, workspace, kwargs):
+        """测试无效范围"""
+        result = process_text_file(operation="uppercase", **kwargs)
+
+        assert result["success"] is False
+        assert result["error_code"] == "INVALID_RANGE"
+
     def test_process_text_file_invalid_operation(self, workspace):
         """测试无效操作"""
         result = process_text_file(operation="invalid")
@@ -149,6 +400,72 @@ class TestFileHandling:
         assert result["success"] is False
         assert result["error_code"] == "INVALID_OPERATION"
 
+        result = process_text_file(operation=["uppercase", "invalid"])
+        assert result["error_code"] == "INVALID_OPERATION"
+
+
+class TestFileStreaming:
+    """测试流式文件处理"""
+
+    @pytest.fixture
+    def workspace(self, tmp_path, monkeypatch):
+        """创建临时工作空间"""
+        inputs_dir = tmp_path / "data" / "inputs" / "input"
+        inputs_dir.mkdir(parents=True)
+        (inputs_dir / "test.txt").write_text("Hello World\n" * 100, encoding="utf-8")
+        monkeypatch.setenv("PREFAB_CHUNK_SIZE", "256")
+        with use_workspace(tmp_path):
+            yield tmp_path
+
+    def test_process_text_file_stream_events(self, workspace):
+        """测试事件顺序和进度字段"""
+        events = list(process_text_file_stream(operation="uppercase"))
+
+        assert events[0]["type"] == "start"
+        assert events[0]["data"]["total_bytes"] == 1200
+        progress = [e["data"] for e in events if e["type"] == "progress"]
+        assert progress and progress[-1]["bytes_processed"] == 1200
+        assert progress[-1]["percentage"] == 100
+        assert all("mb_per_s" in p for p in progress)
+        assert events[-1]["type"] == "done"
+        assert events[-1]["data"]["processed_length"] == 1200
+
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "HELLO WORLD\n" * 100
+
+    def test_process_text_file_stream_resumes(self, workspace, monkeypatch):
+        """测试带续传点重新调用时从上次的检查点继续"""
+        monkeypatch.setenv("PREFAB_CACHE_MAX_BYTES", "0")
+        monkeypatch.setenv("PREFAB_STREAM_CHECKPOINT_BYTES", "300")
+        checkpoint = StreamCheckpoint()
+        with use_checkpoint(checkpoint):
+            events = list(process_text_file_stream(operation="uppercase"))
+        assert events[-1]["type"] == "done"
+        token = checkpoint.state
+        assert set(token) == {"offset", "output_bytes"}
+        assert token["offset"] > 0
+
+        # 输入在末尾追加了内容，续传时只处理新增部分
+        input_file = workspace / "data" / "inputs" / "input" / "test.txt"
+        with open(input_file, "a", encoding="utf-8") as f:
+            f.write("Bye\n")
+        with use_checkpoint(StreamCheckpoint(token)):
+            events = list(process_text_file_stream(operation="uppercase"))
+
+        assert "start" not in [e["type"] for e in events]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["data"]["resumed_bytes"] >= token["offset"]
+        output_file = workspace / "data" / "outputs" / "processed_test.txt"
+        assert output_file.read_text(encoding="utf-8") == "HELLO WORLD\n" * 100 + "BYE\n"
+
+    def test_process_text_file_stream_invalid_operation(self, workspace):
+        """测试无效操作返回 error 事件"""
+        events = list(process_text_file_stream(operation="invalid"))
+
+        assert len(events) == 1
+        assert events[0]["type"] == "error"
+        assert events[0]["error_code"] == "INVALID_OPERATION"
+
 
 class TestSecretsHandling:
     """测试密钥处理"""
@@ -183,3 +500,34 @@ class TestSecretsHandling:
 
         assert result["success"] is False
         assert result["error_code"] == "INVALID_CITY"
+
+    def test_fetch_weather_from_service(self, monkeypatch):
+        """配置了天气服务地址时调用服务（经连接池和结果缓存）"""
+        with running(api_key="test-api-key", cities=["北京", "上海"]) as server:
+            monkeypatch.setenv(WEATHER_API_URL_ENV, server.url)
+            monkeypatch.setenv("WEATHER_API_KEY", "test-api-key")
+
+            assert fetch_weather(city="北京") == {"success": True, **weather_for("北京"), "cache_age_seconds": 0.0}
+            assert fetch_weather(city="上海")["success"] is True
+            assert fetch_weather(city="广州")["error_code"] == "CITY_NOT_FOUND"
+            # 三次请求复用同一个连接
+            assert (server.connections, server.requests) == (1, 3)
+
+            # 缓存命中不再请求天气服务
+            result = fetch_weather(city="北京")
+            assert result["cache_age_seconds"] >= 0
+            assert server.requests == 3
+
+            monkeypatch.setenv("WEATHER_API_KEY", "wrong-key")
+            assert fetch_weather(city="北京")["error_code"] == "INVALID_API_KEY"
+
+    def test_fetch_weather_cache_disabled(self, monkeypatch):
+        """缓存时间为 0 时每次都请求天气服务"""
+        with running() as server:
+            monkeypatch.setenv(WEATHER_API_URL_ENV, server.url)
+            monkeypatch.setenv(WEATHER_CACHE_TTL_ENV, "0")
+            monkeypatch.setenv("WEATHER_API_KEY", "test-api-key")
+
+            for _ in range(3):
+                assert fetch_weather(city="北京")["cache_age_seconds"] == 0
+            assert server.requests == 3
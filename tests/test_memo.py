@@ -0,0 +1,184 @@
+"""
+纯函数结果缓存测试
+"""
+
+import threading
+
+import pytest
+
+from src.utils.memo import MemoCache, make_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _counting(result=None):
+    calls = []
+
+    def func(**arguments):
+        calls.append(arguments)
+        return result if result is not None else {"success": True, **arguments}
+
+    return func, calls
+
+
+class TestMakeKey:
+    """测试参数规范化"""
+
+    def test_order_does_not_matter(self):
+        assert make_key("f", {"a": 1, "b": "x"}) == make_key("f", {"b": "x", "a": 1})
+
+    def test_types_are_distinguished(self):
+        keys = {make_key("f", {"a": value}) for value in (1, 1.0, True, "1")}
+        assert len(keys) == 4
+
+    def test_nested_values(self):
+        key = make_key("f", {"a": [1, 2], "b": {"y": 1, "x": 2}})
+        assert key == make_key("f", {"b": {"x": 2, "y": 1}, "a": [1, 2]})
+        assert make_key("f", {"a": [1, 2]}) != make_key("f", {"a": [1, 2.0]})
+
+    def test_function_name_is_part_of_key(self):
+        assert make_key("f", {"a": 1}) != make_key("g", {"a": 1})
+
+    def test_unserializable(self):
+        assert make_key("f", {"a": [object()]}) is None
+
+
+class TestMemoCache:
+    """测试 LRU、TTL 和相同调用合并"""
+
+    def test_hit(self):
+        memo = MemoCache(8, 60)
+        func, calls = _counting()
+
+        first = memo.call("f", {"a": 1}, lambda: func(a=1))
+        second = memo.call("f", {"a": 1}, lambda: func(a=1))
+
+        assert first is second
+        assert len(calls) == 1
+        assert memo.snapshot()["hits"] == 1
+        assert memo.snapshot()["hit_ratio"] == 0.5
+
+    def test_lru_eviction(self):
+        memo = MemoCache(2, 60)
+        func, calls = _counting()
+        for a in (1, 2, 1, 3):
+            memo.call("f", {"a": a}, lambda a=a: func(a=a))
+        # 2 是最久未使用的，被 3 挤出
+        memo.call("f", {"a": 1}, lambda: func(a=1))
+        memo.call("f", {"a": 2}, lambda: func(a=2))
+
+        assert [c["a"] for c in calls] == [1, 2, 3, 2]
+        assert memo.stats.evictions == 2
+        assert len(memo) == 2
+
+    def test_ttl(self):
+        clock = _Clock()
+        memo = MemoCache(8, 10, clock=clock)
+        func, calls = _counting()
+        memo.call("f", {}, func)
+        clock.now = 9.9
+        memo.call("f", {}, func)
+        clock.now = 10
+        memo.call("f", {}, func)
+
+        assert len(calls) == 2
+        assert memo.stats.expirations == 1
+
+    def test_failures_are_not_cached(self):
+        memo = MemoCache(8, 60)
+        func, calls = _counting({"success": False, "error_code": "X"})
+        memo.call("f", {}, func)
+        memo.call("f", {}, func)
+        assert len(calls) == 2
+        assert len(memo) == 0
+
+        def boom():
+            raise RuntimeError("x")
+
+        with pytest.raises(RuntimeError):
+            memo.call("g", {}, boom)
+        assert len(memo) == 0
+
+    @pytest.mark.parametrize("maxsize, ttl", [(0, 60), (8, 0)])
+    def test_disabled(self, maxsize, ttl):
+        memo = MemoCache(maxsize, ttl)
+        func, calls = _counting()
+        memo.call("f", {}, func)
+        memo.call("f", {}, func)
+        assert len(calls) == 2
+        assert memo.snapshot()["misses"] == 0
+
+    def test_uncacheable_arguments_run_directly(self):
+        memo = MemoCache(8, 60)
+        func, calls = _counting({"success": True})
+        memo.call("f", {"a": [object()]}, func)
+        memo.call("f", {"a": [object()]}, func)
+        assert len(calls) == 2
+        assert memo.stats.uncacheable == 2
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            MemoCache(-1)
+        with pytest.raises(ValueError):
+            MemoCache(8, -1)
+
+
+class TestSingleflight:
+    """测试并发的相同调用只执行一次"""
+
+    def _concurrent(self, memo, func, callers=8):
+        release = threading.Event()
+        results, errors = [], []
+
+        def slow():
+            release.wait(5)
+            return func()
+
+        def caller():
+            try:
+                results.append(memo.call("f", {"a": 1}, slow))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        # 等所有调用者都进入缓存（一个在执行，其余在等待）
+        while memo.stats.misses + memo.stats.coalesced < callers:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_coalesces_identical_calls(self):
+        memo = MemoCache(8, 60)
+        func, calls = _counting({"success": True})
+
+        results, errors = self._concurrent(memo, func)
+
+        assert len(calls) == 1
+        assert errors == [] and len(results) == 8
+        assert all(result is results[0] for result in results)
+        assert (memo.stats.misses, memo.stats.coalesced) == (1, 7)
+
+    def test_waiters_receive_the_exception(self):
+        memo = MemoCache(8, 60)
+
+        def boom():
+            raise RuntimeError("x")
+
+        results, errors = self._concurrent(memo, boom, callers=4)
+
+        assert results == [] and len(errors) == 4
+        assert all(isinstance(e, RuntimeError) for e in errors)
+        # 失败不缓存，下一次重新执行
+        func, calls = _counting()
+        memo.call("f", {"a": 1}, func)
+        assert len(calls) == 1
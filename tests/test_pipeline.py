@@ -0,0 +1,87 @@
+"""
+融合管道测试
+
+验证编译后的管道与逐步执行整段文本的结果一致。
+"""
+
+import io
+import itertools
+
+import pytest
+
+from src.utils.pipeline import build_transform, compile_pipeline, parse_steps
+from src.utils.text_stream import reverse_stream, transform_stream
+
+SAMPLES = [
+    "Hello World",
+    "héllo wörld – 你好，世界 🎉\n第二行",
+    "line1\r\nline2\rline3\n\r\n",
+    "ΟΔΟΣ ΑΣ Σ ΣΑ ΑΣ.Β ΑΣΒ",
+    "Straße ǅ ŉ ΐ",
+    "ŉσ aσǰb ǰσ",
+]
+
+STEP_FUNCS = {
+    "uppercase": str.upper,
+    "lowercase": str.lower,
+    "reverse": lambda text: text[::-1],
+}
+
+# 长度不超过 3 的所有操作列表
+ALL_STEPS = [steps for n in (1, 2, 3) for steps in itertools.product(STEP_FUNCS, repeat=n)]
+
+
+def _run_steps(text, steps):
+    """参考实现：逐步处理整段文本"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    for step in steps:
+        text = STEP_FUNCS[step](text)
+    return text.encode("utf-8")
+
+
+def _run_pipeline(text, steps, chunk_size):
+    pipeline = compile_pipeline(parse_steps(list(steps)))
+    transform = build_transform(pipeline.maps)
+    src, dst = io.BytesIO(text.encode("utf-8")), io.BytesIO()
+    if pipeline.reverse:
+        reverse_stream(src, dst, chunk_size, transform=transform)
+    else:
+        transform_stream(src, dst, transform, chunk_size)
+    return dst.getvalue()
+
+
+class TestCompilePipeline:
+    """测试编译规则"""
+
+    @pytest.mark.parametrize("steps, key", [
+        ("uppercase", "uppercase"),
+        (["reverse"], "reverse"),
+        (["reverse", "reverse"], "none"),
+        (["uppercase", "uppercase", "uppercase"], "uppercase"),
+        (["lowercase", "reverse"], "reverse+~lowercase"),
+        (["reverse", "uppercase", "reverse"], "~uppercase"),
+        (["uppercase", "lowercase"], "uppercase+lowercase"),
+    ])
+    def test_key(self, steps, key):
+        assert compile_pipeline(parse_steps(steps)).key == key
+
+    @pytest.mark.parametrize("operation", ["invalid", [], ["uppercase", "title"], 3, ["reverse"] * 17])
+    def test_invalid(self, operation):
+        with pytest.raises(ValueError):
+            parse_steps(operation)
+
+    def test_ascii_chunks_collapse_to_last_case_step(self):
+        """ASCII 块上一串大小写转换只执行最后一个"""
+        transform = build_transform(compile_pipeline(("uppercase", "reverse", "lowercase", "reverse")).maps)
+        assert transform("Hello World") == "hello world"
+        assert transform("Straße") == "strasse"
+
+
+class TestFusedPipeline:
+    """测试融合执行与逐步执行一致"""
+
+    @pytest.mark.parametrize("steps", ALL_STEPS, ids="+".join)
+    @pytest.mark.parametrize("text", SAMPLES)
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64])
+    def test_matches_step_by_step(self, steps, text, chunk_size):
+        assert _run_pipeline(text, steps, chunk_size) == _run_steps(text, steps)
@@ -0,0 +1,70 @@
+"""
+结果缓存测试
+"""
+
+import multiprocessing
+import os
+
+import pytest
+
+from src.utils.result_cache import ResultCache, _tmp_path
+
+
+def _make_output(path, content):
+    path.write_bytes(content)
+    return path
+
+
+def _child_tmp_name(path, queue):
+    queue.put(_tmp_path(path).name)
+
+
+class TestResultCache:
+    """测试内容寻址缓存"""
+
+    def test_key_depends_on_content_and_variant(self, tmp_path):
+        """键由内容和操作共同决定，与文件名无关"""
+        a = _make_output(tmp_path / "a.txt", b"same")
+        b = _make_output(tmp_path / "b.txt", b"same")
+        c = _make_output(tmp_path / "c.txt", b"other")
+
+        assert ResultCache.make_key(a, "uppercase") == ResultCache.make_key(b, "uppercase")
+        assert ResultCache.make_key(a, "uppercase") != ResultCache.make_key(a, "lowercase")
+        assert ResultCache.make_key(a, "uppercase") != ResultCache.make_key(c, "uppercase")
+
+    def test_store_and_fetch(self, tmp_path):
+        """命中时恢复输出内容和统计信息"""
+        cache = ResultCache(tmp_path / "cache", max_bytes=1024)
+        output = _make_output(tmp_path / "out.txt", b"RESULT")
+        cache.store("k1", output, {"processed_length": 6})
+        output.unlink()
+
+        assert cache.fetch("missing", output) is None
+        assert cache.fetch("k1", output) == {"processed_length": 6}
+        assert output.read_bytes() == b"RESULT"
+
+    def test_lru_eviction(self, tmp_path):
+        """超过容量时淘汰最久未使用的条目"""
+        cache = ResultCache(tmp_path / "cache", max_bytes=10)
+        for i, key in enumerate(["old", "used", "new"]):
+            output = _make_output(tmp_path / f"{key}.txt", b"x" * 4)
+            cache.store(key, output, {})
+            # 让 mtime 有确定的先后顺序
+            os.utime(cache.root / f"{key}.out", ns=(i * 10**9, i * 10**9))
+            if key == "used":
+                cache.fetch("old", tmp_path / "restored.txt")
+
+        remaining = sorted(p.stem for p in cache.root.glob("*.out"))
+        assert remaining == ["new", "old"]
+
+    @pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="需要 fork")
+    def test_tmp_names_differ_across_forked_workers(self, tmp_path):
+        """fork 出的工作进程主线程的线程号与父进程相同，临时文件名仍然不同"""
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+        child = context.Process(target=_child_tmp_name, args=(tmp_path / "entry.json", queue))
+        child.start()
+        name = queue.get(timeout=10)
+        child.join(timeout=10)
+
+        assert name != _tmp_path(tmp_path / "entry.json").name
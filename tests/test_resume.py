@@ -0,0 +1,57 @@
+"""
+流式函数续传状态测试
+"""
+
+import asyncio
+
+from src.main import count_stream, count_stream_async
+from src.utils.resume import StreamCheckpoint, resumable, resume_state, save_checkpoint, use_checkpoint
+
+
+class TestResume:
+    """测试续传状态的上下文和 count_stream 的续传"""
+
+    def test_outside_gateway(self):
+        assert resume_state() is None
+        save_checkpoint({"ignored": True})
+        assert resume_state() is None
+        assert resumable() is False
+
+    def test_use_checkpoint(self):
+        checkpoint = StreamCheckpoint({"current": 1})
+        with use_checkpoint(checkpoint):
+            assert resumable() is True
+            assert resume_state() == {"current": 1}
+            save_checkpoint({"current": 2})
+        assert checkpoint.state == {"current": 2}
+        assert resume_state() is None
+
+    def test_count_stream_saves_checkpoints(self):
+        checkpoint = StreamCheckpoint()
+        states = []
+        with use_checkpoint(checkpoint):
+            for event in count_stream(3, 0):
+                states.append((event["type"], checkpoint.state))
+        assert states == [("start", None), ("progress", {"current": 1}), ("progress", {"current": 2}),
+                          ("progress", {"current": 3}), ("done", {"current": 3})]
+
+    def test_count_stream_resumes(self):
+        with use_checkpoint(StreamCheckpoint({"current": 3})):
+            events = list(count_stream(5, 0))
+        assert [(e["type"], e["data"].get("current")) for e in events] == [
+            ("progress", 4), ("progress", 5), ("done", None)]
+
+        # 续传后剩余的事件与完整执行的对应部分相同
+        assert events == list(count_stream(5, 0))[-3:]
+
+    def test_count_stream_async_resumes(self):
+        async def collect():
+            with use_checkpoint(StreamCheckpoint({"current": 4})):
+                return [event async for event in count_stream_async(5, 0)]
+
+        assert [e["type"] for e in asyncio.run(collect())] == ["progress", "done"]
+
+    def test_invalid_resume_state_starts_over(self):
+        for state in ({"current": 0}, {"current": 6}, {"current": "3"}, {"current": True}, {}):
+            with use_checkpoint(StreamCheckpoint(state)):
+                assert next(count_stream(5, 0))["type"] == "start"
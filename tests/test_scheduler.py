@@ -0,0 +1,101 @@
+"""
+共享定时调度器测试
+"""
+
+import asyncio
+
+import pytest
+
+from src.utils.scheduler import TickScheduler, get_scheduler
+
+
+def _run(coro_func):
+    """在新的事件循环中运行 coro_func(scheduler)"""
+    async def main():
+        return await coro_func(get_scheduler())
+    return asyncio.run(main())
+
+
+class TestTickScheduler:
+    """测试登记、批量唤醒和取消"""
+
+    def test_never_wakes_early(self):
+        async def case(scheduler):
+            lateness = []
+
+            async def waiter(delay):
+                deadline = scheduler.time() + delay
+                await scheduler.sleep_until(deadline)
+                lateness.append(scheduler.time() - deadline)
+
+            await asyncio.gather(*(waiter(0.005 * (i % 7)) for i in range(50)))
+            return lateness
+
+        lateness = _run(case)
+        assert len(lateness) == 50
+        assert min(lateness) >= 0
+
+    def test_same_deadline_is_one_batch(self):
+        async def case(scheduler):
+            deadline = scheduler.time() + 0.02
+            await asyncio.gather(*(scheduler.sleep_until(deadline) for _ in range(100)))
+            return scheduler.stats()
+
+        stats = _run(case)
+        assert stats["registered"] == stats["woken"] == 100
+        assert stats["batches"] == 1
+        assert stats["timers"] == 1
+
+    def test_wakes_in_deadline_order(self):
+        async def case(scheduler):
+            order = []
+            now = scheduler.time()
+
+            async def waiter(name, delay):
+                await scheduler.sleep_until(now + delay)
+                order.append(name)
+
+            # 后登记的更早截止时间会替换已挂的定时器
+            await asyncio.gather(waiter("c", 0.03), waiter("a", 0.01), waiter("b", 0.02))
+            return order
+
+        assert _run(case) == ["a", "b", "c"]
+
+    def test_cancelled_waiter_is_skipped(self):
+        async def case(scheduler):
+            deadline = scheduler.time() + 0.01
+            cancelled = asyncio.ensure_future(scheduler.sleep_until(deadline))
+            kept = asyncio.ensure_future(scheduler.sleep_until(deadline))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await kept
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            return scheduler.stats(), scheduler.pending()
+
+        stats, pending = _run(case)
+        assert stats["registered"] == 2
+        assert stats["woken"] == 1
+        assert pending == 0
+
+    def test_past_deadline_only_yields(self):
+        async def case(scheduler):
+            await scheduler.sleep_until(scheduler.time() - 1)
+            return scheduler.stats()["registered"]
+
+        assert _run(case) == 0
+
+    def test_one_scheduler_per_loop(self):
+        async def current():
+            assert get_scheduler() is get_scheduler()
+            return get_scheduler()
+
+        assert asyncio.run(current()) is not asyncio.run(current())
+
+    def test_invalid_resolution(self):
+        loop = asyncio.new_event_loop()
+        try:
+            with pytest.raises(ValueError):
+                TickScheduler(loop, resolution=0)
+        finally:
+            loop.close()
@@ -0,0 +1,129 @@
+"""
+单文件并行分片处理测试
+
+验证分片结果与串行流式处理逐字节一致。
+"""
+
+import random
+
+import pytest
+
+from src.utils import sharding
+from src.utils.pipeline import compile_pipeline
+from src.utils.sharding import plan_shards, shard_transform_file
+from src.utils.text_stream import CHUNK_TRANSFORMS, transform_file
+
+SAMPLES = [
+    "hello world\n" * 500,
+    "ΟΔΟΣ ΑΣ\nstraße 你好\n" * 200,
+    "ǅ ŉ ΐ\n" * 300,
+    "a\r\nb\rc\n" * 200,
+    "no newline at all " * 100,
+]
+
+
+class TestPlanShards:
+    """测试分片边界"""
+
+    def test_boundaries_follow_newlines(self, tmp_path):
+        """每个分片（除最后一个）都以换行符结尾，且首尾相接"""
+        path = tmp_path / "in.txt"
+        data = "第一行\nsecond line\n" * 300
+        path.write_text(data, encoding="utf-8")
+        raw = path.read_bytes()
+
+        shards = plan_shards(path, 8)
+
+        assert len(shards) > 1
+        assert shards[0][0] == 0 and shards[-1][1] == len(raw)
+        for (_, end), (start, _) in zip(shards, shards[1:]):
+            assert end == start
+            assert raw[end - 1:end] == b"\n"
+
+    def test_empty_file(self, tmp_path):
+        """空文件没有分片"""
+        path = tmp_path / "empty.txt"
+        path.write_bytes(b"")
+        assert plan_shards(path, 4) == []
+
+
+class TestShardTransformFile:
+    """测试并行分片转换"""
+
+    @pytest.mark.parametrize("operation", sorted(CHUNK_TRANSFORMS))
+    @pytest.mark.parametrize("text", SAMPLES)
+    def test_matches_serial(self, tmp_path, operation, text):
+        """与串行路径逐字节一致（包括字节数变化的情况）"""
+        path = tmp_path / "in.txt"
+        path.write_bytes(text.encode("utf-8"))
+
+        pipeline = compile_pipeline((operation,))
+        stats = shard_transform_file(path, tmp_path / "sharded.txt", pipeline, workers=2, chunk_size=64)
+        serial = transform_file(path, tmp_path / "serial.txt", CHUNK_TRANSFORMS[operation], 64)
+
+        assert (tmp_path / "sharded.txt").read_bytes() == (tmp_path / "serial.txt").read_bytes()
+        assert stats["original_length"] == serial["original_length"]
+        assert stats["processed_length"] == serial["processed_length"]
+
+    def test_runs_in_parallel(self, tmp_path):
+        """字节数不变时按分片并行写入"""
+        path = tmp_path / "in.txt"
+        path.write_text("abc déf\n" * 1000, encoding="utf-8")
+
+        pipeline = compile_pipeline(("uppercase",))
+        stats = shard_transform_file(path, tmp_path / "out.txt", pipeline, workers=2, chunk_size=256)
+
+        assert stats["shards"] > 1
+        assert (tmp_path / "out.txt").read_text(encoding="utf-8") == "ABC DÉF\n" * 1000
+
+    @pytest.mark.parametrize("text, expected", [
+        ("a\r\nb\rc\n" * 500, "A\nB\nC\n" * 500),
+        ("straße ΟΔΟΣ\n" * 500, "STRASSE ΟΔΟΣ\n" * 500),
+    ])
+    def test_length_change_stays_parallel(self, tmp_path, text, expected):
+        """字节数变化时分片改写到临时文件再拼接，不回退到串行，也不留下临时文件"""
+        path = tmp_path / "in.txt"
+        path.write_bytes(text.encode("utf-8"))
+        out_dir = tmp_path / "out"
+        out_dir.mkdir()
+
+        pipeline = compile_pipeline(("uppercase",))
+        stats = shard_transform_file(path, out_dir / "out.txt", pipeline, workers=2, chunk_size=256)
+
+        assert stats["shards"] > 1
+        assert (out_dir / "out.txt").read_bytes() == expected.encode("utf-8")
+        assert stats["bytes_written"] == len(expected.encode("utf-8"))
+        assert [p.name for p in out_dir.iterdir()] == ["out.txt"]
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_mixed_length_changes(self, tmp_path, seed):
+        """只有部分分片变长或变短时，原地写入的分片移到正确的位置"""
+        rng = random.Random(seed)
+        runs = ["abc\n", "ŉŉ\n", "x\r\n", "ΐ\n"]
+        text = "".join(rng.choice(runs) * rng.randint(1, 80) for _ in range(rng.randint(5, 20)))
+        path = tmp_path / "in.txt"
+        path.write_text(text, encoding="utf-8", newline="")
+
+        pipeline = compile_pipeline(("uppercase",))
+        stats = shard_transform_file(path, tmp_path / "sharded.txt", pipeline, workers=4, chunk_size=16)
+        transform_file(path, tmp_path / "serial.txt", CHUNK_TRANSFORMS["uppercase"], 16)
+
+        assert stats["shards"] > 1
+        assert (tmp_path / "sharded.txt").read_bytes() == (tmp_path / "serial.txt").read_bytes()
+
+    def test_workers_do_not_fork(self, tmp_path, monkeypatch):
+        """工作进程不在（可能是多线程的）调用方进程中直接 fork"""
+        contexts = []
+
+        class RecordingPool(sharding.ProcessPoolExecutor):
+            def __init__(self, *args, mp_context=None, **kwargs):
+                contexts.append(mp_context)
+                super().__init__(*args, mp_context=mp_context, **kwargs)
+
+        monkeypatch.setattr(sharding, "ProcessPoolExecutor", RecordingPool)
+        path = tmp_path / "in.txt"
+        path.write_text("abc\n" * 1000, encoding="utf-8")
+        shard_transform_file(path, tmp_path / "out.txt", compile_pipeline(("lowercase",)), workers=2)
+
+        assert [c.get_start_method() for c in contexts] == [sharding._START_METHOD]
+        assert sharding._START_METHOD in ("forkserver", "spawn")
@@ -0,0 +1,196 @@
+"""
+SSE 事件缓冲和编码测试
+"""
+
+import asyncio
+import json
+import math
+
+import pytest
+
+from src.main import count_stream
+from src.utils.sse import EventBuffer, EventId, ReplayBuffer, StreamMetrics, encode_sse, format_event_id, parse_event_id
+
+
+def _progress(i):
+    return {"type": "progress", "data": {"current": i}}
+
+
+async def _drain(buffer):
+    events = []
+    while True:
+        item = await buffer.get()
+        if item is None:
+            return events
+        events.append(item.event)
+
+
+class TestEventBuffer:
+    """测试有界缓冲和 progress 合并"""
+
+    def test_slow_consumer_gets_latest_progress(self):
+        async def case():
+            buffer = EventBuffer(4)
+            # 消费者还没取走任何事件：连续的 progress 合并成最新的一个
+            await buffer.put({"type": "start"})
+            for i in range(1, 101):
+                await buffer.put(_progress(i), {"current": i})
+            await buffer.put({"type": "done"})
+            buffer.close()
+            start = await buffer.get()
+            # 合并后的事件带着最新事件的检查点
+            progress = await buffer.get()
+            return [start.event, progress.event] + await _drain(buffer), progress.checkpoint, buffer
+
+        events, checkpoint, buffer = asyncio.run(case())
+        assert events == [{"type": "start"}, _progress(100), {"type": "done"}]
+        assert checkpoint == {"current": 100}
+        assert buffer.coalesced == 99
+        assert buffer.max_depth == 3
+
+    def test_fast_consumer_sees_every_event(self):
+        async def case():
+            buffer = EventBuffer(2)
+
+            async def produce():
+                for i in range(50):
+                    await buffer.put(_progress(i))
+                    await asyncio.sleep(0)
+                buffer.close()
+
+            producer = asyncio.ensure_future(produce())
+            events = await _drain(buffer)
+            await producer
+            return events, buffer
+
+        events, buffer = asyncio.run(case())
+        assert events == [_progress(i) for i in range(50)]
+        assert buffer.coalesced == 0
+
+    def test_other_events_are_never_dropped(self):
+        async def case():
+            buffer = EventBuffer(2)
+            sent = [{"type": "start"}, _progress(1), {"type": "log", "data": 1}, _progress(2),
+                    {"type": "error", "data": "x"}, {"type": "done"}]
+
+            async def produce():
+                for event in sent:
+                    await buffer.put(event)
+                buffer.close()
+
+            producer = asyncio.ensure_future(produce())
+            await asyncio.sleep(0)
+            # 缓冲区满且无法合并时生产者等待，深度不超过上限
+            assert len(buffer) == 2
+            events = await _drain(buffer)
+            await producer
+            return sent, events, buffer
+
+        sent, events, buffer = asyncio.run(case())
+        assert events == sent
+        assert buffer.max_depth == 2
+
+    def test_discard_stops_producer(self):
+        async def case():
+            buffer = EventBuffer(1)
+            await buffer.put({"type": "start"})
+            blocked = asyncio.ensure_future(buffer.put({"type": "done"}))
+            await asyncio.sleep(0)
+            buffer.discard()
+            return await blocked, await buffer.put(_progress(1)), await buffer.get()
+
+        assert asyncio.run(case()) == (False, False, None)
+
+    def test_metrics(self):
+        async def case():
+            metrics = StreamMetrics()
+            first, second = EventBuffer(8, metrics), EventBuffer(8, metrics)
+            for i in range(3):
+                await first.put(_progress(i))
+            await second.put({"type": "start"})
+            during = metrics.snapshot()
+            first.close()
+            await _drain(first)
+            second.discard()
+            return during, metrics.snapshot()
+
+        during, after = asyncio.run(case())
+        assert during["streams_open"] == 2
+        assert during["buffer_depth"] == 2
+        assert during["events_coalesced"] == 2
+        assert after == {**during, "streams_open": 0, "buffer_depth": 0, "events_out": 1}
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            EventBuffer(0)
+
+
+def _reference(event):
+    data = json.dumps(event, ensure_ascii=False)
+    return f"event: {event.get('type', 'message')}\ndata: {data}\n\n".encode("utf-8")
+
+
+class TestEncodeSSE:
+    """测试模板编码与 json.dumps 逐字节一致"""
+
+    @pytest.mark.parametrize("event", [
+        {"type": "start", "data": {"total": 5, "interval": 0.5}},
+        {"type": "progress", "data": {"current": 1, "percentage": 20, "message": "正在计数: 1/5"}},
+        {"type": "error", "data": "带\n换行和\"引号\"", "error_code": "UNEXPECTED_ERROR"},
+        {"type": "done", "data": {}},
+        {"type": "done", "data": {"ok": True, "none": None, "nested": [1, {"é": 2.5}]}},
+        {"type": "p", "data": {"nan": math.nan, "inf": math.inf, "-inf": -math.inf, "big": 1e300}},
+        {"type": "p", "data": [1, 2], "metadata": {"k": "v"}},
+        {"data": "没有 type"},
+        {"type": 3, "data": 1},
+        {"type": ["unhashable"], "data": 1},
+        {"type": "p", "data": {1: "非字符串键"}},
+        {},
+    ])
+    def test_matches_json(self, event):
+        # 第二次使用缓存的模板
+        assert encode_sse(event) == _reference(event)
+        assert encode_sse(event) == _reference(event)
+
+    def test_same_shape_different_values(self):
+        assert encode_sse({"type": "p", "data": {"a": 1}}) == _reference({"type": "p", "data": {"a": 1}})
+        for value in (True, "x", 1.5, None, [1], {"b": "c"}):
+            event = {"type": "p", "data": {"a": value}}
+            assert encode_sse(event) == _reference(event)
+
+    def test_count_stream_events(self):
+        events = list(count_stream(20, 0))
+        assert [encode_sse(e) for e in events] == [_reference(e) for e in events]
+
+    def test_event_id_line(self):
+        event = {"type": "done", "data": {}}
+        assert encode_sse(event, "s-1") == b"id: s-1\n" + _reference(event)
+
+
+class TestEventIds:
+    """测试事件 ID 和补发缓冲"""
+
+    @pytest.mark.parametrize("checkpoint", [None, {"current": 3}, {"offset": 10, "note": "中文"}])
+    def test_round_trip(self, checkpoint):
+        event_id = format_event_id("abc123", 42, checkpoint)
+        assert "\n" not in event_id
+        assert parse_event_id(event_id) == EventId("abc123", 42, checkpoint)
+
+    def test_oversized_checkpoint_is_omitted(self):
+        assert parse_event_id(format_event_id("s", 1, {"blob": "x" * 4096})) == EventId("s", 1, None)
+
+    @pytest.mark.parametrize("value", ["", "abc", "abc-", "abc-x", "-1", "s-1.!!", "s-1.WzFd"])
+    def test_invalid(self, value):
+        assert parse_event_id(value) is None
+
+    def test_replay_since(self):
+        replay = ReplayBuffer(3)
+        for seq in range(1, 6):
+            replay.append(seq, f"m{seq}".encode())
+
+        assert replay.since(5, 5) == []
+        assert replay.since(3, 5) == [b"m4", b"m5"]
+        assert replay.since(2, 5) == [b"m3", b"m4", b"m5"]
+        # m2 已被挤出缓冲区，或客户端的序号比流还新
+        assert replay.since(1, 5) is None
+        assert replay.since(6, 5) is None
@@ -0,0 +1,227 @@
+"""
+流式文本处理引擎测试
+
+验证逐块处理的结果与一次性 read_text() / write_text() 逐字节一致。
+"""
+
+import io
+import random
+
+import pytest
+
+from src.utils.pipeline import ASCII_TRANSFORMS, build_transform
+from src.utils.text_stream import CHUNK_TRANSFORMS, _atomic_output, reverse_stream, transform_file, transform_stream
+
+SAMPLES = [
+    "Hello World",
+    "héllo wörld – 你好，世界 🎉\n第二行",
+    "line1\r\nline2\rline3\n\r\n",
+    "ΟΔΟΣ ΑΣ Σ ΣΑ ΑΣ.Β ΑΣΒ",
+    "Straße ǅ ŉ ΐ",
+    "",
+]
+
+
+# 先是纯 ASCII、后出现非 ASCII 字节（或反过来）的输入，覆盖快速路径回退
+MIXED_SAMPLES = [
+    "Hello World\r\n" * 3 + "ΑΣ and ΟΔΟΣ",
+    "plain ascii AB" + "Σ tail",
+    "abc\r" + "\néß",
+    "ΟΔΟΣ é" + " then ascii Text\r\n" * 3,
+    "ascii only\r\nno unicode\rat all\n",
+]
+
+
+# 没有空白和相邻普通字符、只能强制切分的输入：锚点字符后跟至多两个 case-ignorable 字符，
+# \r\n 用来检查强制切分不会把换行拆开
+_ANCHORS = tuple("AaΣσς,ß\r") + ("\r\n",)
+_IGNORABLES = "\u0345.'"
+
+# 强制切分要覆盖的转换，包括多步和镜像管道
+FORCED_TRANSFORMS = {
+    "lowercase": str.lower,
+    "uppercase": str.upper,
+    "upper~lower": build_transform((("uppercase", False), ("lowercase", True))),
+    "~lower,upper,lower": build_transform((("lowercase", True), ("uppercase", False), ("lowercase", False))),
+}
+
+
+def _forced_split_samples(count=200, seed=11):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(_ANCHORS) + "".join(rng.choices(_IGNORABLES, k=rng.randint(0, 2)))
+                for _ in range(rng.randint(1, 30)))
+        for _ in range(count)
+    ]
+
+
+def _reference(tmp_path, text, operation):
+    """旧实现：一次性读入整个文件"""
+    path = tmp_path / "ref.txt"
+    path.write_bytes(text.encode("utf-8"))
+    content = path.read_text(encoding="utf-8")
+    out = tmp_path / "ref_out.txt"
+    result = content[::-1] if operation == "reverse" else CHUNK_TRANSFORMS[operation](content)
+    out.write_text(result, encoding="utf-8")
+    return out.read_bytes()
+
+
+class TestTransformStream:
+    """测试逐块转换"""
+
+    @pytest.mark.parametrize("operation", sorted(CHUNK_TRANSFORMS))
+    @pytest.mark.parametrize("text", SAMPLES)
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+    def test_matches_whole_file(self, tmp_path, operation, text, chunk_size):
+        """任意块大小下与一次性处理结果一致"""
+        dst = io.BytesIO()
+        stats = transform_stream(io.BytesIO(text.encode("utf-8")), dst, CHUNK_TRANSFORMS[operation], chunk_size)
+
+        assert dst.getvalue() == _reference(tmp_path, text, operation)
+        assert stats["bytes_read"] == len(text.encode("utf-8"))
+        assert stats["bytes_written"] == len(dst.getvalue())
+
+    @pytest.mark.parametrize("operation", sorted(CHUNK_TRANSFORMS))
+    @pytest.mark.parametrize("text", MIXED_SAMPLES)
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 64])
+    def test_ascii_fast_path_matches(self, tmp_path, operation, text, chunk_size):
+        """字节级快速路径（含回退到 Unicode 路径）与一次性处理结果一致"""
+        dst = io.BytesIO()
+        stats = transform_stream(io.BytesIO(text.encode("utf-8")), dst, CHUNK_TRANSFORMS[operation], chunk_size,
+                                 ascii_transform=ASCII_TRANSFORMS[operation])
+
+        assert dst.getvalue() == _reference(tmp_path, text, operation)
+        assert stats["original_length"] == len(text.replace("\r\n", "\n"))
+
+    def test_ascii_fast_path_skips_decoding(self):
+        """纯 ASCII 输入完全不经过 str 转换"""
+
+        def fail(text):
+            raise AssertionError("不应调用 str 转换")
+
+        dst = io.BytesIO()
+        transform_stream(io.BytesIO(b"hello world\n" * 100), dst, fail, 16, ascii_transform=bytes.upper)
+        assert dst.getvalue() == b"HELLO WORLD\n" * 100
+
+    @pytest.mark.parametrize("name", sorted(FORCED_TRANSFORMS))
+    def test_forced_split_keeps_sigma_context(self, name):
+        """没有安全切分点时带着上下文强制切分，Σ 的词尾形式与一次性转换一致"""
+        transform = FORCED_TRANSFORMS[name]
+        # 单步转换走字节级快速路径（含回退），管道走 Unicode 路径
+        ascii_transform = ASCII_TRANSFORMS.get(name)
+        for text in _forced_split_samples():
+            expected = transform(text.replace("\r\n", "\n").replace("\r", "\n")).encode("utf-8")
+            for chunk_size in range(2, 9):
+                dst = io.BytesIO()
+                transform_stream(io.BytesIO(text.encode("utf-8")), dst, transform, chunk_size,
+                                 ascii_transform=ascii_transform)
+                assert dst.getvalue() == expected, (text, chunk_size)
+
+    def test_forced_split_without_anchor(self):
+        """
+        已知限制：Σ 后面跟着超过 pending 上限的 case-ignorable 字符时只能直接切分
+
+        内存仍然有界，只有 Σ 的词尾形式可能与一次性转换不同。
+        """
+        text = "AΣ" + "\u0345" * 64 + "B"
+        dst = io.BytesIO()
+        transform_stream(io.BytesIO(text.encode("utf-8")), dst, str.lower, 4)
+
+        assert text.lower() == "aσ" + "\u0345" * 64 + "b"
+        assert dst.getvalue().decode("utf-8") == "aς" + "\u0345" * 64 + "b"
+
+    def test_lengths_count_characters(self):
+        """长度统计按字符计算，且换行已规范化"""
+        text = "ab\r\ncd é"
+        stats = transform_stream(io.BytesIO(text.encode("utf-8")), io.BytesIO(), str.upper, 2)
+        assert stats["original_length"] == 7
+        assert stats["processed_length"] == 7
+
+    def test_invalid_utf8_leaves_no_output(self, tmp_path):
+        """解码失败时不留下半成品"""
+        src = tmp_path / "bad.txt"
+        src.write_bytes(b"ok " * 10 + b"\xff")
+        out = tmp_path / "out" / "processed_bad.txt"
+        out.parent.mkdir()
+
+        with pytest.raises(UnicodeDecodeError):
+            transform_file(src, out, str.upper, 4)
+
+        assert list(out.parent.iterdir()) == []
+
+    def test_temp_name_is_unique_per_process(self, tmp_path, monkeypatch):
+        """不同进程写同一个输出时使用各自的临时文件"""
+        out = tmp_path / "out.txt"
+        with _atomic_output(out) as first:
+            monkeypatch.setattr("os.getpid", lambda: -1)
+            with _atomic_output(out) as second:
+                assert first.name != second.name
+                second.write(b"second")
+            first.write(b"first")
+
+        assert out.read_bytes() == b"first"
+        assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
+
+
+class TestReverseStream:
+    """测试反向读取的反转"""
+
+    @pytest.mark.parametrize("text", SAMPLES)
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+    def test_matches_whole_file(self, tmp_path, text, chunk_size):
+        """任意块大小下与 content[::-1] 一致"""
+        dst = io.BytesIO()
+        stats = reverse_stream(io.BytesIO(text.encode("utf-8")), dst, chunk_size)
+
+        assert dst.getvalue() == _reference(tmp_path, text, "reverse")
+        assert stats["original_length"] == stats["processed_length"]
+
+    @pytest.mark.parametrize("text", MIXED_SAMPLES)
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 64])
+    def test_ascii_fast_path_matches(self, tmp_path, text, chunk_size):
+        """字节级快速路径的反转与 content[::-1] 一致"""
+        dst = io.BytesIO()
+        reverse_stream(io.BytesIO(text.encode("utf-8")), dst, chunk_size, ascii_transform=lambda data: data)
+
+        assert dst.getvalue() == _reference(tmp_path, text, "reverse")
+
+    @pytest.mark.parametrize("name", sorted(FORCED_TRANSFORMS))
+    def test_forced_split_keeps_sigma_context(self, name):
+        """反向读取时的强制切分同样带着上下文"""
+        transform = FORCED_TRANSFORMS[name]
+        # 单步转换走字节级快速路径（含回退），管道走 Unicode 路径
+        ascii_transform = ASCII_TRANSFORMS.get(name)
+        for text in _forced_split_samples():
+            expected = transform(text.replace("\r\n", "\n").replace("\r", "\n")[::-1]).encode("utf-8")
+            for chunk_size in range(2, 9):
+                dst = io.BytesIO()
+                reverse_stream(io.BytesIO(text.encode("utf-8")), dst, chunk_size, transform=transform,
+                               ascii_transform=ascii_transform)
+                assert dst.getvalue() == expected, (text, chunk_size)
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3])
+    def test_forced_split_keeps_crlf(self, chunk_size):
+        """强制切分不会切在 \r 和 \n 之间"""
+        for ascii_transform in (None, lambda data: data):
+            dst = io.BytesIO()
+            reverse_stream(io.BytesIO(b"\n'''\r\n"), dst, chunk_size, ascii_transform=ascii_transform)
+            assert dst.getvalue() == b"\n'''\n"
+
+    def test_reads_backwards_in_blocks(self):
+        """每次读取不超过块大小"""
+
+        class RecordingReader(io.BytesIO):
+            sizes = []
+
+            def read(self, size=-1):
+                self.sizes.append(size)
+                return super().read(size)
+
+        src = RecordingReader(("abc déf " * 100).encode("utf-8"))
+        reverse_stream(src, io.BytesIO(), 16)
+        assert src.sizes and max(src.sizes) <= 16
+
+    def test_invalid_utf8(self):
+        """非法 UTF-8 与 read_text() 一样报错"""
+        with pytest.raises(UnicodeDecodeError):
+            reverse_stream(io.BytesIO(b"abc\x80\x80def"), io.BytesIO(), 2)
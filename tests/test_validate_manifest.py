@@ -0,0 +1,152 @@
+"""
+Manifest 验证脚本测试
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from scripts.validate_manifest import extract_function_signatures, validate_functions, validate_type_system
+
+ROOT = Path(__file__).parent.parent
+
+
+def _load_manifest():
+    return json.loads((ROOT / "prefab-manifest.json").read_text(encoding="utf-8"))
+
+
+def _functions_from_source(tmp_path, source):
+    path = tmp_path / "main.py"
+    path.write_text(source, encoding="utf-8")
+    return extract_function_signatures(path)
+
+
+class TestValidateManifest:
+    """测试 manifest 与 main.py 的一致性检查"""
+
+    def test_shipped_manifest_is_valid(self):
+        """仓库自带的 manifest 没有错误"""
+        actual = extract_function_signatures(ROOT / "src" / "main.py")
+        errors, _ = validate_functions(_load_manifest(), actual)
+        assert errors == []
+
+    def test_nested_functions_are_ignored(self, tmp_path):
+        """函数内部的嵌套函数不算作公共函数"""
+        actual = _functions_from_source(tmp_path, "def outer():\n    def inner():\n        pass\n")
+        assert list(actual) == ["outer"]
+
+    def test_streaming_must_match_generator(self, tmp_path):
+        """streaming 声明必须与是否为生成器一致"""
+        source = "def stream():\n    yield {}\n\ndef unary():\n    return {}\n"
+        actual = _functions_from_source(tmp_path, source)
+        returns = {"type": "object", "description": "x", "properties": {"type": {"type": "string"}}}
+        manifest = {"functions": [
+            {"name": "stream", "returns": returns},
+            {"name": "unary", "streaming": True, "returns": returns},
+        ]}
+
+        errors, _ = validate_functions(manifest, actual)
+
+        assert len(errors) == 2
+        assert "stream" in errors[0] and "unary" in errors[1]
+
+    def test_async_must_match_async_def(self, tmp_path):
+        """async 声明必须与是否为 async def 一致"""
+        source = "async def coro():\n    return {}\n\ndef plain():\n    return {}\n"
+        actual = _functions_from_source(tmp_path, source)
+        returns = {"type": "object", "description": "x", "properties": {"success": {"type": "boolean"}}}
+        manifest = {"functions": [
+            {"name": "coro", "returns": returns},
+            {"name": "plain", "async": True, "returns": returns},
+        ]}
+
+        errors, _ = validate_functions(manifest, actual)
+
+        assert len(errors) == 2
+        assert "coro" in errors[0] and "plain" in errors[1]
+
+    def test_pure_only_for_plain_functions(self, tmp_path):
+        """pure 只能用于非流式、非异步、不收发文件、不使用 secrets 的函数"""
+        source = "def ok():\n    return {}\n\ndef weather():\n    return {}\n\ndef flag():\n    return {}\n"
+        actual = _functions_from_source(tmp_path, source)
+        returns = {"type": "object", "description": "x", "properties": {"success": {"type": "boolean"}}}
+        manifest = {"functions": [
+            {"name": "ok", "pure": True, "returns": returns},
+            {"name": "weather", "pure": True, "returns": returns,
+             "secrets": [{"name": "API_KEY", "description": "x", "required": True}]},
+            {"name": "flag", "pure": "yes", "returns": returns},
+        ]}
+
+        errors, _ = validate_functions(manifest, actual)
+
+        assert len(errors) == 2
+        assert "weather" in errors[0] and "secrets" in errors[0]
+        assert "flag" in errors[1]
+
+    def test_parameter_constraints(self, tmp_path):
+        """参数的 error_code、取值范围约束和默认值"""
+        source = "def f(a, b='x', c=1):\n    return {}\n"
+        actual = _functions_from_source(tmp_path, source)
+        returns = {"type": "object", "description": "x", "properties": {
+            "success": {"type": "boolean"},
+            "error_code": {"type": "string", "enum": ["BAD_A"]},
+        }}
+        manifest = {"functions": [{"name": "f", "returns": returns, "parameters": [
+            {"name": "a", "type": "string", "required": True, "minLength": 1, "error_code": "BAD_A"},
+            {"name": "b", "type": "string", "default": "y", "minimum": 0, "error_code": "BAD_B"},
+            {"name": "c", "type": "integer", "default": 1, "maxItems": 2},
+        ]}]}
+
+        errors, _ = validate_functions(manifest, actual)
+
+        assert len(errors) == 4
+        assert any("minimum" in e and "'b'" in e for e in errors)
+        assert any("BAD_B" in e for e in errors)
+        assert any("'y'" in e and "'x'" in e for e in errors)
+        assert any("maxItems" in e and "'c'" in e for e in errors)
+
+    def test_items_error_code(self, tmp_path):
+        """数组参数 items.error_code 也必须在 returns.error_code.enum 中"""
+        actual = _functions_from_source(tmp_path, "def f(a):\n    return {}\n")
+        returns = {"type": "object", "description": "x", "properties": {
+            "success": {"type": "boolean"},
+            "error_code": {"type": "string", "enum": ["BAD_A", "BAD_ITEMS"]},
+        }}
+        param = {"name": "a", "type": "array", "required": True, "error_code": "BAD_A",
+                 "items": {"type": "number", "error_code": "BAD_ITEMS"}}
+        manifest = {"functions": [{"name": "f", "returns": returns, "parameters": [param]}]}
+        assert validate_functions(manifest, actual)[0] == []
+
+        param["items"]["error_code"] = "OTHER"
+        errors, _ = validate_functions(manifest, actual)
+        assert len(errors) == 1 and "items.error_code" in errors[0]
+
+    def test_union_types(self):
+        """支持联合类型，列表中的每个类型都必须合法"""
+        param = {"name": "operation", "type": ["string", "array"], "items": {"type": "string"}}
+        assert validate_type_system({"functions": [{"name": "f", "parameters": [param]}]}) == []
+
+        param["type"] = ["string", "list"]
+        assert len(validate_type_system({"functions": [{"name": "f", "parameters": [param]}]})) == 1
+
+    @pytest.mark.parametrize("param, valid", [
+        ({"type": ["string", "array"], "items": {"type": "string", "enum": ["a", "b"]}, "default": ["a"]}, True),
+        ({"type": ["string", "array"], "items": {"type": "string", "enum": ["a", "b"]}, "default": ["c"]}, False),
+        ({"type": ["string", "array"], "enum": ["a"], "items": {"type": "string"}, "default": "b"}, False),
+        ({"type": ["string", "array"], "default": "a"}, False),
+        ({"type": "integer", "default": True}, False),
+        ({"type": "number", "default": 1}, True),
+    ])
+    def test_parameter_defaults(self, tmp_path, param, valid):
+        """default 必须符合声明的类型、enum 和 items.enum"""
+        actual = _functions_from_source(tmp_path, "def f(x=None):\n    return {}\n")
+        manifest = {"functions": [{
+            "name": "f",
+            "parameters": [dict(param, name="x")],
+            "returns": {"type": "object", "description": "x", "properties": {}},
+        }]}
+
+        errors, _ = validate_functions(manifest, actual)
+
+        assert (errors == []) is valid
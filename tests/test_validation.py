@@ -0,0 +1,125 @@
+"""
+编译后的参数校验测试
+"""
+
+import pytest
+
+from src.utils.dispatch import load_manifest
+from src.utils.validation import compile_parameters
+
+
+def _validator(**param):
+    return compile_parameters([{"name": "x", **param}])
+
+
+def _code(validate, value):
+    _, error = validate({"x": value})
+    return error and error["error_code"]
+
+
+class TestTypes:
+    """测试类型检查和转换"""
+
+    @pytest.mark.parametrize("type_name, valid, invalid", [
+        ("string", ["", "a"], [1, None, b"a", ["a"]]),
+        ("integer", [0, -3, 2 ** 70], [1.5, True, "1", None]),
+        ("number", [0, 1.5, -2], [True, "1", None, [1]]),
+        ("boolean", [True, False], [0, 1, "true", None]),
+        ("array", [[], [1, "a"]], [{}, "a", None]),
+        ("object", [{}, {"a": 1}], [[], "a", None]),
+    ])
+    def test_type(self, type_name, valid, invalid):
+        validate = _validator(type=type_name)
+        for value in valid:
+            assert validate({"x": value}) == ({"x": value}, None)
+        for value in invalid:
+            assert _code(validate, value) == "INVALID_PARAMETERS"
+
+    def test_union(self):
+        validate = _validator(type=["string", "array"], items={"type": "string"})
+        assert _code(validate, "a") is None
+        assert _code(validate, ["a"]) is None
+        assert _code(validate, 1) == "INVALID_PARAMETERS"
+        assert _code(validate, [1]) == "INVALID_PARAMETERS"
+
+    def test_integral_float_becomes_int(self):
+        validate = _validator(type="integer", minimum=1)
+        values, _ = validate({"x": 3.0})
+        assert type(values["x"]) is int and values["x"] == 3
+        assert _code(validate, 0.0) == "INVALID_PARAMETERS"
+
+    def test_untyped_parameter_is_not_checked(self):
+        assert _validator()({"x": object()})[1] is None
+
+
+class TestConstraints:
+    """测试 enum、范围和数组约束"""
+
+    def test_enum(self):
+        validate = _validator(type=["string", "array"], enum=["a", "b"], items={"type": "string", "enum": ["a"]})
+        assert _code(validate, "b") is None
+        assert _code(validate, "c") == "INVALID_PARAMETERS"
+        assert _code(validate, ["a", "a"]) is None
+        assert _code(validate, ["a", "b"]) == "INVALID_PARAMETERS"
+
+    @pytest.mark.parametrize("param, valid, invalid", [
+        ({"type": "integer", "minimum": -1, "maximum": 3}, [-1, 3], [-2, 4]),
+        ({"type": "number", "minimum": 0}, [0, 0.5], [-0.1]),
+        ({"type": "string", "minLength": 1, "maxLength": 2}, ["a", "ab"], ["", "abc"]),
+        ({"type": "array", "items": {"type": "number"}, "minItems": 1, "maxItems": 2}, [[1], [1, 2.5]],
+         [[], [1, 2, 3], [True]]),
+    ])
+    def test_bounds(self, param, valid, invalid):
+        validate = _validator(**param)
+        assert [_code(validate, value) for value in valid] == [None] * len(valid)
+        assert all(_code(validate, value) == "INVALID_PARAMETERS" for value in invalid)
+
+    def test_declared_error_code(self):
+        validate = _validator(type="string", minLength=1, error_code="EMPTY_TEXT")
+        _, error = validate({"x": ""})
+        assert error == {"success": False, "error": "x 的长度不能小于 1", "error_code": "EMPTY_TEXT"}
+
+    def test_items_error_code(self):
+        validate = _validator(type=["number", "array"], maxItems=2, error_code="BAD_NUMBER",
+                              items={"type": "number", "error_code": "BAD_ARRAY"})
+        assert _code(validate, "1") == "BAD_NUMBER"
+        assert _code(validate, [1, "2"]) == "BAD_ARRAY"
+        assert _code(validate, [1, 2, 3]) == "BAD_ARRAY"
+        assert _code(validate, [1, 2]) is None
+
+
+class TestArguments:
+    """测试参数名检查和默认值"""
+
+    PARAMS = [
+        {"name": "a", "type": "integer", "required": True},
+        {"name": "b", "type": "string", "default": "x"},
+        {"name": "c", "type": "array", "items": {"type": "string"}, "default": ["y"]},
+    ]
+
+    @pytest.mark.parametrize("arguments", [None, ["a"], {"b": "x"}, {"a": 1, "d": 2}])
+    def test_names(self, arguments):
+        assert compile_parameters(self.PARAMS)(arguments)[1]["error_code"] == "INVALID_PARAMETERS"
+
+    def test_defaults_are_filled(self):
+        validate = compile_parameters(self.PARAMS)
+        first, _ = validate({"a": 1})
+        assert first == {"a": 1, "b": "x", "c": ["y"]}
+        # 可变的默认值每次调用独立
+        first["c"].append("z")
+        assert validate({"a": 1})[0]["c"] == ["y"]
+
+    def test_arguments_are_not_modified(self):
+        arguments = {"a": 2.0}
+        compile_parameters(self.PARAMS)(arguments)
+        assert arguments == {"a": 2.0}
+
+
+@pytest.mark.parametrize("function", load_manifest()["functions"], ids=lambda f: f["name"])
+def test_manifest_defaults_are_valid(function):
+    """manifest 中每个函数只传必需参数以外的默认值时都能通过校验"""
+    validate = compile_parameters(function.get("parameters", []))
+    defaults = {p["name"]: p["default"] for p in function.get("parameters", []) if "default" in p}
+    required = [p["name"] for p in function.get("parameters", []) if p.get("required")]
+    if not required:
+        assert validate(defaults) == (defaults, None)
@@ -0,0 +1,72 @@
+"""
+数组加法测试
+"""
+
+import pytest
+
+from src.utils import vector_math
+from src.utils.vector_math import BACKENDS, add_arrays
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+class TestAddArrays:
+    """测试各实现的结果与逐对相加一致"""
+
+    @pytest.mark.parametrize("a, b, expected", [
+        ([1, 2, 3], [4, 5, 6], [5, 7, 9]),
+        ([1, -2], 10, [11, 8]),
+        (0.5, [1, 2], [1.5, 2.5]),
+        ([0.1, 0.2], [0.2, 0.1], [0.1 + 0.2, 0.2 + 0.1]),
+        ([], [], []),
+        ([], 3, []),
+    ])
+    def test_sum(self, backend, a, b, expected):
+        assert add_arrays(a, b, backend) == (expected, backend)
+
+    def test_floats_promote_whole_result(self, backend):
+        result, _ = add_arrays([1, 2.5], [1, 1], backend)
+        assert result == [2.0, 3.5]
+        assert all(type(value) is float for value in result)
+
+    def test_integers_stay_integers(self, backend):
+        result, _ = add_arrays([1, 2], 3, backend)
+        assert all(type(value) is int for value in result)
+
+    @pytest.mark.parametrize("a, b", [([True, 1], [1, 1]), ([1, 2], True), ([1.5, False], 1)])
+    def test_bools_are_not_numbers(self, backend, a, b):
+        with pytest.raises(ValueError):
+            add_arrays(a, b, backend)
+
+    @pytest.mark.parametrize("a, b", [
+        ([2 ** 63 - 1], [1]),
+        ([2 ** 70, 1], 1),
+        ([-(2 ** 63)], [-1]),
+    ])
+    def test_large_integers_are_exact(self, backend, a, b):
+        expected = [x + y for x, y in zip(a, b if isinstance(b, list) else [b] * len(a))]
+        assert add_arrays(a, b, backend) == (expected, "python")
+
+    @pytest.mark.parametrize("a, b", [
+        ([1, 2], [1]),
+        ([1, "x"], [1, 2]),
+        ([None], [1]),
+        ([[1]], [1]),
+        ([1], "x"),
+        (1, 2),
+    ])
+    def test_invalid(self, backend, a, b):
+        with pytest.raises(ValueError):
+            add_arrays(a, b, backend)
+
+    def test_max_length(self, monkeypatch):
+        monkeypatch.setattr(vector_math, "MAX_LENGTH", 2)
+        with pytest.raises(ValueError):
+            add_arrays([1, 2, 3], 1)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            add_arrays([1], [1], "cuda")
@@ -0,0 +1,242 @@
+"""
+天气结果缓存测试
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from src.utils.weather_cache import WeatherCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ManualExecutor:
+    """记录提交的后台刷新，由测试决定何时执行"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn, args))
+        return Future()
+
+    def run(self):
+        tasks, self.tasks = self.tasks, []
+        for fn, args in tasks:
+            fn(*args)
+
+
+class Upstream:
+    """按调用次数返回不同结果的天气服务"""
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"temperature": self.calls}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def executor():
+    return ManualExecutor()
+
+
+@pytest.fixture
+def cache(clock, executor):
+    return WeatherCache(ttl=10, grace=5, clock=clock, executor=executor)
+
+
+class TestWeatherCache:
+    """测试 TTL、grace 和淘汰"""
+
+    def test_fresh_hits(self, cache, clock):
+        upstream = Upstream()
+        assert cache.get("北京", upstream) == ({"temperature": 1}, 0.0)
+        clock.now += 4
+        assert cache.get("北京", upstream) == ({"temperature": 1}, 4)
+        assert upstream.calls == 1
+        assert cache.snapshot()["hits"] == 1
+
+    def test_stale_while_revalidate(self, cache, clock, executor):
+        upstream = Upstream()
+        cache.get("北京", upstream)
+        clock.now += 12
+
+        # grace 内先返回旧结果，只提交一次后台刷新
+        assert cache.get("北京", upstream) == ({"temperature": 1}, 12)
+        assert cache.get("北京", upstream) == ({"temperature": 1}, 12)
+        assert len(executor.tasks) == 1 and upstream.calls == 1
+
+        executor.run()
+        assert cache.get("北京", upstream) == ({"temperature": 2}, 0)
+        stats = cache.snapshot()
+        assert (stats["stale_hits"], stats["refreshes"], stats["hits"]) == (2, 1, 1)
+
+    def test_failed_refresh_keeps_stale_result(self, cache, clock, executor):
+        upstream = Upstream()
+        cache.get("北京", upstream)
+        clock.now += 11
+        upstream.error = RuntimeError("down")
+        cache.get("北京", upstream)
+        executor.run()
+
+        assert cache.get("北京", upstream) == ({"temperature": 1}, 11)
+        executor.run()
+        assert cache.snapshot()["refresh_errors"] == 2
+
+        # grace 用完后同步获取，失败时抛出异常
+        clock.now += 5
+        with pytest.raises(RuntimeError):
+            cache.get("北京", upstream)
+        assert len(cache) == 0
+
+    def test_miss_waits_for_running_refresh(self, cache, clock, executor):
+        upstream = Upstream()
+        cache.get("北京", upstream)
+        clock.now += 14
+        cache.get("北京", upstream)
+        clock.now += 2
+        # grace 已过，但刷新正在进行：等待它而不是再请求一次
+        timer = threading.Timer(0.05, executor.run)
+        timer.start()
+        assert cache.get("北京", upstream) == ({"temperature": 2}, 0)
+        timer.join()
+        assert upstream.calls == 2
+        assert cache.snapshot()["coalesced"] == 1
+
+    def test_expired_beyond_grace(self, cache, clock, executor):
+        upstream = Upstream()
+        cache.get("北京", upstream)
+        clock.now += 15
+        assert cache.get("北京", upstream) == ({"temperature": 2}, 0.0)
+        assert executor.tasks == []
+        assert cache.snapshot()["expirations"] == 1
+
+    def test_failures_are_not_cached(self, cache):
+        upstream = Upstream()
+        upstream.error = ValueError("bad city")
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                cache.get("北京", upstream)
+        assert upstream.calls == 2 and len(cache) == 0
+
+    def test_keys_are_independent(self, cache):
+        upstream = Upstream()
+        cache.get(("北京", "key-a"), upstream)
+        assert cache.get(("北京", "key-b"), upstream)[0] == {"temperature": 2}
+
+    def test_lru_eviction(self, clock):
+        cache = WeatherCache(ttl=10, maxsize=2, clock=clock)
+        upstream = Upstream()
+        cache.get("a", upstream)
+        cache.get("b", upstream)
+        cache.get("a", upstream)
+        cache.get("c", upstream)
+        cache.get("a", upstream)
+        assert upstream.calls == 3
+        assert cache.snapshot()["evictions"] == 1
+
+    def test_disabled(self):
+        upstream = Upstream()
+        cache = WeatherCache(ttl=0)
+        cache.get("北京", upstream)
+        cache.get("北京", upstream)
+        assert upstream.calls == 2
+
+    @pytest.mark.parametrize("kwargs", [{"ttl": -1}, {"grace": -1}, {"maxsize": -1}])
+    def test_invalid_arguments(self, kwargs):
+        with pytest.raises(ValueError):
+            WeatherCache(**kwargs)
+
+    def test_background_refresh_thread(self):
+        cache = WeatherCache(ttl=0.05, grace=10)
+        upstream = Upstream()
+        cache.get("北京", upstream)
+        time.sleep(0.06)
+        assert cache.get("北京", upstream)[0] == {"temperature": 1}
+        for _ in range(100):
+            if cache.get("北京", upstream)[0] == {"temperature": 2}:
+                break
+            time.sleep(0.005)
+        assert upstream.calls == 2
+
+
+class TestSingleflight:
+    """测试并发的相同查询只请求一次"""
+
+    def test_concurrent_misses_are_coalesced(self):
+        cache = WeatherCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"temperature": 20}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("北京", slow_fetch)))
+                   for _ in range(8)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        for _ in range(100):
+            if cache.snapshot()["coalesced"] == 7:
+                break
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert [value for value, _ in results] == [{"temperature": 20}] * 8
+        assert cache.snapshot()["coalesced"] == 7
+
+    def test_waiters_share_the_error(self):
+        cache = WeatherCache()
+        release = threading.Event()
+
+        def failing_fetch():
+            release.wait(5)
+            raise RuntimeError("timeout")
+
+        errors = []
+
+        def call():
+            try:
+                cache.get("北京", failing_fetch)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for _ in range(100):
+            if cache.snapshot()["coalesced"] == 3:
+                break
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        assert len(errors) == 4 and len({id(e) for e in errors}) == 1
@@ -0,0 +1,142 @@
+"""
+天气服务客户端测试（使用 scripts/weather_server.py）
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from scripts.weather_server import running, weather_for
+from src.utils.weather_client import WeatherAPIError, WeatherClient
+
+
+@pytest.fixture
+def server():
+    with running(api_key="key") as server:
+        yield server
+
+
+class TestWeatherClient:
+    """测试请求和错误映射"""
+
+    def test_current(self, server):
+        client = WeatherClient(server.url)
+        assert client.current("北京", "key") == weather_for("北京")
+        assert client.current("New York", "key") == weather_for("New York")
+
+    def test_base_path(self, server):
+        with pytest.raises(WeatherAPIError) as e:
+            WeatherClient(server.url + "/v1").current("北京", "key")
+        assert e.value.error_code == "CITY_NOT_FOUND"
+
+    def test_rejected_key(self, server):
+        with pytest.raises(WeatherAPIError) as e:
+            WeatherClient(server.url).current("北京", "wrong")
+        assert e.value.error_code == "INVALID_API_KEY"
+
+    @pytest.mark.parametrize("status, body, error_code", [
+        (404, b"", "CITY_NOT_FOUND"),
+        (500, b"", "WEATHER_API_UNAVAILABLE"),
+        (418, b"", "WEATHER_API_ERROR"),
+        (200, b"not json", "WEATHER_API_ERROR"),
+        (200, b"[]", "WEATHER_API_ERROR"),
+        (200, b'{"temperature": "hot", "condition": "sunny"}', "WEATHER_API_ERROR"),
+    ])
+    def test_error_codes(self, monkeypatch, status, body, error_code):
+        client = WeatherClient("http://127.0.0.1:9")
+        monkeypatch.setattr(client.pool, "request", lambda path, headers, timeout: (status, body))
+        with pytest.raises(WeatherAPIError) as e:
+            client.current("北京", "key")
+        assert e.value.error_code == error_code
+
+    def test_unavailable(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        with pytest.raises(WeatherAPIError) as e:
+            WeatherClient(f"http://127.0.0.1:{port}").current("北京", "key")
+        assert e.value.error_code == "WEATHER_API_UNAVAILABLE"
+
+    def test_timeout(self, server):
+        server.latency = 0.5
+        client = WeatherClient(server.url, timeout=0.1)
+        with pytest.raises(WeatherAPIError) as e:
+            client.current("北京", "key")
+        assert e.value.error_code == "WEATHER_API_TIMEOUT"
+        # 超时的连接不再复用
+        assert client.pool.snapshot()["open"] == 0
+
+    @pytest.mark.parametrize("url", ["ftp://example.com", "example.com", "http://"])
+    def test_invalid_url(self, url):
+        with pytest.raises(ValueError):
+            WeatherClient(url)
+
+
+class TestConnectionPool:
+    """测试连接复用和上限"""
+
+    def test_keep_alive(self, server):
+        client = WeatherClient(server.url)
+        for _ in range(20):
+            client.current("北京", "key")
+        assert server.connections == 1
+        stats = client.pool.snapshot()
+        assert (stats["requests"], stats["opened"], stats["reused"]) == (20, 1, 19)
+        assert (stats["open"], stats["idle"]) == (1, 1)
+
+    def test_pool_size_bounds_connections(self, server):
+        server.latency = 0.01
+        client = WeatherClient(server.url, pool_size=2)
+        results = []
+
+        def worker():
+            for _ in range(5):
+                results.append(client.current("北京", "key"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 40
+        assert server.connections == 2
+        assert client.pool.snapshot()["open"] == 2
+
+    def test_waiting_for_connection_times_out(self, server):
+        server.latency = 0.3
+        client = WeatherClient(server.url, pool_size=1)
+        thread = threading.Thread(target=client.current, args=("北京", "key"))
+        thread.start()
+        time.sleep(0.05)
+        with pytest.raises(WeatherAPIError) as e:
+            client.current("上海", "key", timeout=0.1)
+        thread.join()
+        assert e.value.error_code == "WEATHER_API_TIMEOUT"
+        assert server.connections == 1
+
+    def test_retries_connection_closed_by_server(self):
+        with running(idle_timeout=0.05) as server:
+            client = WeatherClient(server.url)
+            client.current("北京", "key")
+            time.sleep(0.3)
+            assert client.current("北京", "key") == weather_for("北京")
+        assert client.pool.snapshot()["retries"] == 1
+        assert server.connections == 2
+
+    def test_idle_connections_expire(self, server):
+        client = WeatherClient(server.url, idle_timeout=0)
+        client.current("北京", "key")
+        time.sleep(0.01)
+        client.current("北京", "key")
+        stats = client.pool.snapshot()
+        assert (stats["opened"], stats["discarded"], stats["retries"]) == (2, 1, 0)
+
+    def test_close(self, server):
+        client = WeatherClient(server.url)
+        client.current("北京", "key")
+        client.close()
+        assert client.pool.snapshot()["open"] == 0
+        client.current("北京", "key")
+        assert server.connections == 2
@@ -0,0 +1,84 @@
+"""
+工作空间测试
+
+验证同一进程中并发的文件处理调用各自使用自己的输入、输出目录。
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.main import process_text_file, process_text_file_stream
+from src.utils.workspace import current_workspace, use_workspace
+
+
+def _make_workspace(root: Path, files: dict) -> Path:
+    inputs_dir = root / "data" / "inputs" / "input"
+    inputs_dir.mkdir(parents=True)
+    for name, text in files.items():
+        (inputs_dir / name).write_text(text, encoding="utf-8")
+    return root
+
+
+def _outputs(root: Path) -> dict:
+    return {p.name: p.read_text(encoding="utf-8") for p in (root / "data" / "outputs").iterdir()}
+
+
+class TestWorkspace:
+    """测试工作空间上下文"""
+
+    def test_default_is_current_directory(self):
+        assert current_workspace().resolve("data/outputs") == Path("data/outputs")
+
+    def test_nested_workspaces_restore(self, tmp_path):
+        with use_workspace(tmp_path / "a"):
+            with use_workspace(tmp_path / "b"):
+                assert current_workspace().root == tmp_path / "b"
+            assert current_workspace().root == tmp_path / "a"
+        assert current_workspace().root == Path()
+
+    def test_concurrent_calls_are_isolated(self, tmp_path):
+        """多个线程并发调用，各自只看到自己工作空间中的文件"""
+        roots = [
+            _make_workspace(tmp_path / f"ws{i}", {f"file{j}.txt": f"Call {i} File {j}" for j in range(i % 3 + 1)})
+            for i in range(8)
+        ]
+
+        def call(root: Path) -> dict:
+            with use_workspace(root):
+                return process_text_file(operation="uppercase")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(call, roots))
+
+        for i, (root, result) in enumerate(zip(roots, results)):
+            assert result["success"] is True
+            assert result["file_count"] == i % 3 + 1
+            assert _outputs(root) == {f"processed_file{j}.txt": f"CALL {i} FILE {j}" for j in range(i % 3 + 1)}
+
+    def test_stream_uses_callers_workspace(self, tmp_path):
+        """流式版本的后台线程继承调用方的工作空间"""
+        root = _make_workspace(tmp_path, {"a.txt": "Hello", "b.txt": "World"})
+
+        with use_workspace(root):
+            events = list(process_text_file_stream(operation="lowercase"))
+
+        assert events[-1]["type"] == "done"
+        assert _outputs(root) == {"processed_a.txt": "hello", "processed_b.txt": "world"}
+
+    def test_asyncio_tasks_are_isolated(self, tmp_path):
+        """asyncio 任务创建时复制上下文，在各自的工作空间中运行"""
+        roots = [_make_workspace(tmp_path / f"ws{i}", {"in.txt": f"Task {i}"}) for i in range(4)]
+
+        async def call(root: Path) -> dict:
+            with use_workspace(root):
+                return await asyncio.to_thread(process_text_file, operation="reverse")
+
+        async def main():
+            return await asyncio.gather(*(call(root) for root in roots))
+
+        results = asyncio.run(main())
+
+        assert all(r["success"] for r in results)
+        for i, root in enumerate(roots):
+            assert _outputs(root) == {"processed_in.txt": f"Task {i}"[::-1]}